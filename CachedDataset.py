@@ -1,7 +1,11 @@
 
+from __future__ import print_function
+
+import bisect
 import gc
 import numpy
 import theano
+from collections import OrderedDict
 from Dataset import Dataset
 from Log import log
 from Util import NumbersDict
@@ -9,21 +13,51 @@ from Util import NumbersDict
 
 class CachedDataset(Dataset):
 
-  def __init__(self, cache_byte_size=0, **kwargs):
+  @staticmethod
+  def kwargs_update_from_config(config, kwargs):
+    """
+    :type config: Config.Config
+    :type kwargs: dict[str]
+    """
+    Dataset.kwargs_update_from_config(config, kwargs)
+    if kwargs.get("cache_policy", None) is None:
+      kwargs["cache_policy"] = config.value("cache_policy", "default")
+
+  def __init__(self, cache_byte_size=0, cache_policy="default", **kwargs):
+    """
+    :param int cache_byte_size: <0: no cache. otherwise, for the "default" policy, 2/3 of it is used
+      for the seqs cached at start, and 1/3 for the rolling cache.
+    :param str cache_policy: "default" or "lru".
+      With "lru", any loaded seq is kept (also across epochs) in a LRU cache with cache_byte_size as the budget,
+      and only seqs not in the cache are loaded again.
+    """
     super(CachedDataset, self).__init__(**kwargs)
+    assert cache_policy in ("default", "lru"), "invalid cache_policy %r" % cache_policy
+    self.cache_policy = cache_policy
     self.cache_byte_size_total_limit = cache_byte_size
     if cache_byte_size < 0:
       self.cache_byte_size_limit_at_start = 1
+    elif cache_policy == "lru":
+      self.cache_byte_size_limit_at_start = 0
     else:
       self.cache_byte_size_limit_at_start = cache_byte_size * 2 / 3
       self.cache_byte_size_total_limit = max(cache_byte_size / 3, 1)
+    # For cache_policy "lru": real seq idx -> (data, dict target key -> targets), least recently used first.
+    self._lru_seqs = OrderedDict(); """ :type: dict[int,(numpy.ndarray,dict[str,numpy.ndarray])] """
+    self._lru_nbytes = 0
+    self._lru_hits = 0
+    self._lru_misses = 0
+    self._lru_evictions = 0
     self.num_seqs_cached_at_start = 0
     self.cached_bytes_at_start = 0
     self.max_ctc_length = 0
     self.ctc_targets = None
-    self.alloc_intervals = None
+    self._alloc_starts = None; """ :type: list[int] """  # see _init_alloc_intervals()
+    self._alloc_ends = None; """ :type: list[int] """
+    self._alloc_seq_data = None; """ :type: dict[int,numpy.ndarray|None] """
     self._seq_start = [] # [numpy.array([0,0])]  # uses sorted seq idx, see set_batching()
     self._seq_index = []; """ :type: list[int] """  # Via init_seq_order().
+    self._seq_index_inv = {}; """ :type: dict[int,int] """  # real seq idx -> idx in self._seq_index
     self._index_map = range(len(self._seq_index))
     self._seq_lengths = []; """ :type: list[(int,int)] """  # uses real seq idx
     self.tags = []; """ :type: list[str] """  # uses real seq idx
@@ -40,10 +74,13 @@ class CachedDataset(Dataset):
     self.definite_cache_leftover = temp_cache_size_bytes if self.num_seqs_cached_at_start == self.num_seqs else 0
     self.cache_num_frames_free = temp_cache_size_bytes / self.nbytes
 
-    print >> log.v4, "cached %i seqs" % self.num_seqs_cached_at_start, \
-                     "%s GB" % (self.cached_bytes_at_start / float(1024 * 1024 * 1024)), \
-                     ("(fully loaded, %s GB left over)" if self.definite_cache_leftover else "(%s GB free)") % \
-                     max(temp_cache_size_bytes / float(1024 * 1024 * 1024), 0)
+    if self._use_lru_cache():
+      print("LRU seq cache with %s GB" % (self.cache_byte_size_total_limit / float(1024 * 1024 * 1024)), file=log.v4)
+      return
+    print("cached %i seqs" % self.num_seqs_cached_at_start,
+          "%s GB" % (self.cached_bytes_at_start / float(1024 * 1024 * 1024)),
+          ("(fully loaded, %s GB left over)" if self.definite_cache_leftover else "(%s GB free)") %
+          max(temp_cache_size_bytes / float(1024 * 1024 * 1024), 0), file=log.v4)
 
   def init_seq_order(self, epoch=None, seq_list=None):
     """
@@ -52,22 +89,25 @@ class CachedDataset(Dataset):
     Initialize lists:
       self.seq_index  # sorted seq idx
     """
+    if self._use_lru_cache() and (self._lru_hits or self._lru_misses):
+      self._print_lru_cache_stats()
     old_index_map = self._index_map[:]
-    self._index_map = range(self.num_seqs)
+    self._index_map = range(self._num_seqs)
     super(CachedDataset, self).init_seq_order(epoch=epoch, seq_list=seq_list)
     if seq_list:
       seq_index = [self.tag_idx[tag] for tag in seq_list]
     else:
-      seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, lambda s: self._seq_lengths[s][0])
+      # This might be only a partition, see set_partition().
+      seq_index = self.get_seq_order_for_epoch(epoch, self._num_seqs, lambda s: self._seq_lengths[s][0])
 
     if self._seq_index == seq_index and self.num_seqs_cached_at_start == len(seq_index):
       return False
 
     if epoch is not None:
       # Give some hint to the user in case he is wondering why the cache is reloading.
-      print >> log.v4, "Reinitialize dataset seq order for epoch %i." % epoch
+      print("Reinitialize dataset seq order for epoch %i." % epoch, file=log.v4)
 
-    if self.num_seqs_cached_at_start != len(seq_index):
+    if self.num_seqs_cached_at_start != len(seq_index) or not all([i in self._seq_index_inv for i in seq_index]):
       self._seq_index = seq_index
       self._seq_index_inv = dict(zip(seq_index,range(len(seq_index))))
       self._init_seq_starts()
@@ -79,6 +119,22 @@ class CachedDataset(Dataset):
         return False
     return True
 
+  def _use_lru_cache(self):
+    """
+    :rtype: bool
+    """
+    return self.cache_policy == "lru" and self.cache_byte_size_total_limit > 0
+
+  def _print_lru_cache_stats(self):
+    """
+    Prints the stats of the LRU seq cache since the last call, and resets them.
+    """
+    num_seqs = self._lru_hits + self._lru_misses
+    print("LRU seq cache: %i hits, %i misses (%.1f%% hits), %i evictions, %i seqs, %s GB cached" % (
+      self._lru_hits, self._lru_misses, 100.0 * self._lru_hits / max(num_seqs, 1), self._lru_evictions,
+      len(self._lru_seqs), self._lru_nbytes / float(1024 * 1024 * 1024)), file=log.v4)
+    self._lru_hits = self._lru_misses = self._lru_evictions = 0
+
   def batch_set_generator_cache_whole_epoch(self):
     return True
 
@@ -86,12 +142,14 @@ class CachedDataset(Dataset):
     assert self.num_seqs > 0
     assert self.num_inputs > 0
     assert self.window > 0
-    self.alloc_intervals = \
-      [(0, 0, numpy.zeros([1] + self.get_data_shape("data"), dtype=self.get_data_dtype("data"))),
-       (self.num_seqs, self.num_seqs, numpy.zeros([1] + self.get_data_shape("data"), dtype=self.get_data_dtype("data")))]
-    # self.alloc_intervals[i] is (idx start, idx end, data), where
-    # idx start/end is the sorted seq idx start/end, end exclusive,
-    # and data is a numpy.array.
+    # self._alloc_starts[i], self._alloc_ends[i] is the i-th loaded interval,
+    # sorted seq idx start/end, end exclusive.
+    # The intervals are disjoint, non-adjacent and sorted, so we can use bisect on both lists.
+    self._alloc_starts = []; """ :type: list[int] """
+    self._alloc_ends = []; """ :type: list[int] """
+    # sorted seq idx -> data (numpy.array), or None if not set yet (zeros).
+    # We keep one buffer per seq, thus loading/removing never copies data of other seqs.
+    self._alloc_seq_data = {}; """ :type: dict[int,numpy.ndarray|None] """
 
   def _init_seq_starts(self):
     self._seq_start = [self._seq_start[0] * 0]  # idx like in seq_index, *not* real idx
@@ -100,7 +158,7 @@ class CachedDataset(Dataset):
       self._seq_start.append(self._seq_start[-1] + self._seq_lengths[ids])
 
   def _init_start_cache(self):
-    if not self.alloc_intervals:
+    if self._alloc_starts is None:
       return
     if not self.nbytes:
       return
@@ -123,7 +181,7 @@ class CachedDataset(Dataset):
     """
     Load data sequences.
     As a side effect, will modify / fill-up:
-      self.alloc_intervals
+      self._alloc_seq_data (via insert_alloc_interval())
       self.targets
     This does some extra logic for the cache and calls self._load_seqs()
     for the real loading.
@@ -136,6 +194,10 @@ class CachedDataset(Dataset):
     assert start <= end
     if self.is_cached(start, end): return
 
+    if self._use_lru_cache() and with_cache:
+      self._load_seqs_with_lru_cache(start, end)
+      return
+
     if self.cache_byte_size_total_limit > 0 and with_cache:  # If the cache is enabled.
       self._load_seqs_with_cache(start, end)
       return
@@ -178,6 +240,66 @@ class CachedDataset(Dataset):
         if end != 0:
           self.load_seqs(0, end, with_cache=False)
 
+  def _load_seqs_with_lru_cache(self, start, end):
+    """
+    Seqs which are in the LRU cache (maybe from an earlier epoch) are taken from there,
+    only the others are loaded via self._load_seqs(), and then added to the LRU cache.
+
+    :param int start: sorted seq idx
+    :param int end: sorted seq idx
+    """
+    # We only keep the requested seqs allocated. The data of the others is still referenced by the LRU cache.
+    self.remove_alloc_interval(0, self.num_seqs)
+    missing = []; """ :type: list[int] """  # sorted seq idx
+    for idc in range(start, end):
+      ids = self._seq_index[idc]
+      if ids not in self._lru_seqs:
+        self._lru_misses += 1
+        missing.append(idc)
+        continue
+      self._lru_hits += 1
+      data, targets = self._lru_seqs.pop(ids)
+      self._lru_seqs[ids] = (data, targets)  # Now the most recently used one.
+      self.insert_alloc_interval(idc)
+      self._alloc_seq_data[idc] = data
+      for k, seq_targets in targets.items():
+        idx = self.target_keys.index(k) + 1
+        seq_start = self._seq_start[idc][idx]
+        self.targets[k][seq_start:seq_start + seq_targets.shape[0]] = seq_targets
+    # Load consecutive ranges of missing seqs at once.
+    i = 0
+    while i < len(missing):
+      j = i + 1
+      while j < len(missing) and missing[j] == missing[j - 1] + 1:
+        j += 1
+      super(CachedDataset, self).load_seqs(missing[i], missing[j - 1] + 1)
+      i = j
+    for idc in missing:
+      self._add_seq_to_lru_cache(idc)
+    assert self.is_cached(start, end)
+
+  def _add_seq_to_lru_cache(self, idc):
+    """
+    Adds the loaded seq to the LRU cache, and evicts the least recently used seqs if we are over the budget.
+
+    :param int idc: sorted seq idx, must be loaded
+    """
+    ids = self._seq_index[idc]
+    data = self._get_alloc_seq_data(idc)
+    targets = {}
+    for idx, k in enumerate(self.target_keys, 1):
+      if k not in self.targets:
+        continue
+      seq_start = self._seq_start[idc][idx]
+      # Copy, because self.targets is overwritten by other seqs in other epochs.
+      targets[k] = self.targets[k][seq_start:seq_start + self._seq_lengths[ids][idx]].copy()
+    self._lru_seqs[ids] = (data, targets)
+    self._lru_nbytes += data.nbytes + sum([t.nbytes for t in targets.values()])
+    while self._lru_nbytes > self.cache_byte_size_total_limit and self._lru_seqs:
+      _, (data, targets) = self._lru_seqs.popitem(last=False)
+      self._lru_nbytes -= data.nbytes + sum([t.nbytes for t in targets.values()])
+      self._lru_evictions += 1
+
   def _shuffle_frames_in_seqs(self, start, end):
     """
     :type start: int
@@ -185,19 +307,17 @@ class CachedDataset(Dataset):
     """
     assert start < end
     assert self.is_cached(start, end)
-    alloc_idx = self.alloc_interval_index(start)
-    alloc_start, alloc_end, alloc_data = self.alloc_intervals[alloc_idx]
-    assert start >= alloc_start
-    assert end <= alloc_end
     rnd = numpy.random.RandomState(start)  # Some deterministic way to shuffle!
     num_frames = self._seq_start[end][0] - self._seq_start[start][0]
     assert num_frames > 0
     perm = rnd.permutation(num_frames)
-    alloc_offset = self._seq_start[start][0] - self._seq_start[alloc_start][0]
-    assert alloc_offset + num_frames <= alloc_data.shape[0]
-    # Permute alloc_data.
-    data = alloc_data[alloc_offset:alloc_offset + num_frames]
-    alloc_data[alloc_offset:alloc_offset + num_frames] = data[perm]
+    # Permute the data over all the seqs, and write it back into the per-seq buffers.
+    data = numpy.concatenate([self._get_alloc_seq_data(idc) for idc in range(start, end)])
+    assert data.shape[0] == num_frames
+    data = data[perm]
+    for idc in range(start, end):
+      o = self._seq_start[idc][0] - self._seq_start[start][0]
+      self._alloc_seq_data[idc] = data[o:o + self._seq_start[idc + 1][0] - self._seq_start[idc][0]]
     # Permute targets.
     for k in self.targets:
       idx = self.target_keys.index(k) + 1
@@ -209,107 +329,37 @@ class CachedDataset(Dataset):
     :param int idc: index of sorted seq idx
     :param numpy.ndarray data: raw data
     """
-    idi = self.alloc_interval_index(idc)
-    assert idi >= 0
-    o = self._seq_start[idc][0] - self._seq_start[self.alloc_intervals[idi][0]][0]
+    assert idc in self._alloc_seq_data
     l = data.shape[0]
+    assert l == self._seq_start[idc + 1][0] - self._seq_start[idc][0]
     x = data
     x = self.preprocess(x)
     if self.window > 1:
       x = self.sliding_window(x)
-    self.alloc_intervals[idi][2][o:o + l] = x
-
-  def alloc_interval_index(self, ids):
-    """
-    :param int ids: sorted seq idx
-    :return index in self.alloc_intervals
-    :rtype: int
-    """
-    s = 0
-    e = len(self.alloc_intervals)
-    # Binary search.
-    while s < e:
-      i = (s + e) / 2
-      alloc_start, alloc_end, _ = self.alloc_intervals[i]
-      if alloc_start <= ids < alloc_end:
-        return i
-      elif alloc_start <= ids and ids >= alloc_end:
-        if s == i: return -1
-        s = i
-      elif alloc_start > ids:
-        if e == i: return -1
-        e = i
-      else:
-        assert False
-    return -1
+    self._alloc_seq_data[idc] = numpy.asarray(x, dtype=self.get_data_dtype("data"))
 
-  def _insert_alloc_interval(self, pos, value):
+  def _get_alloc_seq_data(self, idc):
     """
-    Insert np.zeros into self.alloc_intervals.
-    :param int pos: idx in self.alloc_intervals
-    :param (int,int) value: (start,end) like in load_seqs(), sorted seq idx
-    :rtype: int
+    :param int idc: index of sorted seq idx, must be cached
+    :rtype: numpy.ndarray
     """
-    ci = self.alloc_intervals[pos][1]
-    ni = self.alloc_intervals[pos + 1][0]
-    xc = self.alloc_intervals[pos][2]
-    xn = self.alloc_intervals[pos + 1][2]
-    if value[0] == ci and value[1] == ni:
-      self.alloc_intervals.insert(pos,
-        (self.alloc_intervals[pos][0],
-         self.alloc_intervals[pos + 1][1],
-         numpy.concatenate(
-           [xc,
-            numpy.zeros(
-              [self._seq_start[ni][0]] + self.get_data_shape("data"),
-              dtype=self.get_data_dtype("data")),
-            xn])))
-      del self.alloc_intervals[pos + 1]
-      del self.alloc_intervals[pos + 1]
-      return 0
-    elif value[0] == ci:
-      self.alloc_intervals.insert(pos, (self.alloc_intervals[pos][0],
-                                        value[1],
-                                        numpy.concatenate([xc, numpy.zeros([self._seq_start[value[1]][0] - self._seq_start[ci][0]] + self.get_data_shape("data"), dtype=self.get_data_dtype("data"))])))
-      del self.alloc_intervals[pos + 1]
-      return 0
-    elif value[1] == ni:
-      self.alloc_intervals.insert(pos + 1, (value[0],
-                                            self.alloc_intervals[pos + 1][1],
-                                            numpy.concatenate([numpy.zeros([self._seq_start[ni][0] - self._seq_start[value[0]][0]] + self.get_data_shape("data"), dtype=self.get_data_dtype("data")), xc])))
-      del self.alloc_intervals[pos + 2]
-      return 0
-    else:
-      self.alloc_intervals.insert(pos + 1,
-        value + (numpy.zeros(
-            [self._seq_start[value[1]][0] - self._seq_start[value[0]][0]] + self.get_data_shape("data"),
-            dtype=self.get_data_dtype("data")),))
-      return 1
+    data = self._alloc_seq_data[idc]
+    if data is None:  # Inserted but not set. Like a newly allocated buffer.
+      data = numpy.zeros(
+        [self._seq_start[idc + 1][0] - self._seq_start[idc][0]] + self.get_data_shape("data"),
+        dtype=self.get_data_dtype("data"))
+    return data
 
-  def _remove_alloc_interval(self, pos, value):
+  def alloc_interval_index(self, ids):
     """
-    Remove data from self.alloc_intervals.
-    :param int pos: idx in self.alloc_intervals
-    :param (int,int) value: (start,end) like in load_seqs(), sorted seq idx
+    :param int ids: sorted seq idx
+    :return index in self._alloc_starts/self._alloc_ends, or -1 if not cached
     :rtype: int
     """
-    ci, ni, xi = self.alloc_intervals[pos]
-    if value[0] == ci and value[1] == ni:
-      del self.alloc_intervals[pos]
-      return -1
-    elif value[0] == ci:
-      self.alloc_intervals.insert(pos, (value[1], ni, xi[self._seq_start[value[1]][0] - self._seq_start[ci][0]:]))
-      del self.alloc_intervals[pos + 1]
-      return 0
-    elif value[1] == ni:
-      self.alloc_intervals.insert(pos, (ci, value[0], xi[:self._seq_start[value[0]][0] - self._seq_start[ci][0]]))
-      del self.alloc_intervals[pos + 1]
-      return 0
-    else:
-      self.alloc_intervals.insert(pos, (value[1], ni, xi[self._seq_start[value[1]][0] - self._seq_start[ci][0]:]))
-      self.alloc_intervals.insert(pos, (ci, value[0], xi[:self._seq_start[value[0]][0] - self._seq_start[ci][0]]))
-      del self.alloc_intervals[pos + 2]
-      return 1
+    i = bisect.bisect_right(self._alloc_starts, ids) - 1
+    if i >= 0 and ids < self._alloc_ends[i]:
+      return i
+    return -1
 
   def _modify_alloc_intervals(self, start, end, invert):
     """
@@ -318,35 +368,42 @@ class CachedDataset(Dataset):
     :param int end: like in load_seqs(), sorted seq idx
     :param bool invert: True->insert, False->remove
     :rtype: list[int]
-    :return selection list, modified sorted seq idx in self.alloc_intervals
+    :return selection list, modified sorted seq idx (i.e. newly inserted or removed ones)
     """
     if end is None: end = start + 1
-    if start == end: return
+    if start == end: return []
     assert start < end
-    i = 0
+    starts, ends = self._alloc_starts, self._alloc_ends
     selection = []; """ :type: list[int] """
-    modify = self._insert_alloc_interval if invert else self._remove_alloc_interval
-    while i < len(self.alloc_intervals) - invert:
-      ni = self.alloc_intervals[i + invert][1 - invert]  # insert mode: start idx of next alloc
-      ci = self.alloc_intervals[i][invert]               # insert mode: end idx of cur alloc
-      flag = ((ci <= start < ni), (ci < end <= ni), (ci < start and ni <= start) or (ci >= end and ni > end))
-      if not flag[0] and not flag[1]:
-        if not flag[2]:
-          selection.extend(range(ci, ni))
-          i += modify(i, (ci, ni))
-      elif flag[1]:
-        v = (start if flag[0] else ci, end)
-        selection.extend(range(v[0], v[1]))
-        i += modify(i, v)
-        break
-      elif flag[0]:
-        selection.extend(range(start, ni))
-        i += modify(i, (start, ni))
-      i += 1
-    if self.alloc_intervals[0][0] != 0:
-      self.alloc_intervals.insert(0, (0, 0, numpy.zeros([1] + self.get_data_shape("data"), dtype=self.get_data_dtype("data"))))
-    if self.alloc_intervals[-1][1] != self.num_seqs:
-      self.alloc_intervals.append((self.num_seqs, self.num_seqs, numpy.zeros([1] + self.get_data_shape("data"), dtype=self.get_data_dtype("data"))))
+    if invert:
+      # All intervals [i,j) which overlap or touch (start,end). They get merged.
+      i = bisect.bisect_left(ends, start)
+      j = bisect.bisect_right(starts, end)
+      pos = start
+      for k in range(i, j):
+        if starts[k] > pos:
+          selection.extend(range(pos, starts[k]))
+        pos = max(pos, ends[k])
+      if pos < end:
+        selection.extend(range(pos, end))
+      new_intervals = [(min([start] + starts[i:j]), max([end] + ends[i:j]))]
+      for idc in selection:
+        self._alloc_seq_data[idc] = None
+    else:
+      # All intervals [i,j) which overlap (start,end). They get cut.
+      i = bisect.bisect_right(ends, start)
+      j = bisect.bisect_left(starts, end)
+      for k in range(i, j):
+        selection.extend(range(max(starts[k], start), min(ends[k], end)))
+      new_intervals = []
+      if i < j and starts[i] < start:
+        new_intervals.append((starts[i], start))
+      if i < j and ends[j - 1] > end:
+        new_intervals.append((end, ends[j - 1]))
+      for idc in selection:
+        del self._alloc_seq_data[idc]
+    starts[i:j] = [s for (s, _) in new_intervals]
+    ends[i:j] = [e for (_, e) in new_intervals]
     return selection
 
   def insert_alloc_interval(self, start, end=None):
@@ -368,17 +425,24 @@ class CachedDataset(Dataset):
       assert nframes > 0
     deleted = 0
     i = 0
-    while (not nframes or deleted < nframes) and i < len(self.alloc_intervals):
-      ai = self.alloc_intervals[i]
-      if ai[1] > self.num_seqs_cached_at_start and ai[0] < ai[1]:
-        s = ai[0]
-        deleted += sum([self._seq_lengths[self._seq_index[i]][0]
-                        for i in self.remove_alloc_interval(s, ai[1])])
-      i += 1
+    while (not nframes or deleted < nframes) and i < len(self._alloc_starts):
+      if self._alloc_ends[i] > self.num_seqs_cached_at_start:
+        # This removes the whole interval i, thus the next one is at i afterwards.
+        deleted += sum([self._seq_lengths[self._seq_index[idc]][0]
+                        for idc in self.remove_alloc_interval(self._alloc_starts[i], self._alloc_ends[i])])
+      else:
+        i += 1
     return deleted
 
   @property
   def num_seqs(self):
+    """
+    :return: num seqs of the current epoch, i.e. len(self._seq_index), which might be only a partition.
+      self._num_seqs is the total number of seqs, i.e. the real seq idx range.
+    :rtype: int
+    """
+    if self._seq_index:
+      return len(self._seq_index)
     return self._num_seqs
 
   def is_cached(self, start, end):
@@ -387,27 +451,12 @@ class CachedDataset(Dataset):
     :param int end: like in load_seqs(), sorted seq idx
     :rtype: bool
     :returns whether we have the full range (start,end) of sorted seq idx
-      cached in self.alloc_intervals (end is exclusive).
+      cached in self._alloc_seq_data (end is exclusive).
     """
     if start == end: return True  # Empty.
     assert start < end
-    s = 0
-    e = len(self.alloc_intervals)
-    # Binary search.
-    while s < e:
-      i = (s + e) / 2
-      alloc_start, alloc_end, _ = self.alloc_intervals[i]
-      if alloc_start <= start < alloc_end:
-        return alloc_start < end <= alloc_end
-      elif alloc_start <= start and start >= alloc_end:
-        if s == i: return False
-        s = i
-      elif alloc_start > start:
-        if e == i: return False
-        e = i
-      else:
-        assert False
-    return False
+    i = self.alloc_interval_index(start)
+    return i >= 0 and end <= self._alloc_ends[i]
 
   def get_seq_length_2d(self, sorted_seq_idx):
     """
@@ -445,14 +494,8 @@ class CachedDataset(Dataset):
   def get_input_data(self, sorted_seq_idx):
     #sorted_seq_idx = self._index_map[sorted_seq_idx]
     seq_idx = self._index_map[sorted_seq_idx]
-    idi = self.alloc_interval_index(seq_idx)
-    assert idi >= 0, "failed to get data for seq %i" % sorted_seq_idx
-    alloc_start_seq, alloc_end_seq, alloc_data = self.alloc_intervals[idi]
-    o = self.get_seq_start(seq_idx)[0] - self.get_seq_start(alloc_start_seq)[0]
-    assert o >= 0
-    l = self.get_seq_length_2d(sorted_seq_idx)[0]
-    assert alloc_data.shape[0] >= o + l
-    return alloc_data[o:o + l]
+    assert seq_idx in self._alloc_seq_data, "failed to get data for seq %i" % sorted_seq_idx
+    return self._get_alloc_seq_data(seq_idx)
 
   def get_data_dim(self, key):
     if key == "data":
@@ -38,25 +38,17 @@ class CachedDataset2(Dataset):
       epoch = 1
     self.expected_load_seq_start = 0
     self.reached_final_seq = False
-    self.added_data = []; " :type: list[DatasetSeq] "
+    self.added_data = DatasetSeqBuffer()
     self._num_timesteps_accumulated = 0
     self._num_seqs = None
     self.epoch = epoch
     return True
 
   def _cleanup_old_seqs(self, seq_idx_end):
-    i = 0
-    while i < len(self.added_data):
-      if self.added_data[i].seq_idx >= seq_idx_end:
-        break
-      i += 1
-    del self.added_data[:i]
+    self.added_data.remove_seqs_before(seq_idx_end)
 
   def _get_seq(self, seq_idx):
-    for data in self.added_data:
-      if data.seq_idx == seq_idx:
-        return data
-    return None
+    return self.added_data.get_seq(seq_idx)
 
   def is_cached(self, start, end):
     # Always False, to force that we call self._load_seqs().
@@ -185,3 +177,119 @@ class CachedDataset2(Dataset):
   def get_data_dtype(self, key):
     self._load_something()
     return self.added_data[0].get_data(key).dtype
+
+
+class DatasetSeqBuffer(object):
+  """
+  The loaded seqs of :class:`CachedDataset2`, ordered by seq_idx.
+  This behaves like a list (len, iteration, indexing, append, +=),
+  but removing the oldest seqs is amortized O(1), and the lookup by seq_idx is O(1)
+  as long as the seq indices are consecutive (which is the case for all our datasets).
+  Internally, this is a list plus an offset to the first valid entry,
+  and the list is only compacted when more than half of it is unused.
+  """
+
+  def __init__(self, seqs=()):
+    """
+    :param list[DatasetSeq]|tuple[DatasetSeq] seqs:
+    """
+    self._seqs = list(seqs)  # type: list[DatasetSeq]
+    self._offset = 0  # self._seqs[:self._offset] are removed
+
+  def __repr__(self):
+    return "<DatasetSeqBuffer %r>" % list(self)
+
+  def __len__(self):
+    return len(self._seqs) - self._offset
+
+  def __bool__(self):
+    return len(self) > 0
+
+  __nonzero__ = __bool__  # Python 2
+
+  def __iter__(self):
+    from itertools import islice
+    return islice(self._seqs, self._offset, None)
+
+  def _get_list_index(self, i):
+    """
+    :param int i: like for a list, can be negative
+    :return: index for self._seqs
+    :rtype: int
+    """
+    if i < 0:
+      i += len(self)
+    if not 0 <= i < len(self):
+      raise IndexError("DatasetSeqBuffer index %i out of range (len %i)" % (i, len(self)))
+    return i + self._offset
+
+  def __getitem__(self, i):
+    """
+    :param int i:
+    :rtype: DatasetSeq
+    """
+    return self._seqs[self._get_list_index(i)]
+
+  def __setitem__(self, i, seq):
+    """
+    :param int i:
+    :param DatasetSeq seq:
+    """
+    self._seqs[self._get_list_index(i)] = seq
+
+  def append(self, seq):
+    """
+    :param DatasetSeq seq:
+    """
+    self._seqs.append(seq)
+
+  def extend(self, seqs):
+    """
+    :param list[DatasetSeq] seqs:
+    """
+    self._seqs.extend(seqs)
+
+  def __iadd__(self, seqs):
+    self.extend(seqs)
+    return self
+
+  def remove_seqs_before(self, seq_idx_end):
+    """
+    Removes the oldest seqs with seq_idx < seq_idx_end.
+
+    :param int seq_idx_end:
+    """
+    while self._offset < len(self._seqs) and self._seqs[self._offset].seq_idx < seq_idx_end:
+      self._seqs[self._offset] = None  # free memory
+      self._offset += 1
+    if self._offset * 2 > len(self._seqs):
+      del self._seqs[:self._offset]
+      self._offset = 0
+
+  def get_seq(self, seq_idx):
+    """
+    :param int seq_idx:
+    :return: seq with that seq_idx, or None if it is not in the buffer
+    :rtype: DatasetSeq|None
+    """
+    if not self:
+      return None
+    i = seq_idx - self[0].seq_idx
+    if 0 <= i < len(self) and self[i].seq_idx == seq_idx:
+      return self[i]
+    for seq in self:  # fallback, if the seq indices are not consecutive
+      if seq.seq_idx == seq_idx:
+        return seq
+    return None
+
+  def shuffle_tail(self, start, rng):
+    """
+    Shuffles the seqs self[start:] in-place (Fisher-Yates).
+
+    :param int start: index, like for a list
+    :param random.Random rng:
+    """
+    start = self._get_list_index(start)
+    for i in range(len(self._seqs) - 1, start, -1):
+      j = rng.randint(start, i)
+      self._seqs[i], self._seqs[j] = self._seqs[j], self._seqs[i]
@@ -37,6 +37,7 @@ class Dataset(object):
       if value is not None and key not in kwargs:
         kwargs[key] = value
     set_or_remove("window", config.int('window', 0) or None)
+    set_or_remove("window_view", config.bool('window_view', False) or None)
     set_or_remove("context_window", config.typed_value("context_window"))
     set_or_remove("chunking", config.value("chunking", None))
     set_or_remove("seq_ordering", config.value("batching", None))
@@ -53,18 +54,24 @@ class Dataset(object):
     return cls(**kwargs)
 
   def __init__(self, name="dataset",
-               window=1, context_window=None, chunking="0",
+               window=1, window_view=False, context_window=None, chunking="0",
                seq_ordering='default', shuffle_frames_of_nseqs=0,
+               partition_index=0, num_partitions=1,
                estimated_num_seqs=None,):
     """
     :param str name: e.g. "train" or "eval"
     :param int window: features will be of dimension window * feature_dim, as we add a context-window around.
       not all datasets support this option.
+    :param bool window_view: the context-window features (see :func:`sliding_window`) are a read-only strided view
+      on the zero-padded seq, instead of a copy, i.e. they don't need window times the memory.
     :param None|int|dict|NumbersDict context_window: will add this context for each chunk
     :param str chunking: "chunk_size:chunk_step"
     :param str seq_ordering: "batching"-option in config. e.g. "default", "sorted" or "random".
       See self.get_seq_order_for_epoch() for more details.
     :param int shuffle_frames_of_nseqs: shuffles the frames. not always supported
+    :param int partition_index: with num_partitions > 1, we only use this part of the seqs in every epoch.
+      see :func:`set_partition` and :func:`get_partition_of_seq_order`
+    :param int num_partitions: e.g. the number of parallel forward jobs or data-parallel workers
     :param None|int estimated_num_seqs: for progress reporting in case the real num_seqs is unknown
     """
     self.name = name
@@ -72,6 +79,7 @@ class Dataset(object):
     self.num_inputs = 0
     self.num_outputs = None; " :type: dict[str,(int,int)] "  # tuple is num-classes, len(shape).
     self.window = window
+    self.window_view = window_view
     self.seq_ordering = seq_ordering  # "default", "sorted" or "random". See self.get_seq_order_for_epoch().
     self.timestamps = []
     self.labels = {}; """ :type: dict[str,list[str]] """
@@ -97,6 +105,9 @@ class Dataset(object):
     assert isinstance(context_window, NumbersDict)
     self.context_window = context_window
     self.shuffle_frames_of_nseqs = shuffle_frames_of_nseqs
+    assert num_partitions >= 1 and 0 <= partition_index < num_partitions
+    self.partition_index = partition_index
+    self.num_partitions = num_partitions
     self.epoch = None
 
   def __repr__(self):
@@ -109,12 +120,31 @@ class Dataset(object):
     """
     from numpy.lib.stride_tricks import as_strided
     x = numpy.concatenate([self.zpad, xr, self.zpad])
+    if self.window_view:
+      return self.get_context_window_view(x, num_frames=xr.shape[0], window=self.window)
     return as_strided(
       x,
       shape=(x.shape[0] - self.window + 1, 1, self.window, self.num_inputs),
       strides=(x.strides[0], x.strides[1] * self.num_inputs) + x.strides
       ).reshape((xr.shape[0], self.num_inputs * self.window))
 
+  @staticmethod
+  def get_context_window_view(x, num_frames, window):
+    """
+    :param numpy.ndarray x: (num_frames + window - 1, dim), zero-padded seq
+    :param int num_frames:
+    :param int window:
+    :return: read-only view (num_frames, window * dim), where frame t is x[t:t + window].flatten().
+      This works because x[t:t + window] is contiguous in memory.
+    :rtype: numpy.ndarray
+    """
+    from numpy.lib.stride_tricks import as_strided
+    assert x.ndim == 2 and x.shape[0] == num_frames + window - 1
+    x = numpy.ascontiguousarray(x)
+    v = as_strided(x, shape=(num_frames, window * x.shape[1]), strides=(x.strides[0], x.strides[1]))
+    v.flags.writeable = False
+    return v
+
   def preprocess(self, seq):
     """
     :type seq: numpy.ndarray
@@ -262,8 +292,54 @@ class Dataset(object):
       rnd.shuffle(seq_index)
     else:
       assert False, "invalid batching specified: " + self.seq_ordering
+    if self.num_partitions > 1:
+      seq_index = self.get_partition_of_seq_order(seq_index, get_seq_len=get_seq_len)
     return seq_index
 
+  def set_partition(self, partition_index, num_partitions):
+    """
+    Every epoch, after the epoch seq order is calculated (see :func:`get_seq_order_for_epoch`),
+    we will only use the seqs of the given partition, see :func:`get_partition_of_seq_order`.
+    This is for multiple processes which each should only go through their share of the dataset,
+    e.g. parallel forwarding or data-parallel training (see :mod:`TFDataParallel`).
+    All processes must use the same dataset options (incl. the seq ordering), and a different partition_index.
+    The partition is not applied if you pass a predefined seq_list to :func:`init_seq_order`.
+    Datasets which wrap other datasets will forward this to them.
+    Call :func:`init_seq_order` afterwards.
+
+    :param int partition_index: 0 <= partition_index < num_partitions
+    :param int num_partitions: 1 means to use all seqs
+    """
+    assert num_partitions >= 1 and 0 <= partition_index < num_partitions, (
+      "invalid partition %r of %r" % (partition_index, num_partitions))
+    self.partition_index = partition_index
+    self.num_partitions = num_partitions
+
+  def get_partition_of_seq_order(self, seq_index, get_seq_len=None):
+    """
+    Splits the seq order into self.num_partitions parts and returns the part self.partition_index.
+    We go through the seqs in the given order and assign every seq to the part
+    with the fewest frames so far (or the lowest part index in case of a tie).
+    Thus the parts are balanced by the number of frames, and every part keeps the relative order of the seqs,
+    e.g. when sorted by length, every part is also sorted.
+    This is deterministic, thus all processes which calculate the same seq order get disjoint parts.
+    Without seq lengths, this is just round-robin.
+
+    :param list[int] seq_index: the full seq order of the epoch
+    :param ((int) -> int)|None get_seq_len: function (originalSeqIdx: int) -> int
+    :return: the part of seq_index for self.partition_index
+    :rtype: list[int]
+    """
+    import heapq
+    parts_num_frames = [(0, part_idx) for part_idx in range(self.num_partitions)]  # heap, (num frames, part idx)
+    part_seq_index = []
+    for seq_idx in seq_index:
+      num_frames, part_idx = parts_num_frames[0]
+      heapq.heapreplace(parts_num_frames, (num_frames + (get_seq_len(seq_idx) if get_seq_len else 1), part_idx))
+      if part_idx == self.partition_index:
+        part_seq_index.append(seq_idx)
+    return part_seq_index
+
   def init_seq_order(self, epoch=None, seq_list=None):
     """
     :type epoch: int|None
@@ -738,7 +814,7 @@ class DatasetSeq:
     return self.targets[key]
 
   def get_data_keys(self):
-    return ["data"] + self.targets.keys()
+    return ["data"] + list(self.targets.keys())
 
   def __repr__(self):
     return "<DataCache seq_idx=%i>" % self.seq_idx
@@ -1,7 +1,7 @@
 
 from __future__ import print_function
 
-from TaskSystem import AsyncTask, ProcConnectionDied
+from TaskSystem import AsyncTask, ProcConnectionDied, SharedMem, SharedNumpyArray
 from Updater import Updater
 from Util import cmd, progress_bar, dict_diff_str, hms, start_daemon_thread, interrupt_main, CalledProcessError, NumbersDict, custom_exec, dict_joined, attr_chain
 from Log import log
@@ -282,6 +282,14 @@ class Device(object):
     update_specs.setdefault('block_size', 0)
     self.update_specs = update_specs
     self.main_pid = os.getpid()
+    # Host side: the params are exchanged with the device proc via this shared memory buffer, if possible.
+    # See self._get_param_buffer_views().
+    self.param_sync_shared_mem = (
+      not blocking and config.bool("device_param_sync_shared_mem", True) and
+      sys.platform != "win32" and SharedMem.is_shmget_functioning())
+    self._param_buffer = None; " :type: SharedNumpyArray|None "
+    self._param_buffer_array = None; " :type: numpy.ndarray|None "  # float32, all params flattened and concatenated
+    self._param_buffer_synced = None; " :type: SharedNumpyArray|None "  # see self.sync_net_train_params()
 
     if blocking:
       if device[0:3] == 'gpu':
@@ -1035,6 +1043,8 @@ class Device(object):
     output_queue.send(len(self.trainnet.train_params_vars))
     print("Device %s proc, pid %i is ready for commands." % (device, os.getpid()), file=log.v4)
     network_params = []
+    param_buffer = None  # SharedNumpyArray, via self._get_param_buffer_views()
+    param_buffer_array = None  # numpy.ndarray
     while True:
       cmd = input_queue.recv()
       if cmd == "stop":  # via self.terminate()
@@ -1107,6 +1117,21 @@ class Device(object):
           our_p_train.set_value(converted)
           if not self.testnet_share_params:
             our_params_testnet[i].set_value(converted)
+      elif cmd == "set-param-buffer":  # via self._get_param_buffer_views()
+        if param_buffer is not None:
+          param_buffer.set_unused()  # the host will not use it anymore
+        param_buffer = input_queue.recv()
+        assert isinstance(param_buffer, SharedNumpyArray)
+        param_buffer_array = param_buffer.create_numpy_array()
+      elif cmd == "set-net-params-shared-mem":  # via self.set_net_encoded_params()
+        our_params_trainnet = self.trainnet.get_all_params_vars()
+        our_params_testnet = self.testnet.get_all_params_vars()
+        params = self._make_param_views(
+          param_buffer_array, [p.get_value(borrow=True, return_internal_type=True).shape for p in our_params_trainnet])
+        for i, param in enumerate(params):
+          our_params_trainnet[i].set_value(param)  # copies
+          if not self.testnet_share_params:
+            our_params_testnet[i].set_value(param)
       elif cmd == 'get-num-updates':
         if self.updater:
           output_queue.send(int(self.updater.i.get_value()))
@@ -1118,6 +1143,13 @@ class Device(object):
         for p in network_params:
           output_queue.send_bytes(p)
         output_queue.send("end-get-net-train-params")
+      elif cmd == "get-net-train-params-shared-mem":  # via self.sync_net_train_params()/get_net_train_params()
+        our_params_trainnet = self.trainnet.get_all_params_vars()
+        params = self._make_param_views(
+          param_buffer_array, [p.get_value(borrow=True, return_internal_type=True).shape for p in our_params_trainnet])
+        for our_p, param in zip(our_params_trainnet, params):
+          param[...] = our_p.get_value(borrow=True)
+        output_queue.send("net-train-params-shared-mem")
       elif cmd == "sync-net-train-params":
         network_params = []
         for p in self.trainnet.get_all_params_vars():
@@ -1146,15 +1178,98 @@ class Device(object):
       else:
         raise Exception("cmd %s unknown" % cmd)
 
+  @staticmethod
+  def _make_param_views(buffer_array, shapes):
+    """
+    :param numpy.ndarray buffer_array: 1D, all params flattened and concatenated
+    :param list[tuple[int]] shapes:
+    :return: views into buffer_array, one for every param
+    :rtype: list[numpy.ndarray]
+    """
+    views = []
+    offset = 0
+    for shape in shapes:
+      size = int(numpy.prod(shape))
+      views.append(buffer_array[offset:offset + size].reshape(shape))
+      offset += size
+    assert offset == buffer_array.shape[0], "param buffer size mismatch"
+    return views
+
+  def _get_param_buffer_views(self, shapes):
+    """
+    Host side. If enabled (see self.param_sync_shared_mem), the params are exchanged with the device proc
+    via a shared memory buffer, thus a sync is just a copy, and not a serialization over the pipe.
+    The buffer is (re)allocated when the param sizes change, e.g. after a reinit.
+
+    :param list[tuple[int]] shapes: of all the params
+    :return: views into the buffer, one for every param, or None if we don't use shared memory
+    :rtype: list[numpy.ndarray]|None
+    """
+    if not self.param_sync_shared_mem:
+      return None
+    total_size = sum([int(numpy.prod(shape)) for shape in shapes])
+    if self._param_buffer_array is None or self._param_buffer_array.shape[0] != total_size:
+      try:
+        param_buffer = SharedNumpyArray.create_new(
+          shape=(total_size,), strides=None, typestr=numpy.dtype("float32").str)
+      except SharedMem.ShmException as exc:
+        print("Device %s: cannot use shared memory for the params (%s), will use the pipe." % (self.name, exc),
+              file=log.v3)
+        self.param_sync_shared_mem = False
+        return None
+      # The device proc will mark the old buffer as unused, so that it can be reused.
+      self.input_queue.send("set-param-buffer")
+      self.input_queue.send(param_buffer)
+      self._param_buffer = param_buffer
+      self._param_buffer_array = param_buffer.create_numpy_array()
+    return self._make_param_views(self._param_buffer_array, shapes)
+
   def sync_net_train_params(self):
-    if not self.blocking:
+    """
+    Host side. The device proc prepares its current train params, which we get via self.get_net_train_params().
+    This does not wait for the device, thus if you call this for all devices first, they do it in parallel.
+    """
+    if self.blocking:
+      return
+    if not self.param_sync_shared_mem:
       self.input_queue.send("sync-net-train-params")
+    elif self._param_buffer_array is not None:
+      # The device proc copies its params into the shared buffer. We wait for that in get_net_train_params().
+      # Without a buffer so far, get_net_train_params() will allocate it and do the whole sync.
+      assert self._param_buffer_synced is None, "sync_net_train_params() twice without get_net_train_params()"
+      self.input_queue.send("get-net-train-params-shared-mem")
+      self._param_buffer_synced = self._param_buffer
+
+  def _wait_for_param_buffer_sync(self):
+    """
+    Host side. Waits until the device proc has copied its params into the shared buffer,
+    if this was requested via self.sync_net_train_params().
+
+    :return: the buffer which contains the synced params, or None
+    :rtype: SharedNumpyArray|None
+    """
+    synced_buffer = self._param_buffer_synced
+    if synced_buffer is not None:
+      self._param_buffer_synced = None
+      r = self.output_queue.recv()
+      assert r == "net-train-params-shared-mem"
+    return synced_buffer
 
   def get_net_train_params(self, network):
     if self.blocking:
       return [v.get_value(borrow=True, return_internal_type=True) for v in self.trainnet.get_all_params_vars()]
+    assert self.main_pid == os.getpid()
+    synced_buffer = self._wait_for_param_buffer_sync()
+    vars = network.get_all_params_vars()
+    views = self._get_param_buffer_views([p.get_value(borrow=True, return_internal_type=True).shape for p in vars])
+    if views is not None:
+      if self._param_buffer is not synced_buffer:  # no sync_net_train_params() before, or the buffer was reallocated
+        self.input_queue.send("get-net-train-params-shared-mem")
+        r = self.output_queue.recv()
+        assert r == "net-train-params-shared-mem"
+      # Copy, because the buffer will be overwritten by the next sync.
+      return [view.copy() for view in views]
     else:
-      assert self.main_pid == os.getpid()
       self.input_queue.send("get-net-train-params")
       r = self.output_queue.recv()
       assert r == "net-train-params"
@@ -1175,6 +1290,13 @@ class Device(object):
     This updates *all* params, not just the train params.
     """
     assert not self.blocking
+    self._wait_for_param_buffer_sync()  # the device proc must not write into the buffer anymore
+    views = self._get_param_buffer_views([p.shape for p in network_params])
+    if views is not None:
+      for view, p in zip(views, network_params):
+        view[...] = p
+      self.input_queue.send("set-net-params-shared-mem")
+      return
     self.input_queue.send("set-net-params")
     self.input_queue.send(len(network_params))
     for p in network_params:
@@ -41,7 +41,11 @@ class GeneratingDataset(Dataset):
     """
     super(GeneratingDataset, self).init_seq_order(epoch=epoch)
     assert not seq_list, "predefined order doesn't make sense for %s" % self.__class__.__name__
-    self.random.seed(self.fixed_random_seed or epoch or 1)
+    if self.num_partitions > 1:
+      # Every partition should generate different random seqs.
+      self.random.seed([self.fixed_random_seed or epoch or 1, self.partition_index])
+    else:
+      self.random.seed(self.fixed_random_seed or epoch or 1)
     self._num_timesteps = 0
     self.reached_final_seq = False
     self.expected_load_seq_start = 0
@@ -95,7 +99,7 @@ class GeneratingDataset(Dataset):
       end = self.num_seqs
     if end >= self.num_seqs:
       self.reached_final_seq = True
-    seqs = [self.generate_seq(seq_idx=seq_idx) for seq_idx in range(start, end)]
+    seqs = [self._generate_seq_of_partition(seq_idx=seq_idx) for seq_idx in range(start, end)]
     if self.window > 1:
       for seq in seqs:
         seq.features = self.sliding_window(seq.features)
@@ -109,6 +113,20 @@ class GeneratingDataset(Dataset):
     """
     raise NotImplementedError
 
+  def _generate_seq_of_partition(self, seq_idx):
+    """
+    We don't know the seq lengths in advance, thus a partition (see :func:`set_partition`)
+    just takes every num_partitions-th seq of the whole dataset.
+
+    :param int seq_idx: seq idx in the current partition
+    :rtype: DatasetSeq
+    """
+    if self.num_partitions == 1:
+      return self.generate_seq(seq_idx=seq_idx)
+    seq = self.generate_seq(seq_idx=seq_idx * self.num_partitions + self.partition_index)
+    seq.seq_idx = seq_idx
+    return seq
+
   def _shuffle_frames_in_seqs(self, start, end):
     assert False, "Shuffling in GeneratingDataset does not make sense."
 
@@ -118,6 +136,8 @@ class GeneratingDataset(Dataset):
 
   @property
   def num_seqs(self):
+    if self.num_partitions > 1 and self._num_seqs != float("inf"):
+      return max(self._num_seqs - self.partition_index + self.num_partitions - 1, 0) // self.num_partitions
     return self._num_seqs
 
   def get_seq_length(self, sorted_seq_idx):
@@ -528,6 +548,99 @@ class DummyDataset(GeneratingDataset):
     return DatasetSeq(seq_idx=seq_idx, features=features, targets=targets)
 
 
+class SyntheticDataset(GeneratingDataset):
+  """
+  Random data, meant to benchmark the data pipeline (batching, TFDataPipeline, engine),
+  i.e. generating it is almost for free:
+  For every data key, we pregenerate a random buffer once, and every seq is just a slice of it.
+  The seq lengths and buffer offsets for the whole epoch are drawn at once in init_seq_order().
+
+  Example:
+
+      {"class": "SyntheticDataset", "num_seqs": 10000, "input_dim": 40,
+       "output_dim": {"classes": (1000, 1), "orth": (30, 1), "feat": (10, 2)},
+       "seq_len_distribution": "lognormal", "seq_len_mean": 500, "seq_len_stddev": 200,
+       "target_len_ratio": {"orth": 0.1}}
+  """
+
+  def __init__(self, input_dim, output_dim, num_seqs,
+               seq_len_distribution="lognormal", seq_len_mean=100, seq_len_stddev=30,
+               seq_len_min=1, seq_len_max=1000, target_len_ratio=None,
+               buffer_num_frames=100000, **kwargs):
+    """
+    :param int input_dim: dense "data"
+    :param int|dict[str,int|(int,int)|dict] output_dim: targets. sparse (int32) if len(shape) == 1, otherwise dense
+    :param int num_seqs:
+    :param str seq_len_distribution: "lognormal", "uniform" (in [seq_len_min, seq_len_max]) or "fixed" (seq_len_mean)
+    :param int|float seq_len_mean:
+    :param int|float seq_len_stddev: for "lognormal"
+    :param int seq_len_min: we clip to [seq_len_min, seq_len_max]
+    :param int seq_len_max:
+    :param dict[str,float]|None target_len_ratio: target key -> len of the target relative to the data len.
+      by default 1, i.e. frame-wise targets
+    :param int buffer_num_frames: size of the pregenerated buffer of every data key
+    """
+    super(SyntheticDataset, self).__init__(input_dim=input_dim, output_dim=output_dim, num_seqs=num_seqs, **kwargs)
+    assert seq_len_distribution in ("lognormal", "uniform", "fixed")
+    assert num_seqs != float("inf")
+    assert 0 < seq_len_min <= seq_len_max
+    assert seq_len_max * max([1.0] + list((target_len_ratio or {}).values())) <= buffer_num_frames
+    self.seq_len_distribution = seq_len_distribution
+    self.seq_len_mean = seq_len_mean
+    self.seq_len_stddev = seq_len_stddev
+    self.seq_len_min = seq_len_min
+    self.seq_len_max = seq_len_max
+    self.target_len_ratio = target_len_ratio or {}
+    rnd = numpy.random.RandomState(42)
+    self._buffers = {}; " :type: dict[str,numpy.ndarray] "  # data key -> (buffer_num_frames[,dim])
+    for key, (dim, ndim) in self.num_outputs.items():
+      if ndim == 1:
+        buf = rnd.randint(0, dim, size=(buffer_num_frames,)).astype("int32")
+      else:
+        buf = rnd.uniform(-1.0, 1.0, size=(buffer_num_frames, dim)).astype("float32")
+      buf.flags.writeable = False  # the seqs are views on it
+      self._buffers[key] = buf
+    self._seq_lens = None; " :type: numpy.ndarray "  # (num_seqs,), data len
+    self._seq_offsets = None; " :type: dict[str,numpy.ndarray] "  # data key -> (num_seqs,)
+
+  def init_seq_order(self, epoch=None, seq_list=None):
+    super(SyntheticDataset, self).init_seq_order(epoch=epoch, seq_list=seq_list)
+    num_seqs = self._num_seqs
+    if self.seq_len_distribution == "lognormal":
+      # Parametrize such that the lognormal distribution has the given mean and stddev.
+      sigma2 = numpy.log(1.0 + (float(self.seq_len_stddev) / self.seq_len_mean) ** 2)
+      seq_lens = self.random.lognormal(
+        mean=numpy.log(self.seq_len_mean) - sigma2 / 2.0, sigma=numpy.sqrt(sigma2), size=(num_seqs,))
+    elif self.seq_len_distribution == "uniform":
+      seq_lens = self.random.randint(self.seq_len_min, self.seq_len_max + 1, size=(num_seqs,))
+    else:
+      seq_lens = numpy.full((num_seqs,), self.seq_len_mean)
+    self._seq_lens = numpy.clip(numpy.round(seq_lens), self.seq_len_min, self.seq_len_max).astype("int64")
+    self._seq_offsets = {}
+    for key, buf in self._buffers.items():
+      max_len = int(numpy.ceil(self.seq_len_max * self.target_len_ratio.get(key, 1.0)))
+      self._seq_offsets[key] = self.random.randint(0, buf.shape[0] - max_len + 1, size=(num_seqs,))
+    return True
+
+  def generate_seq(self, seq_idx):
+    """
+    :type seq_idx: int
+    :rtype: DatasetSeq
+    """
+    data = {}
+    for key, buf in self._buffers.items():
+      seq_len = self._seq_lens[seq_idx]
+      if key in self.target_len_ratio:
+        seq_len = max(int(round(seq_len * self.target_len_ratio[key])), 1)
+      offset = self._seq_offsets[key][seq_idx]
+      data[key] = buf[offset:offset + seq_len]
+    features = data.pop("data")
+    return DatasetSeq(seq_idx=seq_idx, features=features, targets=data)
+
+  def get_target_list(self):
+    return sorted([key for key in self.num_outputs.keys() if key != "data"])
+
+
 class StaticDataset(GeneratingDataset):
 
   def __init__(self, data, target_list=None, output_dim=None, input_dim=None, **kwargs):
@@ -635,6 +748,49 @@ class _NltkCorpusReaderDataset(CachedDataset2):
   # TODO ...
 
 
+def _get_timit_features(audio, sample_rate, num_feature_filters, window_len, step_len, with_delta):
+  """
+  :param numpy.ndarray audio: raw time signal, peak-normalized
+  :param int sample_rate:
+  :param int num_feature_filters: e.g. number of MFCCs
+  :param float window_len: in seconds
+  :param float step_len: in seconds
+  :param bool with_delta: whether to add delta features (doubles the features dim)
+  :return: MFCCs with energy, shape (time, dim)
+  :rtype: numpy.ndarray
+  """
+  # Alternatives for MFCC: python_speech_features, talkbox.features.mfcc, librosa
+  import librosa
+  mfccs = librosa.feature.mfcc(
+    audio, sr=sample_rate,
+    n_mfcc=num_feature_filters,
+    hop_length=int(step_len * sample_rate), n_fft=int(window_len * sample_rate))
+  energy = librosa.feature.rmse(
+    audio,
+    hop_length=int(step_len * sample_rate), n_fft=int(window_len * sample_rate))
+  mfccs[0] = energy  # replace first MFCC with energy, per convention
+  assert mfccs.shape[0] == num_feature_filters  # (dim, time)
+  if with_delta:
+    deltas = librosa.feature.delta(mfccs)
+    mfccs = numpy.vstack([mfccs, deltas])
+  return mfccs.transpose().astype("float32")  # (time, dim)
+
+
+def _load_timit_features(args):
+  """
+  Loads the audio file and calculates the features.
+  This is used by the worker processes in :func:`TimitDataset._write_feature_cache`.
+
+  :param (str,dict[str]) args: audio filename, kwargs for :func:`_get_timit_features`
+  :rtype: numpy.ndarray
+  """
+  import librosa
+  audio_filename, feature_opts = args
+  audio, sample_rate = librosa.load(audio_filename, sr=None)
+  audio /= numpy.max(numpy.abs(audio))
+  return _get_timit_features(audio=audio, sample_rate=sample_rate, **feature_opts)
+
+
 class TimitDataset(CachedDataset2):
   """
   DARPA TIMIT Acoustic-Phonetic Continuous Speech Corpus.
@@ -722,7 +878,8 @@ class TimitDataset(CachedDataset2):
   def __init__(self, timit_dir, train=True, preload=False,
                num_feature_filters=40, feature_window_len=0.025, feature_step_len=0.010, with_delta=False,
                random_permute_audio=None, num_phones=61,
-               demo_play_audio=False, fixed_random_seed=None, **kwargs):
+               demo_play_audio=False, fixed_random_seed=None,
+               feature_cache_dir=None, num_feature_cache_workers=4, **kwargs):
     """
     :param str timit_dir: directory of TIMIT. should contain train/filelist.phn and test/filelist.core.phn
     :param bool train: whether to use the train or core test data
@@ -733,6 +890,11 @@ class TimitDataset(CachedDataset2):
     :param int num_phones: 39, 48 or 61. num labels of our classes
     :param bool demo_play_audio: plays the audio. only make sense with tools/dump-dataset.py
     :param None|int fixed_random_seed: if given, use this fixed random seed in every epoch
+    :param str|None feature_cache_dir: if given, the features are stored in this directory,
+      in a file named by a hash of the corpus and the feature options. If it does not exist yet,
+      it is created at __init__, using num_feature_cache_workers processes.
+      Not used with random_permute_audio or demo_play_audio, as we need the audio then.
+    :param int num_feature_cache_workers:
     """
     super(TimitDataset, self).__init__(**kwargs)
     from threading import Lock, Thread
@@ -760,6 +922,10 @@ class TimitDataset(CachedDataset2):
 
     self._init_timit()
 
+    self._feature_cache = None  # (features, offsets), see _init_feature_cache
+    if feature_cache_dir and not self._random_permute_audio.truth_value and not demo_play_audio:
+      self._init_feature_cache(cache_dir=feature_cache_dir, num_workers=num_feature_cache_workers)
+
     self._audio_data = {}  # seq_tag -> (audio, sample_rate). loaded by self._reader_thread_main
     self._phone_seqs = {}  # seq_tag -> phone_seq (list of str)
     self._reader_thread = Thread(name="%r reader" % self, target=self._reader_thread_main)
@@ -790,13 +956,85 @@ class TimitDataset(CachedDataset2):
     self._num_seqs = len(self._seq_tags)
     self._seq_order = list(range(self._num_seqs))
 
+  def _get_feature_opts(self):
+    """
+    :return: kwargs for :func:`_get_timit_features`
+    :rtype: dict[str]
+    """
+    return dict(
+      num_feature_filters=self._num_feature_filters,
+      window_len=self._feature_window_len, step_len=self._feature_step_len,
+      with_delta=self._with_delta)
+
+  def _get_feature_cache_prefix(self, cache_dir):
+    """
+    :param str cache_dir:
+    :return: prefix for the :class:`NumpyDumpDataset` binary format.
+      the name includes a hash of everything which determines the features.
+    :rtype: str
+    """
+    import os
+    import hashlib
+    key = repr((os.path.abspath(self._timit_dir), self._seq_tags, sorted(self._get_feature_opts().items())))
+    return "%s/%s.%s." % (cache_dir, self.__class__.__name__, hashlib.sha1(key.encode("utf8")).hexdigest()[:16])
+
+  def _init_feature_cache(self, cache_dir, num_workers):
+    """
+    Sets self._feature_cache. Creates the cache if it does not exist yet.
+
+    :param str cache_dir:
+    :param int num_workers:
+    """
+    import os
+    from NumpyDumpDataset import NumpyDumpDataset
+    prefix = self._get_feature_cache_prefix(cache_dir)
+    # The index is written last, so when it exists, the cache is complete.
+    if not os.path.exists(prefix + NumpyDumpDataset.binary_index_filename):
+      if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+      self._write_feature_cache(prefix, num_workers=num_workers)
+    offsets = numpy.load(prefix + NumpyDumpDataset.binary_index_filename)["data"]
+    assert len(offsets) == len(self._seq_tags) + 1
+    features = numpy.load(NumpyDumpDataset.get_binary_filename(prefix, "data"), mmap_mode="r")
+    print("%r: using feature cache %r" % (self, prefix), file=log.v4)
+    self._feature_cache = (features, offsets)
+
+  def _write_feature_cache(self, prefix, num_workers):
+    """
+    Calculates the features of all seqs, in num_workers processes, and writes them.
+
+    :param str prefix: see :func:`_get_feature_cache_prefix`
+    :param int num_workers:
+    """
+    import time
+    from multiprocessing import Pool
+    from NumpyDumpDataset import NumpyDumpBinaryWriter
+    print("%r: calculating features of %i seqs with %i workers for the cache %r" % (
+      self, len(self._seq_tags), num_workers, prefix), file=log.v3)
+    feature_opts = self._get_feature_opts()
+    writer = NumpyDumpBinaryWriter(prefix=prefix)
+    pool = Pool(max(num_workers, 1))
+    last_print_time = time.time()
+    try:
+      args = [("%s/%s.wav" % (self._timit_dir, seq_tag), feature_opts) for seq_tag in self._seq_tags]
+      # imap keeps the order of the seqs.
+      for i, features in enumerate(pool.imap(_load_timit_features, args, chunksize=4)):
+        writer.add_seq(features=features, targets={})
+        if time.time() - last_print_time > 10:
+          print("%r: features of %i/%i seqs calculated..." % (self, i + 1, len(self._seq_tags)), file=log.v3)
+          last_print_time = time.time()
+    finally:
+      pool.terminate()
+      pool.join()
+    writer.close()
+
   def _preload(self):
     import time
     last_print_time = 0
     last_print_len = None
     while True:
       with self._lock:
-        cur_len = len(self._audio_data)
+        cur_len = len(self._phone_seqs)  # set after the audio, and also with the feature cache
       if cur_len == len(self._seq_tags):
         return
       if cur_len != last_print_len and time.time() - last_print_time > 10:
@@ -813,13 +1051,13 @@ class TimitDataset(CachedDataset2):
       import better_exchook
       better_exchook.install()
 
-      import librosa
-
       for seq_tag in self._seq_tags:
-        audio_filename = "%s/%s.wav" % (self._timit_dir, seq_tag)
-        audio, sample_rate = librosa.load(audio_filename, sr=None)
-        with self._lock:
-          self._audio_data[seq_tag] = (audio, sample_rate)
+        if self._feature_cache is None:  # otherwise we don't need the audio
+          import librosa
+          audio_filename = "%s/%s.wav" % (self._timit_dir, seq_tag)
+          audio, sample_rate = librosa.load(audio_filename, sr=None)
+          with self._lock:
+            self._audio_data[seq_tag] = (audio, sample_rate)
         phone_seq = self._read_phone_seq(seq_tag)
         with self._lock:
           self._phone_seqs[seq_tag] = phone_seq
@@ -927,9 +1165,9 @@ class TimitDataset(CachedDataset2):
   def init_seq_order(self, epoch=None, seq_list=None):
     assert seq_list is None
     super(TimitDataset, self).init_seq_order(epoch=epoch, seq_list=seq_list)
-    self._num_seqs = len(self._seq_tags)
     self._seq_order = self.get_seq_order_for_epoch(
-      epoch=epoch, num_seqs=self._num_seqs, get_seq_len=lambda i: len(self._seq_tags[i][1]))
+      epoch=epoch, num_seqs=len(self._seq_tags), get_seq_len=lambda i: len(self._seq_tags[i][1]))
+    self._num_seqs = len(self._seq_order)  # might be only a partition, see set_partition()
     self._random.seed(self._fixed_random_seed or epoch or 1)
     return True
 
@@ -969,14 +1207,16 @@ class TimitDataset(CachedDataset2):
     if seq_idx >= len(self._seq_order):
       return None
 
-    # Alternatives for MFCC: python_speech_features, talkbox.features.mfcc, librosa
-    import librosa
-
     seq_tag = self._seq_tags[self._seq_order[seq_idx]]
     phone_seq = self._get_phone_seq(seq_tag)
     phone_seq = [self._phone_map[p] for p in phone_seq]
     phone_seq = [p for p in phone_seq if p]
     phone_id_seq = numpy.array([self.labels.index(p) for p in phone_seq], dtype="int32")
+    if self._feature_cache is not None:
+      features, offsets = self._feature_cache
+      real_seq_idx = self._seq_order[seq_idx]
+      mfccs = features[offsets[real_seq_idx]:offsets[real_seq_idx + 1]]
+      return DatasetSeq(seq_idx=seq_idx, seq_tag=seq_tag, features=mfccs, targets=phone_id_seq)
     # see: https://github.com/rdadolf/fathom/blob/master/fathom/speech/preproc.py
     # and: https://groups.google.com/forum/#!topic/librosa/V4Z1HpTKn8Q
     audio, sample_rate = self._get_audio(seq_tag)
@@ -987,21 +1227,7 @@ class TimitDataset(CachedDataset2):
     if self._demo_play_audio:
       print("play %r" % seq_tag, "min/max:", numpy.min(audio), numpy.max(audio))
       self._demo_audio_play(audio=audio, sample_rate=sample_rate)
-    window_len = self._feature_window_len
-    step_len = self._feature_step_len
-    mfccs = librosa.feature.mfcc(
-      audio, sr=sample_rate,
-      n_mfcc=self._num_feature_filters,
-      hop_length=int(step_len * sample_rate), n_fft=int(window_len * sample_rate))
-    energy = librosa.feature.rmse(
-      audio,
-      hop_length=int(step_len * sample_rate), n_fft=int(window_len * sample_rate))
-    mfccs[0] = energy  # replace first MFCC with energy, per convention
-    assert mfccs.shape[0] == self._num_feature_filters  # (dim, time)
-    if self._with_delta:
-      deltas = librosa.feature.delta(mfccs)
-      mfccs = numpy.vstack([mfccs, deltas])
-    mfccs = mfccs.transpose().astype("float32")  # (time, dim)
+    mfccs = _get_timit_features(audio=audio, sample_rate=sample_rate, **self._get_feature_opts())
     return DatasetSeq(seq_idx=seq_idx, seq_tag=seq_tag, features=mfccs, targets=phone_id_seq)
 
 
@@ -1,3 +1,5 @@
+from __future__ import print_function
+
 import collections
 import gc
 import h5py
@@ -122,7 +124,7 @@ class HDFDataset(CachedDataset):
     """
     Load data sequences.
     As a side effect, will modify / fill-up:
-      self.alloc_intervals
+      self._alloc_seq_data (via insert_alloc_interval())
       self.targets
       self.chars
 
@@ -141,7 +143,7 @@ class HDFDataset(CachedDataset):
     for i in range(len(self.files)):
       if len(file_info[i]) == 0:
         continue
-      print >> log.v4, "loading file", self.files[i]
+      print("loading file", self.files[i], file=log.v4)
       fin = h5py.File(self.files[i], 'r')
       for idc, ids in file_info[i]:
         s = ids - self.file_start[i]
@@ -34,6 +34,9 @@ class LmDataset(CachedDataset2):
                error_on_invalid_seq=True,
                add_delayed_seq_data=False,
                delayed_seq_data_start_symbol="[START]",
+               tokenized_cache_dir=None,
+               stream_corpus=False,
+               stream_shuffle_buffer_size=10000,
                **kwargs):
     """
     :param str|()->str corpus_file: Bliss XML or line-based txt. optionally can be gzip.
@@ -55,6 +58,19 @@ class LmDataset(CachedDataset2):
       delayed_seq_data_start_symbol + original_sequence[:-1]
     :param str delayed_seq_data_start_symbol: used for add_delayed_seq_data
     :param int partition_epoch: whether to partition the epochs into multiple parts. like epoch_split
+    :param str|None tokenized_cache_dir: if given, on the first run, we convert the whole corpus
+      to the symbol indices and store them in this dir (one flat array with all symbols and the offsets per seq),
+      and later runs will just memory-map these files, i.e. we don't need to keep the corpus in memory,
+      and we don't need to parse the orthography again.
+      The files are keyed by a hash of the corpus file (path, size, mtime), the symbol files and the options.
+      Only for orth symbols, not for phone_info.
+    :param bool stream_corpus: if True, we don't load the corpus into memory.
+      Instead, we only build an index of the byte offsets of all lines once (only line-based txt corpus),
+      and every (partition) epoch reads its range of lines lazily from the file.
+      For a gzipped corpus, the seek to the start of the range needs to decompress everything before it.
+      The seq ordering can only be "default" or "random", where "random" is approximated by a shuffle buffer.
+    :param int stream_shuffle_buffer_size: with stream_corpus and random seq ordering,
+      we randomly pick the next seq out of that many seqs
     """
     super(LmDataset, self).__init__(**kwargs)
 
@@ -153,11 +169,111 @@ class LmDataset(CachedDataset2):
       iter_f = _iter_bliss
     else:
       iter_f = _iter_txt
-    self.orths = []
-    iter_f(corpus_file, self.orths.append)
+    self.orths = None  # type: list[str]|None
+    self.tokenized_ids = None  # type: numpy.ndarray|None  # flat, all symbol indices of all seqs
+    self.tokenized_offsets = None  # type: numpy.ndarray|None  # seq i is ids[offsets[i]:offsets[i + 1]]
+    self.corpus_file = corpus_file
+    self.corpus_line_offsets = None  # type: numpy.ndarray|None  # byte offsets of the lines, with stream_corpus
+    self.stream_shuffle_buffer_size = stream_shuffle_buffer_size
+    self._stream_orths_iter = None
+    if stream_corpus:
+      assert iter_f is _iter_txt, "stream_corpus only for line-based txt corpus"
+      assert not tokenized_cache_dir, "stream_corpus and tokenized_cache_dir are exclusive"
+      assert self.seq_ordering == "default" or self.seq_ordering.startswith("random"), (
+        "stream_corpus does not support seq ordering %r" % self.seq_ordering)
+      self.corpus_line_offsets = _get_txt_line_offsets(corpus_file)
+    elif tokenized_cache_dir:
+      assert not self.seq_gen, "tokenized_cache_dir only for orth symbols"
+      self._load_tokenized_cache(
+        corpus_file=corpus_file, iter_f=iter_f,
+        cache_filename_prefix=self._get_tokenized_cache_filename_prefix(
+          cache_dir=tokenized_cache_dir, corpus_file=corpus_file,
+          symbol_files=[orth_symbols_file, orth_symbols_map_file, orth_replace_map_file]))
+    else:
+      self.orths = []
+      iter_f(corpus_file, self.orths.append)
+    self.orths_epoch = None  # type: list[str]|None
+    self.orths_epoch_start = 0
+    self.num_orths_epoch = 0
     # It's only estimated because we might filter some out or so.
-    self._estimated_num_seqs = len(self.orths) // self.partition_epoch
-    print("  done, loaded %i sequences" % len(self.orths), file=log.v4)
+    self._estimated_num_seqs = self._get_num_orths() // self.partition_epoch
+    print("  done, loaded %i sequences" % self._get_num_orths(), file=log.v4)
+
+  def _get_num_orths(self):
+    """
+    :return: number of seqs in the whole corpus (which we did not skip already while creating the cache)
+    :rtype: int
+    """
+    if self.orths is not None:
+      return len(self.orths)
+    if self.corpus_line_offsets is not None:
+      return len(self.corpus_line_offsets)
+    return len(self.tokenized_offsets) - 1
+
+  def _get_tokenized_cache_filename_prefix(self, cache_dir, corpus_file, symbol_files):
+    """
+    :param str cache_dir:
+    :param str corpus_file:
+    :param list[str|None] symbol_files:
+    :return: prefix for the cache files, which includes a hash of all the inputs which influence the tokenization
+    :rtype: str
+    """
+    import hashlib
+    h = hashlib.sha1()
+    # We don't read the whole corpus here, as that could be slow for big corpora.
+    corpus_stat = os.stat(corpus_file)
+    h.update(repr((os.path.realpath(corpus_file), corpus_stat.st_size, corpus_stat.st_mtime)).encode("utf8"))
+    for filename in symbol_files:
+      if filename:
+        with open(filename, "rb") as f:
+          h.update(f.read())
+      else:
+        h.update(b"None")
+    h.update(repr((
+      sorted(self.parse_orth_opts.items()), self.dtype, self.unknown_symbol,
+      self.auto_replace_unknown_symbol, self.error_on_invalid_seq)).encode("utf8"))
+    return os.path.join(cache_dir, "%s.%s" % (os.path.basename(corpus_file), h.hexdigest()[:16]))
+
+  def _load_tokenized_cache(self, corpus_file, iter_f, cache_filename_prefix):
+    """
+    Creates the cache files if they do not exist yet, and memory-maps them.
+
+    :param str corpus_file:
+    :param ((str,(str)->None)->None) iter_f: _iter_bliss or _iter_txt
+    :param str cache_filename_prefix:
+    """
+    ids_filename = cache_filename_prefix + ".ids"
+    offsets_filename = cache_filename_prefix + ".offsets.npy"  # written last, thus marks a complete cache
+    if not os.path.exists(offsets_filename):
+      print("  creating tokenized cache %s ..." % cache_filename_prefix, file=log.v4)
+      if not os.path.isdir(os.path.dirname(cache_filename_prefix)):
+        os.makedirs(os.path.dirname(cache_filename_prefix))
+      tmp_postfix = ".tmp%i" % os.getpid()
+      offsets = [0]
+      self.num_skipped = 0
+      self.num_unknown = 0
+      with open(ids_filename + tmp_postfix, "wb") as ids_file:
+        def add_orth(orth):
+          data = self._orth_to_data(orth)
+          if data is None:
+            return
+          ids_file.write(data.tobytes())
+          offsets.append(offsets[-1] + len(data))
+        iter_f(corpus_file, add_orth)
+      if self.num_skipped > 0:
+        print("  skipped %i sequences" % self.num_skipped, file=log.v4)
+      with open(offsets_filename + tmp_postfix, "wb") as offsets_file:
+        numpy.save(offsets_file, numpy.array(offsets, dtype="int64"))
+      os.rename(ids_filename + tmp_postfix, ids_filename)
+      os.rename(offsets_filename + tmp_postfix, offsets_filename)
+    else:
+      print("  using tokenized cache %s" % cache_filename_prefix, file=log.v4)
+    self.tokenized_offsets = numpy.load(offsets_filename, mmap_mode="r")
+    if self.tokenized_offsets[-1] > 0:
+      self.tokenized_ids = numpy.memmap(ids_filename, dtype=self.dtype, mode="r")
+      assert len(self.tokenized_ids) == self.tokenized_offsets[-1], "%s: invalid cache" % cache_filename_prefix
+    else:  # numpy.memmap cannot map empty files
+      self.tokenized_ids = numpy.zeros((0,), dtype=self.dtype)
 
   def get_target_list(self):
     return sorted([k for k in self.num_outputs.keys() if k != "data"])
@@ -169,11 +285,24 @@ class LmDataset(CachedDataset2):
     assert seq_list is None
     super(LmDataset, self).init_seq_order(epoch=epoch)
     epoch = epoch or 1
-    self.orths_epoch = self.orths[
-                       len(self.orths) * (epoch % self.partition_epoch) // self.partition_epoch:
-                       len(self.orths) * ((epoch % self.partition_epoch) + 1) // self.partition_epoch]
-    self.seq_order = self.get_seq_order_for_epoch(
-      epoch=epoch, num_seqs=len(self.orths_epoch), get_seq_len=lambda i: len(self.orths_epoch[i]))
+    num_orths = self._get_num_orths()
+    self.orths_epoch_start = num_orths * (epoch % self.partition_epoch) // self.partition_epoch
+    orths_epoch_end = num_orths * ((epoch % self.partition_epoch) + 1) // self.partition_epoch
+    self.num_orths_epoch = orths_epoch_end - self.orths_epoch_start
+    if self.corpus_line_offsets is not None:
+      self.orths_epoch = None
+      self.seq_order = None
+      self._stream_orths_iter = self._iter_stream_orths(
+        start=self.orths_epoch_start, end=orths_epoch_end, epoch=epoch)
+    elif self.orths is not None:
+      self.orths_epoch = self.orths[self.orths_epoch_start:orths_epoch_end]
+      get_seq_len = lambda i: len(self.orths_epoch[i])
+    else:
+      offsets = self.tokenized_offsets[self.orths_epoch_start:orths_epoch_end + 1]
+      get_seq_len = lambda i: offsets[i + 1] - offsets[i]
+    if self.corpus_line_offsets is None:
+      self.seq_order = self.get_seq_order_for_epoch(
+        epoch=epoch, num_seqs=self.num_orths_epoch, get_seq_len=get_seq_len)
     self.next_orth_idx = 0
     self.next_seq_idx = 0
     self.num_skipped = 0
@@ -200,6 +329,105 @@ class LmDataset(CachedDataset2):
     if not self.log_auto_replace_unknown_symbols:
       print("LmDataset: will stop logging about auto-replace with unknown symbol now", file=log.v4)
 
+  def _iter_stream_orths(self, start, end, epoch):
+    """
+    Reads the lines [start, end) of the corpus file, see stream_corpus.
+    With a partition (see :func:`set_partition`), this only takes every num_partitions-th line.
+    With random seq ordering, we shuffle them via a buffer of stream_shuffle_buffer_size lines.
+
+    :param int start: line index, see self.corpus_line_offsets
+    :param int end: line index, exclusive
+    :param int epoch: for the random seed
+    :return: yields the orths
+    :rtype: typing.Iterator[str]
+    """
+    shuffle = self.seq_ordering.startswith("random")
+    rnd = Random(epoch)
+    buffer = []  # type: list[str]
+    if start >= end:
+      return
+    f = open(self.corpus_file, 'rb')
+    if self.corpus_file.endswith(".gz"):
+      f = gzip.GzipFile(fileobj=f)
+    f.seek(self.corpus_line_offsets[start])
+    line_idx = start
+    for l in f:
+      if line_idx >= end:
+        break
+      l = _decode_txt_line(l)
+      if not l:
+        continue  # not counted in the line offsets
+      line_idx += 1
+      if self.num_partitions > 1 and (line_idx - 1 - start) % self.num_partitions != self.partition_index:
+        continue
+      if not shuffle:
+        yield l
+        continue
+      buffer.append(l)
+      if len(buffer) >= self.stream_shuffle_buffer_size:
+        i = rnd.randrange(len(buffer))
+        buffer[i], buffer[-1] = buffer[-1], buffer[i]
+        yield buffer.pop()
+    f.close()
+    rnd.shuffle(buffer)
+    for l in buffer:
+      yield l
+
+  def _orth_to_data(self, orth):
+    """
+    :param str orth:
+    :return: symbol indices, or None if we skip this seq
+    :rtype: numpy.ndarray|None
+    """
+    if orth == "</s>":
+      return None  # special sentence end symbol. empty seq, ignore.
+
+    if self.seq_gen:
+      try:
+        return self.seq_gen.generate_class_idxs_seq(orth, dtype=self.dtype)
+      except KeyError as e:
+        if self.log_skipped_seqs:
+          print("LmDataset: skipping sequence %r because of missing lexicon entry: %s" % (orth, e), file=log.v4)
+          self._reduce_log_skipped_seqs()
+        if self.error_on_invalid_seq:
+          raise Exception("LmDataset: invalid seq %r, missing lexicon entry %r" % (orth, e))
+        self.num_skipped += 1
+        return None
+
+    assert self.orth_symbols
+    orth_syms_parsed = parse_orthography(orth, **self.parse_orth_opts)
+    while True:
+      orth_syms = orth_syms_parsed
+      if self.orth_replace_map:
+        orth_syms = [s_ for s in orth_syms for s_ in self.orth_replace_map.get(s, [s])]
+      # collapse multiple spaces
+      orth_syms = [s for (i, s) in enumerate(orth_syms) if s != " " or i == 0 or orth_syms[i - 1] != " "]
+      if self.auto_replace_unknown_symbol:
+        unknown_syms = [s for s in orth_syms if s not in self.orth_symbols_map]
+        if unknown_syms:
+          orth_sym = unknown_syms[0]
+          if self.log_auto_replace_unknown_symbols:
+            print("LmDataset: unknown orth symbol %r, adding to orth_replace_map as %r" % (orth_sym, self.unknown_symbol), file=log.v3)
+            self._reduce_log_auto_replace_unknown_symbols()
+          self.orth_replace_map[orth_sym] = [self.unknown_symbol] if self.unknown_symbol is not None else []
+          continue  # try this seq again with updated orth_replace_map
+      break
+    self.num_unknown += orth_syms.count(self.unknown_symbol)
+    try:
+      return numpy.array([self.orth_symbols_map[s] for s in orth_syms], dtype=self.dtype)
+    except KeyError as e:
+      if self.word_based:
+        orth_debug_str = repr(orth_syms)
+      else:
+        orth_debug_str = repr("".join(orth_syms))
+      if self.log_skipped_seqs:
+        print("LmDataset: skipping sequence %s because of missing orth symbol: %s" % (orth_debug_str, e), file=log.v4)
+        self._reduce_log_skipped_seqs()
+      if self.error_on_invalid_seq:
+        raise Exception("LmDataset: invalid seq %s, missing orth symbol %s" % (orth_debug_str, e))
+      self.num_skipped += 1
+      return None
+
   def _collect_single_seq(self, seq_idx):
     """
     :type seq_idx: int
@@ -207,68 +435,30 @@ class LmDataset(CachedDataset2):
     :returns DatasetSeq or None if seq_idx >= num_seqs.
     """
     while True:
-      if self.next_orth_idx >= len(self.orths_epoch):
+      if self._stream_orths_iter is not None:
+        orth = next(self._stream_orths_iter, None)
+      else:
+        orth = None
+      if self.next_orth_idx >= self.num_orths_epoch or (self._stream_orths_iter is not None and orth is None):
         assert self.next_seq_idx <= seq_idx, "We expect that we iterate through all seqs."
         if self.num_skipped > 0:
           print("LmDataset: reached end, skipped %i sequences" % self.num_skipped)
         return None
       assert self.next_seq_idx == seq_idx, "We expect that we iterate through all seqs."
-      orth = self.orths_epoch[self.seq_order[self.next_orth_idx]]
+      orth_idx = self.seq_order[self.next_orth_idx] if self.seq_order is not None else None
       self.next_orth_idx += 1
-      if orth == "</s>": continue  # special sentence end symbol. empty seq, ignore.
-
-      if self.seq_gen:
-        try:
-          phones = self.seq_gen.generate_seq(orth)
-        except KeyError as e:
-          if self.log_skipped_seqs:
-            print("LmDataset: skipping sequence %r because of missing lexicon entry: %s" % (orth, e), file=log.v4)
-            self._reduce_log_skipped_seqs()
-          if self.error_on_invalid_seq:
-            raise Exception("LmDataset: invalid seq %r, missing lexicon entry %r" % (orth, e))
-          self.num_skipped += 1
+
+      if self._stream_orths_iter is not None:
+        data = self._orth_to_data(orth)
+        if data is None:
           continue  # try another seq
-        data = self.seq_gen.seq_to_class_idxs(phones, dtype=self.dtype)
-
-      elif self.orth_symbols:
-        orth_syms = parse_orthography(orth, **self.parse_orth_opts)
-        while True:
-          orth_syms = sum([self.orth_replace_map.get(s, [s]) for s in orth_syms], [])
-          i = 0
-          while i < len(orth_syms) - 1:
-            if orth_syms[i:i+2] == [" ", " "]:
-              orth_syms[i:i+2] = [" "]  # collapse two spaces
-            else:
-              i += 1
-          if self.auto_replace_unknown_symbol:
-            try:
-              map(self.orth_symbols_map.__getitem__, orth_syms)
-            except KeyError as e:
-              orth_sym = e.message
-              if self.log_auto_replace_unknown_symbols:
-                print("LmDataset: unknown orth symbol %r, adding to orth_replace_map as %r" % (orth_sym, self.unknown_symbol), file=log.v3)
-                self._reduce_log_auto_replace_unknown_symbols()
-              self.orth_replace_map[orth_sym] = [self.unknown_symbol] if self.unknown_symbol is not None else []
-              continue  # try this seq again with updated orth_replace_map
-          break
-        self.num_unknown += orth_syms.count(self.unknown_symbol)
-        if self.word_based:
-          orth_debug_str = repr(orth_syms)
-        else:
-          orth_debug_str = repr("".join(orth_syms))
-        try:
-          data = numpy.array(map(self.orth_symbols_map.__getitem__, orth_syms), dtype=self.dtype)
-        except KeyError as e:
-          if self.log_skipped_seqs:
-            print("LmDataset: skipping sequence %s because of missing orth symbol: %s" % (orth_debug_str, e), file=log.v4)
-            self._reduce_log_skipped_seqs()
-          if self.error_on_invalid_seq:
-            raise Exception("LmDataset: invalid seq %s, missing orth symbol %s" % (orth_debug_str, e))
-          self.num_skipped += 1
+      elif self.orths_epoch is not None:
+        data = self._orth_to_data(self.orths_epoch[orth_idx])
+        if data is None:
           continue  # try another seq
-
       else:
-        assert False
+        i = self.orths_epoch_start + orth_idx
+        data = numpy.asarray(self.tokenized_ids[self.tokenized_offsets[i]:self.tokenized_offsets[i + 1]])
 
       targets = {}
       for i in range(self.add_random_phone_seqs):
@@ -327,21 +517,53 @@ def _iter_bliss(filename, callback):
     callback(orth)
 
 
+def _decode_txt_line(l):
+  """
+  :param bytes l:
+  :return: decoded and stripped
+  :rtype: str
+  """
+  try:
+    l = l.decode("utf8")
+  except UnicodeDecodeError:
+    l = l.decode("latin_1")  # or iso8859_15?
+  return l.strip()
+
+
 def _iter_txt(filename, callback):
   f = open(filename, 'rb')
   if filename.endswith(".gz"):
     f = gzip.GzipFile(fileobj=f)
 
   for l in f:
-    try:
-      l = l.decode("utf8")
-    except UnicodeDecodeError:
-      l = l.decode("latin_1")  # or iso8859_15?
-    l = l.strip()
+    l = _decode_txt_line(l)
     if not l: continue
     callback(l)
 
 
+def _get_txt_line_offsets(filename):
+  """
+  :param str filename: line-based txt, optionally gzipped
+  :return: the (uncompressed) byte offsets of all non-empty lines, such that we can seek to them
+  :rtype: numpy.ndarray
+  """
+  f = open(filename, 'rb')
+  if filename.endswith(".gz"):
+    f = gzip.GzipFile(fileobj=f)
+  offsets = numpy.zeros((1024,), dtype="int64")
+  num_lines = 0
+  offset = 0
+  for l in f:
+    if _decode_txt_line(l):  # same as _iter_txt
+      if num_lines >= len(offsets):
+        offsets = numpy.resize(offsets, (len(offsets) * 2,))
+      offsets[num_lines] = offset
+      num_lines += 1
+    offset += len(l)
+  f.close()
+  return offsets[:num_lines].copy()
+
+
 class AllophoneState:
   # In Sprint, see AllophoneStateAlphabet::index().
   id = None  # u16 in Sprint. here just str
@@ -676,6 +898,10 @@ class PhoneSeqGenerator:
       self.state_tying = StateTying(state_tying_file)
     else:
       self.state_tying = None
+    self._phone_has_context = {
+      phone: info["variation"] == "context" for (phone, info) in self.lexicon.phonemes.items()}  # type: dict[str,bool]
+    self._phon_allos_cache = {}  # type: dict[str,list[(str,int)]]  # see _get_phon_allos()
+    self._allo_class_idx_cache = {}  # type: dict[(str,tuple[str],tuple[str],int,int),int]  # see _get_allo_class_idx()
 
   def random_seed(self, seed):
     self.rnd.seed(seed)
@@ -704,6 +930,42 @@ class PhoneSeqGenerator:
       # It should not happen that we don't have some phoneme. The lexicon should not be inconsistent.
       return numpy.array([self.lexicon.phonemes[p.id]["index"] for p in phones], dtype=dtype)
 
+  def _get_phon_allos(self, phon):
+    """
+    :param str phon: pronunciation, phones separated by space
+    :return: list of (phone, boundary) for the pronunciation of a word, with the word boundary flags
+    :rtype: list[(str,int)]
+    """
+    allos = self._phon_allos_cache.get(phon)
+    if allos is None:
+      phones = phon.split()
+      allos = [(p, 0) for p in phones]
+      allos[0] = (allos[0][0], allos[0][1] | 1)  # initial
+      allos[-1] = (allos[-1][0], allos[-1][1] | 2)  # final
+      self._phon_allos_cache[phon] = allos
+    return allos
+
+  def _get_allo_class_idx(self, phone, context_history, context_future, boundary, state):
+    """
+    :param str phone:
+    :param tuple[str] context_history:
+    :param tuple[str] context_future:
+    :param int boundary:
+    :param int state:
+    :return: class idx of the allophone state, like in :func:`seq_to_class_idxs`. memoized
+    :rtype: int
+    """
+    key = (phone, context_history, context_future, boundary, state)
+    class_idx = self._allo_class_idx_cache.get(key)
+    if class_idx is None:
+      a = AllophoneState(id=phone, state=state)
+      a.context_history = context_history
+      a.context_future = context_future
+      a.boundary = boundary
+      class_idx = int(self.seq_to_class_idxs([a])[0])
+      self._allo_class_idx_cache[key] = class_idx
+    return class_idx
+
   def _iter_orth(self, orth):
     if self.rnd.random() < self.add_silence_beginning:
       yield self.si_lemma
@@ -772,24 +1034,42 @@ class PhoneSeqGenerator:
             if self.rnd.random() >= self.repetition:
               break
 
-  def _allos_set_context(self, allos):
-    if self.allo_context_len == 0: return
+  def _get_phones_context(self, phones):
+    """
+    :param list[str] phones:
+    :return: context history and context future for every phone
+    :rtype: (list[tuple[str]], list[tuple[str]])
+    """
+    histories = [()] * len(phones)
+    futures = [()] * len(phones)
+    if self.allo_context_len == 0:
+      return histories, futures
     ctx = []
-    for a in allos:
-      if self.lexicon.phonemes[a.id]["variation"] == "context":
-        a.context_history = tuple(ctx)
-        ctx += [a.id]
+    for i, phone in enumerate(phones):
+      if self._phone_has_context[phone]:
+        histories[i] = tuple(ctx)
+        ctx += [phone]
         ctx = ctx[-self.allo_context_len:]
       else:
         ctx = []
     ctx = []
-    for a in reversed(allos):
-      if self.lexicon.phonemes[a.id]["variation"] == "context":
-        a.context_future = tuple(reversed(ctx))
-        ctx += [a.id]
+    for i in reversed(range(len(phones))):
+      phone = phones[i]
+      if self._phone_has_context[phone]:
+        futures[i] = tuple(reversed(ctx))
+        ctx += [phone]
         ctx = ctx[-self.allo_context_len:]
       else:
         ctx = []
+    return histories, futures
+
+  def _allos_set_context(self, allos):
+    if self.allo_context_len == 0: return
+    histories, futures = self._get_phones_context([a.id for a in allos])
+    for a, history, future in zip(allos, histories, futures):
+      if self._phone_has_context[a.id]:
+        a.context_history = history
+        a.context_future = future
 
   def generate_seq(self, orth):
     """
@@ -808,6 +1088,50 @@ class PhoneSeqGenerator:
     allos = list(self._allos_add_states(allos))
     return allos
 
+  def generate_class_idxs_seq(self, orth, dtype=None):
+    """
+    Same as ``seq_to_class_idxs(generate_seq(orth))``, and uses the random generator in the same way,
+    i.e. gives the same result, but it is much faster:
+    The allophones of every pronunciation and the class index of every allophone state are memoized,
+    thus only the random choices (pronunciation, silence, repetitions) remain per seq,
+    and we don't create any AllophoneState instances.
+
+    :param str orth: orthography as a str. orth.split() should give words in the lexicon
+    :param str dtype: eg "int32"
+    :rtype: numpy.ndarray
+    :returns 1D numpy array with the indices, with repetitions etc
+    """
+    allos = []  # type: list[(str,int)]  # (phone, boundary)
+    for lemma in self._iter_orth(orth):
+      phon = self.rnd.choice(lemma["phons"])
+      allos += self._get_phon_allos(phon["phon"])
+    phones = [phone for (phone, _) in allos]
+    histories, futures = self._get_phones_context(phones)
+    class_idxs = []  # type: list[int]
+    counts = []  # type: list[int]
+    for (phone, boundary), history, future in zip(allos, histories, futures):
+      if not self._phone_has_context[phone]:
+        history = future = ()  # see _allos_set_context
+      if phone == self.si_phone:  # see _random_allo_silence
+        class_idxs.append(self._get_allo_class_idx(phone, (), (), 3, 0))
+        counts.append(self._random_repetition_count(self.silence_repetition))
+      else:
+        for state in range(self.allo_num_states):
+          class_idxs.append(self._get_allo_class_idx(phone, history, future, boundary, state))
+          counts.append(self._random_repetition_count(self.repetition))
+    return numpy.repeat(numpy.array(class_idxs, dtype=dtype or "int32"), counts)
+
+  def _random_repetition_count(self, repetition):
+    """
+    :param float repetition: prob of repeating
+    :return: how often to emit, i.e. 1 + number of repetitions
+    :rtype: int
+    """
+    count = 1
+    while self.rnd.random() < repetition:
+      count += 1
+    return count
+
   def _random_phone_seq(self, prob_add=0.8):
     while True:
       yield self.rnd.choice(self.phonemes)
@@ -861,7 +1185,7 @@ class TranslationDataset(CachedDataset2):
 
   MapToDataKeys = {"source": "data", "target": "classes"}  # just by our convention
 
-  def __init__(self, path, file_postfix, partition_epoch=None, target_postfix="", **kwargs):
+  def __init__(self, path, file_postfix, partition_epoch=None, target_postfix="", cache_dir=None, **kwargs):
     """
     :param str path: the directory containing the files
     :param str file_postfix: e.g. "train" or "dev". it will then search for "source." + postfix and "target." + postfix.
@@ -869,19 +1193,24 @@ class TranslationDataset(CachedDataset2):
     :param int partition_epoch: if provided, will partition the dataset into multiple epochs
     :param None|str target_postfix: will concat this at the end of the target.
       You might want to add some sentence-end symbol.
+    :param str|None cache_dir: if given, after the first load, we store the vocab-mapped data
+      (flat int32 array and offsets per key) in this dir, and later we just memory-map these files
+      instead of reading the text files again.
+      The files are keyed by a hash of the data files (path, size, mtime), the vocabs and the target_postfix.
     """
     super(TranslationDataset, self).__init__(**kwargs)
     self.path = path
     self.file_postfix = file_postfix
     self.partition_epoch = partition_epoch
     self._add_postfix = {"data": "", "classes": target_postfix}
-    from threading import Lock, Thread
-    self._lock = Lock()
+    from threading import Condition, Thread
+    self._cond = Condition()  # protects _data and _data_len, notified by the reader thread
     self._partition_epoch_num_seqs = []
     import os
     assert os.path.isdir(path)
-    self._data_files = {data_key: self._get_data_file(prefix) for (prefix, data_key) in self.MapToDataKeys.items()}
-    self._data = {data_key: [] for data_key in self._data_files.keys()}  # type: dict[str,list[numpy.ndarray]]
+    self._data_filenames = {
+      data_key: self._get_data_filename(prefix) for (prefix, data_key) in self.MapToDataKeys.items()}
+    self._data = {data_key: [] for data_key in self._data_filenames.keys()}  # type: dict[str,list[numpy.ndarray]]
     self._data_len = None  # type: int|None
     self._vocabs = {data_key: self._get_vocab(prefix) for (prefix, data_key) in self.MapToDataKeys.items()}
     self.num_outputs = {k: [max(self._vocabs[k].values()) + 1, 1] for k in self._vocabs.keys()}  # all sparse
@@ -890,69 +1219,165 @@ class TranslationDataset(CachedDataset2):
     self._reversed_vocabs = {k: self._reverse_vocab(k) for k in self._vocabs.keys()}
     self.labels = {k: self._get_label_list(k) for k in self._vocabs.keys()}
     self._seq_order = None  # type: None|list[int]  # seq_idx -> line_nr
-    self._thread = Thread(name="%r reader" % self, target=self._thread_main)
-    self._thread.daemon = True
-    self._thread.start()
+    self._cache_filename_prefix = self._get_cache_filename_prefix(cache_dir) if cache_dir else None
+    self._cached_data = None  # type: dict[str,(numpy.ndarray,numpy.ndarray)]|None  # key -> (ids, offsets)
+    if self._cache_filename_prefix and self._load_cache():
+      self._thread = None
+    else:
+      self._thread = Thread(name="%r reader" % self, target=self._thread_main)
+      self._thread.daemon = True
+      self._thread.start()
 
   def _thread_main(self):
     from Util import interrupt_main
     try:
       import better_exchook
       better_exchook.install()
-      from Util import AsyncThreadRun
 
-      # First iterate once over the data to get the data len as fast as possible.
-      data_len = 0
-      while True:
-        ls = self._data_files["data"].readlines(10 ** 4)
-        data_len += len(ls)
-        if not ls:
-          break
-      with self._lock:
+      # First publish the number of seqs, such that init_seq_order() does not need to wait for the whole data.
+      # Just counting the lines is much faster than the vocab mapping below.
+      data_len = self._count_lines(self._data_filenames["data"])
+      with self._cond:
         self._data_len = data_len
-      self._data_files["data"].seek(0, os.SEEK_SET)  # we will read it again below
+        self._cond.notify_all()
 
-      # Now, read and use the vocab for a compact representation in memory.
+      # Read and use the vocab for a compact representation in memory.
+      data_files = {k: self._open_data_file(filename) for (k, filename) in self._data_filenames.items()}
       keys_to_read = ["data", "classes"]
       while True:
         for k in list(keys_to_read):
-          data_strs = self._data_files[k].readlines(10 ** 6)
+          data_strs = data_files[k].readlines(10 ** 6)
           if not data_strs:
-            assert len(self._data[k]) == self._data_len
             keys_to_read.remove(k)
+            data_files[k].close()
             continue
-          assert len(self._data[k]) + len(data_strs) <= self._data_len
           vocab = self._vocabs[k]
           data = [
             self._data_str_to_numpy(vocab, s.decode("utf8").strip() + self._add_postfix[k])
             for s in data_strs]
-          with self._lock:
+          with self._cond:
             self._data[k].extend(data)
+            self._cond.notify_all()
         if not keys_to_read:
           break
-      for k, f in list(self._data_files.items()):
-        f.close()
-        self._data_files[k] = None
+      assert len(self._data["data"]) == self._data_len
+      assert len(self._data["classes"]) == self._data_len, "%r: source and target have different number of lines" % self
+      if self._cache_filename_prefix:
+        self._write_cache()
 
     except Exception:
       sys.excepthook(*sys.exc_info())
       interrupt_main()
 
-  def _get_data_file(self, prefix):
+  def _get_data_filename(self, prefix):
     """
     :param str prefix: e.g. "source" or "target"
     :return: full filename
-    :rtype: io.FileIO
+    :rtype: str
     """
     import os
     filename = "%s/%s.%s" % (self.path, prefix, self.file_postfix)
     if os.path.exists(filename):
-      return open(filename, "rb")
+      return filename
     if os.path.exists(filename + ".gz"):
-      import gzip
-      return gzip.GzipFile(filename + ".gz", "rb")
+      return filename + ".gz"
     raise Exception("Data file not found: %r (.gz)?" % filename)
 
+  @staticmethod
+  def _open_data_file(filename):
+    """
+    :param str filename: via _get_data_filename
+    :rtype: io.FileIO
+    """
+    if filename.endswith(".gz"):
+      import gzip
+      return gzip.GzipFile(filename, "rb")
+    return open(filename, "rb")
+
+  @classmethod
+  def _count_lines(cls, filename):
+    """
+    :param str filename: via _get_data_filename
+    :return: number of lines, the same as len(f.readlines())
+    :rtype: int
+    """
+    num_lines = 0
+    last_block = b""
+    with cls._open_data_file(filename) as f:
+      while True:
+        block = f.read(10 ** 6)
+        if not block:
+          break
+        num_lines += block.count(b"\n")
+        last_block = block
+    if last_block and not last_block.endswith(b"\n"):
+      num_lines += 1  # last line without newline
+    return num_lines
+
+  def _get_cache_filename_prefix(self, cache_dir):
+    """
+    :param str cache_dir:
+    :return: prefix for the cache files, which includes a hash of all the inputs
+    :rtype: str
+    """
+    import hashlib
+    h = hashlib.sha1()
+    for prefix, data_key in sorted(self.MapToDataKeys.items()):
+      filename = self._data_filenames[data_key]
+      # We don't read the whole data file here, as that would be as slow as just loading it.
+      stat = os.stat(filename)
+      h.update(repr((os.path.realpath(filename), stat.st_size, stat.st_mtime)).encode("utf8"))
+      h.update(repr(sorted(self._vocabs[data_key].items())).encode("utf8"))
+    h.update(repr(sorted(self._add_postfix.items())).encode("utf8"))
+    return os.path.join(cache_dir, "translation.%s.%s" % (self.file_postfix, h.hexdigest()[:16]))
+
+  def _load_cache(self):
+    """
+    :return: whether the cache exists. if so, it is memory-mapped and all data is available
+    :rtype: bool
+    """
+    offsets_filenames = {k: "%s.%s.offsets.npy" % (self._cache_filename_prefix, k) for k in self._data.keys()}
+    if not all([os.path.exists(fn) for fn in offsets_filenames.values()]):
+      return False
+    print("%r: using cache %s" % (self, self._cache_filename_prefix), file=log.v4)
+    self._cached_data = {}
+    for k, offsets_filename in offsets_filenames.items():
+      offsets = numpy.load(offsets_filename, mmap_mode="r")
+      if offsets[-1] > 0:
+        ids = numpy.memmap("%s.%s.ids" % (self._cache_filename_prefix, k), dtype="int32", mode="r")
+        assert len(ids) == offsets[-1], "%s: invalid cache" % self._cache_filename_prefix
+      else:  # numpy.memmap cannot map empty files
+        ids = numpy.zeros((0,), dtype="int32")
+      self._cached_data[k] = (ids, offsets)
+    self._data_len = len(self._cached_data["data"][1]) - 1
+    assert len(self._cached_data["classes"][1]) - 1 == self._data_len
+    return True
+
+  def _write_cache(self):
+    """
+    Writes the data which was loaded by the reader thread to the cache.
+    The offsets files are written last, because they mark a complete cache.
+    """
+    print("%r: writing cache %s" % (self, self._cache_filename_prefix), file=log.v4)
+    cache_dir = os.path.dirname(self._cache_filename_prefix)
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    tmp_postfix = ".tmp%i" % os.getpid()
+    offsets = {}
+    for k, data in self._data.items():
+      offsets[k] = numpy.zeros((len(data) + 1,), dtype="int64")
+      numpy.cumsum([len(seq) for seq in data], out=offsets[k][1:])
+      ids_filename = "%s.%s.ids" % (self._cache_filename_prefix, k)
+      with open(ids_filename + tmp_postfix, "wb") as f:
+        for seq in data:
+          f.write(seq.tobytes())
+      os.rename(ids_filename + tmp_postfix, ids_filename)
+    for k in self._data.keys():
+      offsets_filename = "%s.%s.offsets.npy" % (self._cache_filename_prefix, k)
+      with open(offsets_filename + tmp_postfix, "wb") as f:
+        numpy.save(f, offsets[k])
+      os.rename(offsets_filename + tmp_postfix, offsets_filename)
+
   def _get_vocab(self, prefix):
     """
     :param str prefix: e.g. "source" or "target"
@@ -1006,37 +1431,32 @@ class TranslationDataset(CachedDataset2):
     :return: 1D array
     :rtype: numpy.ndarray
     """
-    import time
-    last_print_time = 0
-    last_print_len = None
-    while True:
-      with self._lock:
+    if self._cached_data:
+      ids, offsets = self._cached_data[key]
+      return numpy.asarray(ids[offsets[line_nr]:offsets[line_nr + 1]])
+    with self._cond:
+      while True:
         if self._data_len is not None:
           assert line_nr <= self._data_len
         cur_len = len(self._data[key])
         if line_nr < cur_len:
           return self._data[key][line_nr]
-      if cur_len != last_print_len and time.time() - last_print_time > 10:
-        print("%r: waiting for %r, line %i (%i loaded so far)..." % (self, key, line_nr, cur_len), file=log.v3)
-        last_print_len = cur_len
-        last_print_time = time.time()
-      time.sleep(1)
+        # The reader thread notifies us as soon as there is new data.
+        # Use a timeout to print the progress from time to time.
+        if not self._cond.wait(10) and len(self._data[key]) == cur_len:
+          print("%r: waiting for %r, line %i (%i loaded so far)..." % (self, key, line_nr, cur_len), file=log.v3)
 
   def _get_data_len(self):
     """
     :rtype: num seqs of the whole underlying data
     :rtype: int
     """
-    import time
-    t = 0
-    while True:
-      with self._lock:
-        if self._data_len is not None:
-          return self._data_len
-      if t == 0:
+    with self._cond:
+      if self._data_len is None:
         print("%r: waiting for data length info..." % (self,), file=log.v3)
-      time.sleep(1)
-      t += 1
+      while self._data_len is None:
+        self._cond.wait(10)  # with timeout, such that we can be interrupted
+      return self._data_len
 
   def _get_line_nr(self, seq_idx):
     """
@@ -1081,7 +1501,7 @@ class TranslationDataset(CachedDataset2):
       num_seqs = self._get_data_len()
       self._seq_order = self.get_seq_order_for_epoch(
         epoch=epoch, num_seqs=num_seqs, get_seq_len=lambda i: len(self._get_data(key="data", line_nr=i)))
-      self._num_seqs = num_seqs
+      self._num_seqs = len(self._seq_order)  # might be only a partition, see set_partition()
     if self.partition_epoch:
       self._partition_epoch_num_seqs = [self._num_seqs // self.partition_epoch] * self.partition_epoch
       i = 0
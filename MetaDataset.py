@@ -21,6 +21,7 @@ class MetaDataset(CachedDataset2):
                datasets,
                data_map, data_dims,
                data_dtypes=None,
+               parallel_load=False,
                window=1, **kwargs):
     """
     :param str seq_list_file: filename. line-separated
@@ -30,6 +31,8 @@ class MetaDataset(CachedDataset2):
       Should contain 'data' as key. Also defines the target-list, which is all except 'data'.
     :param dict[str,(int,int)] data_dims: self-data-key -> data-dimension, len(shape) (1 ==> sparse repr).
     :param dict[str,str] data_dtypes: self-data-key -> dtype. automatic if not specified
+    :param bool parallel_load: load the seqs of the sub-datasets concurrently, in a thread pool.
+      Useful if the sub-datasets are independent I/O sources, e.g. a HDF file and a Sprint cache.
     """
     assert window == 1  # not implemented
     super(MetaDataset, self).__init__(**kwargs)
@@ -43,7 +46,7 @@ class MetaDataset(CachedDataset2):
     self.dataset_keys = set([m[0] for m in self.data_map.values()]); ":type: set[str]"
     self.data_keys = set(self.data_map.keys()); ":type: set[str]"
     assert "data" in self.data_keys
-    self.target_list = sorted(self.data_keys - ["data"])
+    self.target_list = sorted(self.data_keys - {"data"})
 
     data_dims = convert_data_dims(data_dims)
     self.data_dims = data_dims
@@ -70,6 +73,14 @@ class MetaDataset(CachedDataset2):
 
     # Will only init the needed datasets.
     self.datasets = {key: init_dataset(datasets[key]) for key in self.dataset_keys}
+    self._load_pool = _SubDatasetsLoadPool(num_threads=len(self.datasets) if parallel_load else 0)
+
+  def __del__(self):
+    """
+    Stops the threads of the load pool, if there are any.
+    """
+    if getattr(self, "_load_pool", None):  # __init__ might not have finished
+      self._load_pool.close()
 
   def init_seq_order(self, epoch=None, seq_list=None):
     need_reinit = self.epoch is None or self.epoch != epoch
@@ -84,18 +95,21 @@ class MetaDataset(CachedDataset2):
         get_seq_len = lambda s: self._seq_lens[self.seq_list_original[s]]["data"]
       else:
         get_seq_len = None
-      seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, get_seq_len)
+      # This might be only a partition, see set_partition(). The sub-datasets get the resulting seq list.
+      seq_index = self.get_seq_order_for_epoch(epoch, len(self.seq_list_original), get_seq_len)
     self.seq_list_ordered = [self.seq_list_original[s] for s in seq_index]
+    self._num_seqs = len(self.seq_list_ordered)
 
     for dataset in self.datasets.values():
       dataset.init_seq_order(epoch=epoch, seq_list=self.seq_list_ordered)
     return True
 
   def _load_seqs(self, start, end):
-    for dataset in self.datasets.values():
+    def load(dataset):
       dataset.load_seqs(start, end)
       for seq_idx in range(start, end):
         self._check_dataset_seq(dataset, seq_idx)
+    self._load_pool.run([lambda dataset=dataset: load(dataset) for dataset in self.datasets.values()])
     super(MetaDataset, self)._load_seqs(start=start, end=end)
 
   def _check_dataset_seq(self, dataset, seq_idx):
@@ -163,6 +177,15 @@ class ClusteringDataset(CachedDataset2):
     self.num_outputs = self.dataset.num_outputs.copy()
     self.num_outputs["cluster_idx"] = [n_clusters, 1]  # will be a single int32
     self.expected_load_seq_start = 0
+    if self.num_partitions > 1:
+      self.set_partition(partition_index=self.partition_index, num_partitions=self.num_partitions)
+
+  def set_partition(self, partition_index, num_partitions):
+    """
+    The partition is applied by the sub-dataset. See :func:`Dataset.set_partition`.
+    """
+    super(ClusteringDataset, self).set_partition(partition_index=partition_index, num_partitions=num_partitions)
+    self.dataset.set_partition(partition_index=partition_index, num_partitions=num_partitions)
 
   def _load_cluster_map(self, filename):
     ls = open(filename).read().splitlines()
@@ -274,6 +297,16 @@ class ConcatDataset(CachedDataset2):
     for ds in self.datasets[1:]:
       assert ds.num_inputs == self.num_inputs
       assert ds.num_outputs == self.num_outputs
+    if self.num_partitions > 1:
+      self.set_partition(partition_index=self.partition_index, num_partitions=self.num_partitions)
+
+  def set_partition(self, partition_index, num_partitions):
+    """
+    Every sub-dataset is partitioned. See :func:`Dataset.set_partition`.
+    """
+    super(ConcatDataset, self).set_partition(partition_index=partition_index, num_partitions=num_partitions)
+    for dataset in self.datasets:
+      dataset.set_partition(partition_index=partition_index, num_partitions=num_partitions)
 
   def init_seq_order(self, epoch=None, seq_list=None):
     """
@@ -368,6 +401,7 @@ class CombinedDataset(CachedDataset2):
                datasets,
                data_map, data_dims,
                data_dtypes=None,
+               parallel_load=False,
                window=1, **kwargs):
     """
     :param dict[str,dict[str]] datasets: dataset-key -> dataset-kwargs. including keyword 'class' and maybe 'files'
@@ -375,6 +409,7 @@ class CombinedDataset(CachedDataset2):
       Should contain 'data' as key. Also defines the target-list, which is all except 'data'.
     :param dict[str,(int,int)] data_dims: self-data-key -> data-dimension, len(shape) (1 ==> sparse repr).
     :param dict[str,str] data_dtypes: self-data-key -> dtype. automatic if not specified
+    :param bool parallel_load: load the seqs of the sub-datasets concurrently, in a thread pool
     """
     assert window == 1  # not implemented
     super(CombinedDataset, self).__init__(**kwargs)
@@ -391,7 +426,7 @@ class CombinedDataset(CachedDataset2):
     # Build target lookup table
     target_lookup_table = {}
     for dataset_key in self.dataset_keys:
-      target_lookup_table[dataset_key] = {datamap_maps: datamap_keys[1] for datamap_keys,datamap_maps in data_map.iteritems() if datamap_keys[0]==dataset_key}
+      target_lookup_table[dataset_key] = {datamap_maps: datamap_keys[1] for datamap_keys,datamap_maps in data_map.items() if datamap_keys[0]==dataset_key}
       for key in self.data_keys:
         target_lookup_table[dataset_key].setdefault(key,None)
 
@@ -410,6 +445,7 @@ class CombinedDataset(CachedDataset2):
 
     # Will only init the needed datasets.
     self.datasets = {key: init_dataset(datasets[key]) for key in self.dataset_keys}
+    self._load_pool = _SubDatasetsLoadPool(num_threads=len(self.datasets) if parallel_load else 0)
 
     try:
       self._num_seqs = sum([self.datasets[k].num_seqs for k in sorted(self.datasets.keys())])
@@ -421,6 +457,16 @@ class CombinedDataset(CachedDataset2):
 #      TODO this estimate seems broken on a small test corpus; needs further testing
 #      print "Need to set estimations for num_seqs. Currently is {s}".format(s=[ds.estimated_num_seqs for ds in self.datasets.values()])
       self.know_num_seqs_beforehand = False
+    if self.num_partitions > 1:
+      self.set_partition(partition_index=self.partition_index, num_partitions=self.num_partitions)
+
+  def set_partition(self, partition_index, num_partitions):
+    """
+    Every sub-dataset is partitioned. See :func:`Dataset.set_partition`.
+    """
+    super(CombinedDataset, self).set_partition(partition_index=partition_index, num_partitions=num_partitions)
+    for dataset in self.datasets.values():
+      dataset.set_partition(partition_index=partition_index, num_partitions=num_partitions)
 
   def _canonical_seqs_dataset_idxs(self):
     """
@@ -446,6 +492,13 @@ class CombinedDataset(CachedDataset2):
       l += [(dataset_idx, seq_idx)]
     return l
 
+  def __del__(self):
+    """
+    Stops the threads of the load pool, if there are any.
+    """
+    if getattr(self, "_load_pool", None):  # __init__ might not have finished
+      self._load_pool.close()
+
   def init_seq_order(self, epoch=None, seq_list=None):
     assert seq_list is None, "seq_list not supported for %s" % self.__class__
     need_reinit = self.epoch is None or self.epoch != epoch
@@ -453,6 +506,10 @@ class CombinedDataset(CachedDataset2):
     if not need_reinit:
       return False
 
+    # Init the sub-datasets first, because their num_seqs can depend on the epoch (e.g. with a partition).
+    for dataset in self.datasets.values():
+      dataset.init_seq_order(epoch=epoch)
+
     if self.know_num_seqs_beforehand:
       # We just select for which seq-idx we will use which dataset.
       # The ordering of the seqs in the datasets will not be set here
@@ -469,14 +526,12 @@ class CombinedDataset(CachedDataset2):
         raise Exception("seq_ordering %s not supported" % self.seq_ordering)
 
       self.dataset_seq_idxs = self._dataset_seq_idxs(seqs_dataset_idx)
-      assert self.num_seqs == len(self.dataset_seq_idxs)
+      self._num_seqs = len(self.dataset_seq_idxs)
 
     else:
       self.dataset_seq_idxs = [] #We will fill this as we go
       self.used_num_seqs_per_subset = [0] * len(self.datasets)
 
-    for dataset in self.datasets.values():
-      dataset.init_seq_order(epoch=epoch)
     return True
 
   def _expand_dataset_sec_idxs(self, num_values):
@@ -547,13 +602,15 @@ class CombinedDataset(CachedDataset2):
 
     requested_seqs = self.dataset_seq_idxs[start:end]
 
+    load_funcs = []
     for i in range(len(self.datasets)):
       dataset = self.datasets[self.dataset_idxs[i]]
       sub_requested_seqs = [s[1] for s in requested_seqs if s[0]==i]
       if sub_requested_seqs == []:
         continue
       sub_start, sub_end = min(sub_requested_seqs), max(sub_requested_seqs)
-      dataset.load_seqs(sub_start, sub_end+1)
+      load_funcs.append(lambda dataset=dataset, sub_start=sub_start, sub_end=sub_end: dataset.load_seqs(sub_start, sub_end+1))
+    self._load_pool.run(load_funcs)
     super(CombinedDataset, self)._load_seqs(start=start, end=end)
 
   def _check_dataset_seq(self, dataset, seq_idx): # TODO this check makes no sense here
@@ -647,6 +704,15 @@ class ChunkShuffleDataset(CachedDataset2):
     self.labels = self.dataset.labels
     self.rng = Random(0)
     self.load_seqs_end = None
+    if self.num_partitions > 1:
+      self.set_partition(partition_index=self.partition_index, num_partitions=self.num_partitions)
+
+  def set_partition(self, partition_index, num_partitions):
+    """
+    The partition is applied by the sub-dataset. See :func:`Dataset.set_partition`.
+    """
+    super(ChunkShuffleDataset, self).set_partition(partition_index=partition_index, num_partitions=num_partitions)
+    self.dataset.set_partition(partition_index=partition_index, num_partitions=num_partitions)
 
   def init_seq_order(self, epoch=None, seq_list=None):
     """
@@ -686,7 +752,7 @@ class ChunkShuffleDataset(CachedDataset2):
     tag = "%s.%i" % (original_tag, seq_idx)
     seq = DatasetSeq(seq_idx=seq_idx, features=features, targets=data, seq_tag=tag)
     self._num_timesteps_accumulated += seq.num_frames
-    self.added_data += [seq]
+    self.added_data.append(seq)
 
   def _shuffle(self):
     start_seq_idx = self.added_data[0].seq_idx
@@ -697,12 +763,10 @@ class ChunkShuffleDataset(CachedDataset2):
       start_idx = self.load_seqs_end - start_seq_idx
       assert self.added_data[start_idx].seq_idx == self.load_seqs_end
       start_seq_idx = self.load_seqs_end
-    sublist = self.added_data[start_idx:]
-    self.rng.shuffle(sublist)
-    for i, seq in enumerate(sublist):
-      seq.seq_idx = i + start_seq_idx
-    assert sublist[-1].seq_idx == end_seq_idx
-    self.added_data[start_idx:] = sublist
+    self.added_data.shuffle_tail(start_idx, rng=self.rng)
+    for i in range(start_idx, len(self.added_data)):
+      self.added_data[i].seq_idx = i - start_idx + start_seq_idx
+    assert self.added_data[-1].seq_idx == end_seq_idx
 
   def _add_more(self):
     """
@@ -787,6 +851,44 @@ class ChunkShuffleDataset(CachedDataset2):
     return self.dataset.get_target_list()
 
 
+class _SubDatasetsLoadPool(object):
+  """
+  Thread pool to call load_seqs() of multiple sub-datasets concurrently.
+  Every sub-dataset is only used by one thread at a time.
+  """
+
+  def __init__(self, num_threads):
+    """
+    :param int num_threads: one thread per sub-dataset. <=1 means to call the funcs sequentially
+    """
+    self.num_threads = num_threads
+    self._pool = None
+
+  def run(self, funcs):
+    """
+    :param list[()->None] funcs:
+    """
+    if self.num_threads <= 1 or len(funcs) <= 1:
+      for func in funcs:
+        func()
+      return
+    if not self._pool:
+      # This pool uses threads, not processes.
+      from multiprocessing.pool import ThreadPool
+      self._pool = ThreadPool(processes=self.num_threads)
+    # This will reraise any exception.
+    self._pool.map(lambda func: func(), funcs)
+
+  def close(self):
+    """
+    Stops the threads. The pool can be used again afterwards, it would start new threads.
+    """
+    if self._pool:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+
+
 def _simple_to_bool(v):
   if v == 0: v = False
   if v == 1: v = True
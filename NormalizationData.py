@@ -1,11 +1,27 @@
 import os
-import six
 import h5py
 import numpy as np
 
 from BundleFile import BundleFile
 
 
+def _calculateFileStatistics(args):
+  """Calculates the statistics of one HDF dataset file.
+  This is a module-level function so that it can be used with
+  multiprocessing.Pool.
+
+  :see: NormalizationData._calculateStatistics
+
+  :type args: (str, str, numpy.dtype)
+  :param args: tuple (path to the HDF dataset file, group name, dtype)
+  :rtype: tuple (int, numpy.ndarray | None, numpy.ndarray | None)
+  :return: tuple (count, mean, M2)
+  """
+  filePath, groupName, dtype = args
+  with h5py.File(filePath, mode='r') as f:
+    return NormalizationData._accumulateStatistics(f, groupName, dtype=dtype)
+
+
 class NormalizationData(object):
   """This class holds normalization data for inputs and outputs.
   It also contains methods to create the normalization HDF file.
@@ -13,20 +29,21 @@ class NormalizationData(object):
 
   GROUP_INPUTS = 'inputs'
   GROUP_OUTPUTS = 'outputs'
+  GROUP_FILE_STATISTICS = 'fileStatistics'
 
   DATASET_MEAN = 'mean'
   DATASET_MEAN_OF_SQUARES = 'meanOfSquares'
   DATASET_VARIANCE = 'variance'
   DATASET_TOTAL_FRAMES = 'totalNumberOfFrames'
+  DATASET_COUNT = 'count'
+  DATASET_M2 = 'm2'
 
   DATASET_TIME_DIMENSION_INDEX = 0
   DATASET_FEATURE_DIMENSION_INDEX = 1
 
-  SUMMATION_PRECISION = 1e-5
-
   @staticmethod
   def createNormalizationFile(bundleFilePath, outputFilePath, dtype=np.float64,
-                              flag_includeOutputs=True):
+                              flag_includeOutputs=True, numWorkers=1):
     """Calculates means over inputs and outputs of datasets in the HDF files
     described by the given bundle file.
 
@@ -46,6 +63,14 @@ class NormalizationData(object):
     Availability of means and variances depends on whether the corresponding
     groups are available in the input dataset HDF files.
 
+    The statistics (count, mean, M2) are calculated for every HDF dataset
+    file separately, optionally in parallel, and then merged.
+    :see: NormalizationData.mergeStatistics
+    The statistics of every file are stored in the output file as well.
+    If the output file already exists, the stored statistics of files
+    which did not change (same path, size and modification time) are reused,
+    i.e. when a file is added to the bundle, only the new file is scanned.
+
     !!! IMPORTANT !!!
     General rule of thumb: if one dataset file has both input and output
     groups then you should make sure that all the dataset files have them.
@@ -62,34 +87,39 @@ class NormalizationData(object):
     :type flag_includeOutputs: bool
     :param flag_includeOutputs: if True then normalization data will be
                                 calculated for outputs (targets) as well.
+    :type numWorkers: int
+    :param numWorkers: number of processes which scan the HDF dataset files.
     """
     NormalizationData._calculateNormalizationData(
       bundleFilePath,
       outputFilePath,
       NormalizationData.GROUP_INPUTS,
-      dtype=dtype
+      dtype=dtype,
+      numWorkers=numWorkers
     )
     if flag_includeOutputs:
       NormalizationData._calculateNormalizationData(
         bundleFilePath,
         outputFilePath,
         NormalizationData.GROUP_OUTPUTS,
-        dtype=dtype
+        dtype=dtype,
+        numWorkers=numWorkers
       )
 
   @staticmethod
   def _calculateNormalizationData(bundleFilePath, outputFilePath, groupName,
-                                  dtype=np.float64):
+                                  dtype=np.float64, numWorkers=1):
     """Helper method.
     Calculates and writes into the output HDF file mean, mean of squares,
     variance and total number of frames for the datasets in the given HDF
-    group.
+    group, as well as the statistics of every HDF dataset file.
 
     :type bundleFilePath: str
     :param bundleFilePath: path to the bundle file. :see: BundleFile.BundleFile
     :type outputFilePath: str
     :param outputFilePath: path to the output HDF normalization file. If file
-                           already exists it will not be truncated.
+                           already exists it will not be truncated, and the
+                           file statistics in it are reused.
     :type groupName: str
     :param groupName: name of the HDF group for which normalization data
                       should be calculated. Also, a group with this name will
@@ -97,35 +127,41 @@ class NormalizationData(object):
                       normalization data.
     :type dtype: numpy.dtype
     :param dtype: type of data to use during calculations.
+    :type numWorkers: int
+    :param numWorkers: number of processes which scan the HDF dataset files.
     """
-    accumulatedSum = None
-    accumulatedSumOfSqr = None
-    totalFrames = 0 if six.PY3 else long()  # python 2/3 compatibility
     bundle = BundleFile(bundleFilePath)
-    for filePath in bundle.datasetFilePaths:
-      with h5py.File(filePath, mode='r') as datasetFile:
-        intermSum, intermSumOfSqr, intermTotalFrames = \
-          NormalizationData._accumulateSums(
-            datasetFile,
-            groupName,
-            dtype=dtype
-          )
-        accumulatedSum = NormalizationData._updateTotalSum(
-          accumulatedSum,
-          intermSum
-        )
-        accumulatedSumOfSqr = NormalizationData._updateTotalSum(
-          accumulatedSumOfSqr,
-          intermSumOfSqr
-        )
-        totalFrames += intermTotalFrames
-
-    mean, meanOfSquares, variance = \
-      NormalizationData._calculateMeans(
-        accumulatedSum,
-        accumulatedSumOfSqr,
-        totalFrames
+    fileKeys = [
+      NormalizationData._getFileKey(filePath)
+      for filePath in bundle.datasetFilePaths
+    ]
+    fileStatistics = NormalizationData._readFileStatistics(
+      outputFilePath,
+      groupName
+    )
+    newFileKeys = [k for k in fileKeys if k not in fileStatistics]
+    poolArgs = [(k[0], groupName, dtype) for k in newFileKeys]
+    if numWorkers > 1 and len(poolArgs) > 1:
+      from multiprocessing import Pool
+      pool = Pool(min(numWorkers, len(poolArgs)))
+      try:
+        newFileStatistics = pool.map(_calculateFileStatistics, poolArgs)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      newFileStatistics = [_calculateFileStatistics(a) for a in poolArgs]
+    fileStatistics.update(zip(newFileKeys, newFileStatistics))
+
+    totalStatistics = (0, None, None)
+    for k in fileKeys:
+      totalStatistics = NormalizationData.mergeStatistics(
+        totalStatistics,
+        fileStatistics[k]
       )
+    totalFrames = totalStatistics[0]
+    mean, meanOfSquares, variance = \
+      NormalizationData._calculateMeans(*totalStatistics)
 
     with h5py.File(outputFilePath, mode='a') as out:
       NormalizationData._writeData(
@@ -133,11 +169,28 @@ class NormalizationData(object):
         mean, meanOfSquares, variance, totalFrames,
         dtype=dtype
       )
+      NormalizationData._writeFileStatistics(
+        out[groupName],
+        [(k, fileStatistics[k]) for k in fileKeys]
+      )
 
   @staticmethod
-  def _accumulateSums(f, groupName, dtype=np.float64):
+  def _getFileKey(filePath):
     """Helper method.
-    Accumulate sums and sums of squares over feature vectors for a given group.
+
+    :type filePath: str
+    :param filePath: path to an HDF dataset file
+    :rtype: tuple (str, int, float)
+    :return: tuple (absolute path, size, modification time), which
+             identifies the file contents for the stored file statistics
+    """
+    st = os.stat(filePath)
+    return os.path.abspath(filePath), int(st.st_size), float(st.st_mtime)
+
+  @staticmethod
+  def _accumulateStatistics(f, groupName, dtype=np.float64):
+    """Helper method.
+    Accumulates the statistics over feature vectors for a given group.
 
     :type f: h5py.File
     :param f: handle to an opened HDF file with datasets
@@ -145,95 +198,143 @@ class NormalizationData(object):
     :param groupName: HDF group containing datasets
     :type dtype: numpy.dtype
     :param dtype: type of data to use during calculations.
-    :rtype: tuple (numpy.ndarray | None, numpy.ndarray | None, long)
-    :return: tuple (sum, sum of squares, total number of time frames)
-             if they are available
+    :rtype: tuple (int, numpy.ndarray | None, numpy.ndarray | None)
+    :return: tuple (count, mean, M2), see NormalizationData.mergeStatistics
     """
-    sum = None
-    sumOfSqr = None
-    totalFrames = 0 if six.PY3 else 0L  # python 2/3 compatibility
+    statistics = (0, None, None)
     if groupName not in f:
-      return sum, sumOfSqr, totalFrames
+      return statistics
     group = f[groupName]
-    datasetNames = group.keys()
-    if len(datasetNames) == 0:
-      return sum, sumOfSqr, totalFrames
-    featDims = group[datasetNames[0]].shape[
-      NormalizationData.DATASET_FEATURE_DIMENSION_INDEX
-    ]
-    sum = np.zeros(featDims, dtype=dtype)
-    sumOfSqr = np.zeros(featDims, dtype=dtype)
-    for dsName in datasetNames:
-      dataset = group[dsName][...]
-      sum += np.sum(
-        dataset,
-        axis=NormalizationData.DATASET_TIME_DIMENSION_INDEX
+    for dsName in group.keys():
+      dataset = group[dsName][...].astype(dtype)
+      statistics = NormalizationData.mergeStatistics(
+        statistics,
+        NormalizationData._calculateStatistics(dataset)
       )
-      sumOfSqr += np.sum(
-        np.square(dataset),
-        axis=NormalizationData.DATASET_TIME_DIMENSION_INDEX
-      )
-      totalFrames += dataset.shape[
-        NormalizationData.DATASET_TIME_DIMENSION_INDEX
-      ]
-    return sum, sumOfSqr, totalFrames
+    return statistics
 
   @staticmethod
-  def _updateTotalSum(totalSum, intermediateSum):
+  def _calculateStatistics(dataset):
     """Helper method.
-    Updates total sum with intermediate sum if the latter is available.
 
-    :type totalSum: numpy.ndarray | None
-    :param totalSum: total sum
-    :type intermediateSum: numpy.ndarray | None
-    :param intermediateSum: intermediate sum
-    :rtype: numpy.ndarray | None
-    :return: updated total sum if available
+    :type dataset: numpy.ndarray
+    :param dataset: shape (time frames, features)
+    :rtype: tuple (int, numpy.ndarray | None, numpy.ndarray | None)
+    :return: tuple (count, mean, M2), where M2 is the sum of squared
+             differences from the mean
     """
-    if totalSum is None and intermediateSum is None:
-      return None
-    if totalSum is None:
-      return intermediateSum
-    if intermediateSum is None:
-      return totalSum
-    # floating point summation check
-    oldSum = totalSum
-    newSum = np.add(totalSum, intermediateSum)
-    sumErr = np.sum(np.abs(newSum - oldSum - intermediateSum))
-    if sumErr > NormalizationData.SUMMATION_PRECISION:
-      raise FloatingPointError(
-        'sums have very different orders of magnitude.'
-        ' summation error = {}'.format(sumErr)
-      )
-    return newSum
+    count = dataset.shape[NormalizationData.DATASET_TIME_DIMENSION_INDEX]
+    if count == 0:
+      return 0, None, None
+    mean = np.mean(dataset, axis=NormalizationData.DATASET_TIME_DIMENSION_INDEX)
+    m2 = np.sum(
+      np.square(dataset - mean),
+      axis=NormalizationData.DATASET_TIME_DIMENSION_INDEX
+    )
+    return count, mean, m2
+
+  @staticmethod
+  def mergeStatistics(statisticsA, statisticsB):
+    """Merges the statistics of two disjoint sets of feature vectors,
+    in a numerically stable way (Chan et al.).
+
+    :type statisticsA: tuple (int, numpy.ndarray | None, numpy.ndarray | None)
+    :param statisticsA: tuple (count, mean, M2), where M2 is the sum of
+                        squared differences from the mean
+    :type statisticsB: tuple (int, numpy.ndarray | None, numpy.ndarray | None)
+    :param statisticsB: like statisticsA
+    :rtype: tuple (int, numpy.ndarray | None, numpy.ndarray | None)
+    :return: tuple (count, mean, M2) of the union
+    """
+    countA, meanA, m2A = statisticsA
+    countB, meanB, m2B = statisticsB
+    if countA == 0:
+      return statisticsB
+    if countB == 0:
+      return statisticsA
+    count = countA + countB
+    delta = meanB - meanA
+    mean = meanA + delta * (countB / float(count))
+    m2 = m2A + m2B + np.square(delta) * (countA * countB / float(count))
+    return count, mean, m2
 
   @staticmethod
-  def _calculateMeans(totalSum, totalSumOfSqr, totalFrames):
+  def _calculateMeans(totalFrames, mean, m2):
     """Helper method.
     Calculate mean, mean of squares and variance if they are available.
 
-    :type totalSum: numpy.ndarray | None
-    :param totalSum: total sum of features
-    :type totalSumOfSqr: numpy.ndarray | None
-    :param totalSumOfSqr: total sum of squares of features
-    :type totalFrames: long
+    :type totalFrames: int
     :param totalFrames: total number of timeframes
+    :type mean: numpy.ndarray | None
+    :param mean: mean of features
+    :type m2: numpy.ndarray | None
+    :param m2: sum of squared differences from the mean
     :rtype: tuple (numpy.ndarray | None, numpy.ndarray | None, numpy.ndarray | None)
     :return: tuple (mean, mean of squares, variance) if they are available
     """
-    mean = None
-    meanOfSquares = None
-    variance = None
-    if totalSum is not None:
-      assert totalFrames > 0
-      mean = totalSum / totalFrames
-    if mean is not None and totalSumOfSqr is not None:
-      assert totalFrames > 0
-      meanOfSquares = totalSumOfSqr / totalFrames
-      # Var[X] = E[X ^ 2] - (E[X]) ^ 2
-      variance = meanOfSquares - np.square(mean)
+    if totalFrames == 0:
+      return None, None, None
+    variance = m2 / totalFrames
+    # E[X ^ 2] = Var[X] + (E[X]) ^ 2
+    meanOfSquares = variance + np.square(mean)
     return mean, meanOfSquares, variance
 
+  @staticmethod
+  def _readFileStatistics(outputFilePath, groupName):
+    """Helper method.
+    Reads the stored statistics of the HDF dataset files from an existing
+    normalization file.
+
+    :type outputFilePath: str
+    :param outputFilePath: path to the output HDF normalization file.
+    :type groupName: str
+    :param groupName: HDF group name
+    :rtype: dict[(str, int, float), (int, numpy.ndarray | None, numpy.ndarray | None)]
+    :return: file key (see NormalizationData._getFileKey) -> statistics
+    """
+    fileStatistics = {}
+    if not os.path.isfile(outputFilePath):
+      return fileStatistics
+    with h5py.File(outputFilePath, mode='r') as f:
+      if groupName not in f or \
+          NormalizationData.GROUP_FILE_STATISTICS not in f[groupName]:
+        return fileStatistics
+      for fileGroup in f[groupName][NormalizationData.GROUP_FILE_STATISTICS].values():
+        fileKey = (
+          str(fileGroup.attrs['path']),
+          int(fileGroup.attrs['size']),
+          float(fileGroup.attrs['mtime'])
+        )
+        count = int(fileGroup[NormalizationData.DATASET_COUNT][()])
+        mean = None
+        m2 = None
+        if count > 0:
+          mean = fileGroup[NormalizationData.DATASET_MEAN][...]
+          m2 = fileGroup[NormalizationData.DATASET_M2][...]
+        fileStatistics[fileKey] = (count, mean, m2)
+    return fileStatistics
+
+  @staticmethod
+  def _writeFileStatistics(group, fileStatistics):
+    """Helper method.
+    Writes the statistics of the HDF dataset files.
+
+    :type group: h5py.Group
+    :param group: HDF group handle
+    :type fileStatistics: list[((str, int, float), (int, numpy.ndarray | None, numpy.ndarray | None))]
+    :param fileStatistics: list of (file key, statistics)
+    """
+    filesGroup = group.create_group(NormalizationData.GROUP_FILE_STATISTICS)
+    for i, (fileKey, (count, mean, m2)) in enumerate(fileStatistics):
+      fileGroup = filesGroup.create_group(str(i))
+      fileGroup.attrs['path'] = fileKey[0]
+      fileGroup.attrs['size'] = fileKey[1]
+      fileGroup.attrs['mtime'] = fileKey[2]
+      fileGroup.create_dataset(NormalizationData.DATASET_COUNT, data=count)
+      if count > 0:
+        fileGroup.create_dataset(NormalizationData.DATASET_MEAN, data=mean)
+        fileGroup.create_dataset(NormalizationData.DATASET_M2, data=m2)
+
   @staticmethod
   def _writeData(f, groupName, mean, meanOfSqr, variance, totalFrames,
                  dtype=np.float64):
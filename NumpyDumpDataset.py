@@ -9,11 +9,39 @@ class NumpyDumpDataset(Dataset):
 
   file_format_data = "%i.data"
   file_format_targets = "%i.targets"
+  binary_index_filename = "index.npz"
+
+  @staticmethod
+  def get_binary_filename(prefix, key):
+    """
+    :param str prefix: like for the text format, e.g. "/tmp/dump."
+    :param str key: "data" or target key
+    :return: filename of the .npy file with all the seqs of this key concatenated
+    :rtype: str
+    """
+    if key == "data":
+      return prefix + "data.npy"
+    return prefix + "targets.%s.npy" % key
 
   def __init__(self, prefix, postfix=".txt.gz",
                start_seq=0, end_seq=None,
-               num_inputs=None, num_outputs=None, **kwargs):
+               num_inputs=None, num_outputs=None, binary=False, **kwargs):
+    """
+    :param str prefix:
+    :param str postfix: only for the text format
+    :param int start_seq:
+    :param int|None end_seq:
+    :param int num_inputs:
+    :param dict[str,(int,int)]|int num_outputs:
+    :param bool binary: use the binary format (see :class:`NumpyDumpBinaryWriter`), which we open memory-mapped.
+      otherwise the text format, i.e. one text file per seq.
+    """
     super(NumpyDumpDataset, self).__init__(**kwargs)
+    self.binary = binary
+    self._binary_offsets = None; " :type: dict[str,numpy.ndarray] "  # key -> seq offsets, len num seqs + 1
+    self._binary_data = None; " :type: dict[str,numpy.ndarray] "  # key -> memmap of all seqs
+    if binary:
+      self._open_binary(prefix)
     self.file_format_data = prefix + self.file_format_data + postfix
     self.file_format_targets = prefix + self.file_format_targets + postfix
     self.start_seq = start_seq
@@ -23,8 +51,34 @@ class NumpyDumpDataset(Dataset):
     self.num_inputs = num_inputs
     self.num_outputs = num_outputs
     assert num_inputs and num_outputs
+    if binary:
+      assert self._binary_data["data"].shape[1:] == (num_inputs,), "Check %s." % self.get_binary_filename(prefix, "data")
+
+  def _open_binary(self, prefix):
+    """
+    :param str prefix:
+    """
+    index_filename = prefix + self.binary_index_filename
+    assert os.path.exists(index_filename), "Index not found. Check %s." % index_filename
+    index = numpy.load(index_filename)
+    self._binary_offsets = {key: index[key] for key in index.files}
+    index.close()
+    assert "data" in self._binary_offsets
+    self._binary_data = {
+      key: numpy.load(self.get_binary_filename(prefix, key), mmap_mode="r")
+      for key in self._binary_offsets}
+    for key, offsets in self._binary_offsets.items():
+      assert len(offsets) == len(self._binary_offsets["data"])
+      assert offsets[-1] == self._binary_data[key].shape[0], "Check %s." % self.get_binary_filename(prefix, key)
 
   def _init_num_seqs(self, end_seq=None):
+    if self.binary:
+      total_num_seqs = len(self._binary_offsets["data"]) - 1
+      if end_seq is None:
+        end_seq = total_num_seqs
+      assert self.start_seq < end_seq <= total_num_seqs
+      self._num_seqs = end_seq - self.start_seq
+      return
     last_seq = None
     i = self.start_seq
     while True:
@@ -46,11 +100,19 @@ class NumpyDumpDataset(Dataset):
 
   def _load_numpy_seq(self, seq_idx):
     real_idx = self._seq_index[seq_idx]
-    features = numpy.loadtxt(self.file_format_data % real_idx)
-    targets = numpy.loadtxt(self.file_format_targets % real_idx)
+    if self.binary:
+      # These are just views into the memory-mapped files.
+      seqs = {
+        key: data[self._binary_offsets[key][real_idx]:self._binary_offsets[key][real_idx + 1]]
+        for (key, data) in self._binary_data.items()}
+      features = seqs.pop("data")
+      targets = seqs
+    else:
+      features = numpy.loadtxt(self.file_format_data % real_idx)
+      targets = numpy.loadtxt(self.file_format_targets % real_idx)
+      assert targets.ndim == 1
     assert features.ndim == 2
     assert features.shape[1] == self.num_inputs
-    assert targets.ndim == 1
     self._add_cache_seq(seq_idx, features, targets)
 
   # ------------ Dataset API --------------
@@ -60,7 +122,7 @@ class NumpyDumpDataset(Dataset):
     if seq_list: raise NotImplementedError
     if self.seq_ordering == "sorted":  # not supported atm
       self.seq_ordering = "default"
-    self._seq_index = [i + self.start_seq for i in self.get_seq_order_for_epoch(epoch, self.num_seqs)]
+    self._seq_index = [i + self.start_seq for i in self.get_seq_order_for_epoch(epoch, self._num_seqs)]
     self.cached_seqs[:] = []
     return True
 
@@ -88,6 +150,8 @@ class NumpyDumpDataset(Dataset):
 
   @property
   def num_seqs(self):
+    if self._seq_index is not None:  # might be only a partition, see set_partition()
+      return len(self._seq_index)
     return self._num_seqs
 
   def len_info(self):
@@ -126,3 +190,64 @@ class NumpyDumpDataset(Dataset):
     assert seq_idx == last_seq_idx + 1
     self.cached_seqs += [DatasetSeq(seq_idx, features, targets)]
 
+
+class NumpyDumpBinaryWriter(object):
+  """
+  Writes the binary format of :class:`NumpyDumpDataset`:
+  For "data" and every target key, one .npy file with all the seqs concatenated,
+  and the index file with the seq offsets for every key.
+  We first append the seqs to raw files, because we don't know the final shape in advance.
+  """
+
+  def __init__(self, prefix):
+    """
+    :param str prefix: like for :class:`NumpyDumpDataset`
+    """
+    self.prefix = prefix
+    self._raw_files = {}; " :type: dict[str,file] "  # key -> raw file
+    self._dtypes = {}; " :type: dict[str,numpy.dtype] "
+    self._shapes = {}; " :type: dict[str,tuple[int]] "  # key -> shape without the time axis
+    self._offsets = {}; " :type: dict[str,list[int]] "
+
+  def _get_raw_filename(self, key):
+    return NumpyDumpDataset.get_binary_filename(self.prefix, key) + ".raw"
+
+  def add_seq(self, features, targets):
+    """
+    :param numpy.ndarray features: format 2d (time,feature)
+    :param dict[str,numpy.ndarray] targets: target key -> 1d (time)
+    """
+    seq = {"data": features}
+    seq.update(targets)
+    if not self._raw_files:
+      for key, value in seq.items():
+        self._raw_files[key] = open(self._get_raw_filename(key), "wb")
+        self._dtypes[key] = value.dtype
+        self._shapes[key] = value.shape[1:]
+        self._offsets[key] = [0]
+    assert sorted(seq.keys()) == sorted(self._raw_files.keys()), "All seqs need the same keys."
+    for key, value in seq.items():
+      assert value.shape[1:] == self._shapes[key]
+      numpy.ascontiguousarray(value, dtype=self._dtypes[key]).tofile(self._raw_files[key])
+      self._offsets[key].append(self._offsets[key][-1] + value.shape[0])
+
+  def close(self):
+    """
+    Writes the final .npy files and the index.
+    """
+    import shutil
+    assert self._raw_files, "No seqs added."
+    for key, raw_file in self._raw_files.items():
+      raw_file.close()
+      with open(NumpyDumpDataset.get_binary_filename(self.prefix, key), "wb") as f:
+        numpy.lib.format.write_array_header_1_0(f, {
+          "descr": numpy.lib.format.dtype_to_descr(self._dtypes[key]),
+          "fortran_order": False,
+          "shape": (self._offsets[key][-1],) + self._shapes[key]})
+        with open(raw_file.name, "rb") as raw_f:
+          shutil.copyfileobj(raw_f, f)
+      os.remove(raw_file.name)
+    numpy.savez(
+      self.prefix + NumpyDumpDataset.binary_index_filename,
+      **{key: numpy.array(offsets, dtype="int64") for (key, offsets) in self._offsets.items()})
+    self._raw_files.clear()
@@ -1,19 +1,20 @@
-import h5py
+from __future__ import print_function
+
 from CachedDataset2 import CachedDataset2
 from Dataset import DatasetSeq
 from Log import log
-import tempfile
+from collections import OrderedDict
 import scipy.io.wavfile
 import numpy as np
-import time
 
 class RawWavDataset(CachedDataset2):
   """
   This dataset returns the raw waveform information of wav files as sequence input data
-  It uses temporary hdf files to buffer the data, to avoid repeatadly rading the
-  wav files.
+  It keeps the decoded wav files in an in-memory LRU buffer, to avoid repeatadly reading the
+  wav files, and decodes the upcoming wav files (in epoch order) in background threads.
   """
-  def __init__(self, listFile, frameLength, frameShift, num_outputs=None, **kwargs):
+  def __init__(self, listFile, frameLength, frameShift, num_outputs=None,
+               wavBufferByteSize=1024 * 1024 * 1024, numDecodeThreads=2, decodeLookahead=4, **kwargs):
     """
     constructor
 
@@ -28,8 +29,13 @@ class RawWavDataset(CachedDataset2):
     :param num_outputs: this needs to be set if the data set is used with  
                         only input data (e.g. for the extraction
                         process). 
+    :type wavBufferByteSize: int
+    :param wavBufferByteSize: max size of the LRU buffer of decoded wav files
+    :type numDecodeThreads: int
+    :param numDecodeThreads: number of threads which decode the upcoming wav files. 0 to decode on demand
+    :type decodeLookahead: int
+    :param decodeLookahead: how many upcoming wav files (in epoch order) to decode in advance
     """
-    self._flag_buffering = False
     super(RawWavDataset, self).__init__(**kwargs)
     self._listFile = listFile
     with open(self._listFile, 'r') as f:
@@ -42,7 +48,13 @@ class RawWavDataset(CachedDataset2):
     self._num_seqs = len(self._wavFiles) 
     self._seq_index_list = None
 
-    self._hdfBufferHandler, self._hdfBufferPath = self._openHdfBuffer()
+    self._wavBufferByteSize = wavBufferByteSize
+    self._wavBuffer = OrderedDict()  # wavFileId -> time signal, least recently used first
+    self._wavBufferNumBytes = 0
+    self._numDecodeThreads = numDecodeThreads
+    self._decodeLookahead = decodeLookahead
+    self._decodePool = None  # created on first use, see _decodeUpcomingWavFiles()
+    self._pendingDecodes = {}  # wavFileId -> multiprocessing.pool.AsyncResult
 
     self.num_inputs = self._frameLength 
     self.num_outputs = self._getNumOutputs(num_outputs)
@@ -56,9 +68,7 @@ class RawWavDataset(CachedDataset2):
     :returns DatasetSeq or None if seq_idx >= num_seqs.
     """
     wavFileId = self._seq_index_list[seq_idx]
-    if not self._isInBuffer(wavFileId):
-      self._loadWavFileIdIntoBuffer(wavFileId)
-
+    self._decodeUpcomingWavFiles(seq_idx + 1)
     return self._collect_single_seq_from_buffer(wavFileId, seq_idx)
 
   def _collect_single_seq_from_buffer(self, wavFileId, seq_idx):
@@ -72,7 +82,7 @@ class RawWavDataset(CachedDataset2):
     """
     inputFeatures = self._getInputFeatures(wavFileId)
     outputFeatures = self._getOutputFeatures(wavFileId)
-    inputFeatures = inputFeatures.astype(np.float32)
+    inputFeatures = inputFeatures.astype(np.float32, copy=False)
     if outputFeatures is not None:
       outputFeatures = targets.astype(np.float32)
     return DatasetSeq(seq_idx, inputFeatures, outputFeatures)
@@ -92,30 +102,48 @@ class RawWavDataset(CachedDataset2):
     :type wavFileId: int
     :param wavFileId: list index of wav file for which to return the input features
     :rtype: 2D numpy.ndarray (frames, features)
-    :return: the 2d array containing the time signal segment for each frame
+    :return: the 2d array containing the time signal segment for each frame.
+      this is a read-only strided view on the (padded) time signal, i.e. the frames overlap in memory
     """
-    if not self._isInBuffer(wavFileId):
-      self._loadWavFileIdIntoBuffer(wavFileId)
-
-    timeSignal = self._hdfBufferHandler['timeSignal'][str(wavFileId)][...]
+    timeSignal = self._getTimeSignal(wavFileId)
     frameLength = self._frameLength
     frameShift = self._frameShift
-    nrOfFrames = int(np.ceil((float(timeSignal.shape[0]-frameLength)/frameShift) + 1))
+    nrOfFrames = self._getNumFramesOfTimeSignal(timeSignal)
     if self._flag_pad:
       padLength = (nrOfFrames -1) * frameShift + frameLength - timeSignal.shape[0]
-      timeSignalPad = np.zeros((timeSignal.shape[0] + padLength, ))
+      timeSignalPad = np.zeros((timeSignal.shape[0] + padLength, ), dtype=np.float32)
       timeSignalPad[0:timeSignal.shape[0]] = timeSignal
     else:
-      nrOfFrames -= 1  
       sigLength = (nrOfFrames -1) * frameShift + frameLength
-      timeSignalPad = np.zeros((sigLength, ))
-      timeSignalPad[:] = timeSignal[0:sigLength]
-        
-    inputFeatures = np.zeros((nrOfFrames, frameLength), dtype=np.float32)
-    for i1 in range(nrOfFrames):
-      inputFeatures[i1,:] = timeSignalPad[i1*frameShift:(i1*frameShift+frameLength)]
+      timeSignalPad = timeSignal[0:sigLength]
+
+    inputFeatures = np.lib.stride_tricks.as_strided(
+      timeSignalPad,
+      shape=(nrOfFrames, frameLength),
+      strides=(timeSignalPad.strides[0] * frameShift, timeSignalPad.strides[0]))
+    inputFeatures.flags.writeable = False
     return inputFeatures
 
+  def _getNumFramesOfTimeSignal(self, timeSignal):
+    """
+    :type timeSignal: 1D numpy.ndarray
+    :rtype: int
+    :return: number of frames, see _getInputFeatures()
+    """
+    nrOfFrames = int(np.ceil((float(timeSignal.shape[0] - self._frameLength) / self._frameShift) + 1))
+    if not self._flag_pad:
+      nrOfFrames -= 1
+    return nrOfFrames
+
+  def _getNumFrames(self, wavFileId):
+    """
+    :type wavFileId: int
+    :param wavFileId: list index of wav file
+    :rtype: int
+    :return: number of frames of the wav file. this decodes it (via the buffer)
+    """
+    return self._getNumFramesOfTimeSignal(self._getTimeSignal(wavFileId))
+
   def _getOutputFeatures(self, wavFileId):
     """
 
@@ -124,57 +152,58 @@ class RawWavDataset(CachedDataset2):
     :rtype: #TBD !!!
     :return: #TBD !!!
     """
-    if not self._isInBuffer(wavFileId):
-      self._loadWavFileIdIntoBuffer(wavFileId)
-    if not str(wavFileId) in self._hdfBufferHandler['outputs'].keys():
-      return None
-    else:
-      #TBD !!!
-      pass
+    return None
 
-  def _isInBuffer(self, wavFileId):
+  @staticmethod
+  def _decodeWavFile(wavFilePath):
     """
-    returns true if the wav file has already been loaded into the hdf file buffer
-
-    :type wavFileId: int
-    :rtype: bool
+    :type wavFilePath: str
+    :rtype: 1D numpy.ndarray
+    :return: the time signal as float32
     """
-    if str(wavFileId) in self._hdfBufferHandler['timeSignal'].keys():
-      return True
-    else:
-      return False
+    (r, x) = scipy.io.wavfile.read(wavFilePath)
+    return x.astype(np.float32)
 
-  def _loadWavFileIdIntoBuffer(self, wavFileId):
+  def _getTimeSignal(self, wavFileId):
     """
-    loads the specified wav file into the hdf file buffer
+    returns the decoded wav file, from the buffer if possible, and adds it to the buffer otherwise
 
     :type wavFileId: int
-    :param wavFileId: the list index specifying the wav file to be loaded to the buffer
-    """
-    if self._flag_buffering:
-        time.sleep(3)
-    self._flag_buffering = True
-    if self._isInBuffer(wavFileId):
-        return False
-    wavFilePath = self._wavFiles[wavFileId] 
-    (r, x) = scipy.io.wavfile.read(wavFilePath)
-    self._hdfBufferHandler['timeSignal'].create_dataset(str(wavFileId), data=x.astype(np.float32))
-    self._flag_buffering = False
-    return True
-
-  def _openHdfBuffer(self):
+    :rtype: 1D numpy.ndarray
     """
-    opens creates a local hdf file used as buffer to avoid reopening wav files
-
-    :rtype: (h5py._hl.file.File, string)
-    :return: (hdf buffer file handler, path to tmp file)
+    if wavFileId in self._wavBuffer:
+      timeSignal = self._wavBuffer.pop(wavFileId)
+      self._wavBuffer[wavFileId] = timeSignal  # now the most recently used one
+      return timeSignal
+    if wavFileId in self._pendingDecodes:
+      timeSignal = self._pendingDecodes.pop(wavFileId).get()
+    else:
+      timeSignal = self._decodeWavFile(self._wavFiles[wavFileId])
+    self._wavBuffer[wavFileId] = timeSignal
+    self._wavBufferNumBytes += timeSignal.nbytes
+    while self._wavBufferNumBytes > self._wavBufferByteSize and len(self._wavBuffer) > 1:
+      _, oldTimeSignal = self._wavBuffer.popitem(last=False)
+      self._wavBufferNumBytes -= oldTimeSignal.nbytes
+    return timeSignal
+
+  def _decodeUpcomingWavFiles(self, seq_idx):
     """
-    fId, tmpHdfFilePath = tempfile.mkstemp(suffix=".hdf") 
-    fileHandler = h5py.File(tmpHdfFilePath, 'w')
-    fileHandler.create_group('timeSignal')
-    fileHandler.create_group('outputs')
+    starts decoding the wav files of the next seqs in the background, if they are not buffered already
 
-    return fileHandler, tmpHdfFilePath 
+    :type seq_idx: int
+    :param seq_idx: first upcoming seq idx
+    """
+    if self._numDecodeThreads <= 0:
+      return
+    if self._decodePool is None:
+      from multiprocessing.pool import ThreadPool
+      self._decodePool = ThreadPool(self._numDecodeThreads)
+    for i in range(seq_idx, min(seq_idx + self._decodeLookahead, len(self._seq_index_list))):
+      wavFileId = self._seq_index_list[i]
+      if wavFileId in self._wavBuffer or wavFileId in self._pendingDecodes:
+        continue
+      self._pendingDecodes[wavFileId] = self._decodePool.apply_async(
+        self._decodeWavFile, (self._wavFiles[wavFileId],))
 
   def get_data_dim(self, key):
     """This is copied from CachedDataset2 but the assertion is
@@ -205,6 +234,8 @@ class RawWavDataset(CachedDataset2):
       self.seq_index  # sorted seq idx
     """
     super(RawWavDataset, self).init_seq_order(epoch=epoch, seq_list=seq_list)
+    self._pendingDecodes.clear()  # the upcoming wav files change with the new order
+    self._num_seqs = len(self._wavFiles)  # not the partition of the last epoch
 
     if epoch is None:
         self._seq_index_list = range(self.num_seqs)
@@ -213,12 +244,18 @@ class RawWavDataset(CachedDataset2):
     if seq_list:
       raise NotImplementedError('init_seq_order of RawWavDataset does not support a predefined seq_list yet.')
     else:
-      seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, lambda s: self.get_seq_length(s).get('data', None))
+      # The lengths are only known after decoding, thus only use them if the seq ordering needs them.
+      # Otherwise, a partition (see set_partition()) is round-robin.
+      get_seq_len = None
+      if self.seq_ordering == 'sorted' or self.seq_ordering.startswith('laplace'):
+        get_seq_len = self._getNumFrames
+      seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, get_seq_len)
 
     self._seq_index_list = seq_index
+    self._num_seqs = len(seq_index)  # might be only a partition, see set_partition()
     if epoch is not None:
       # Give some hint to the user in case he is wondering why the cache is reloading.
-      print >> log.v4, "Reinitialize dataset seq order for epoch %i." % epoch
+      print("Reinitialize dataset seq order for epoch %i." % epoch, file=log.v4)
 
     return True
 
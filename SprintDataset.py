@@ -819,6 +819,7 @@ class SprintCacheDataset(CachedDataset2):
     get_seq_size = lambda s: data0.sprint_cache.ft[self.seq_list_original[s]].size
     seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, get_seq_len=get_seq_size)
     self.seq_list_ordered = [self.seq_list_original[s] for s in seq_index]
+    self._num_seqs = len(self.seq_list_ordered)  # might be only a partition, see set_partition()
     return True
 
   def get_dataset_seq_for_name(self, name, seq_idx=-1):
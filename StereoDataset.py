@@ -4,12 +4,13 @@ interface for using RETURNN for regression.
 Applications are for example speech enhancement or mask estimations
 """
 
+from __future__ import print_function
+
 __author__ = 'menne'
 
 import os
 import numpy as np
 import h5py
-from collections import deque
 from CachedDataset2 import CachedDataset2
 from Dataset import DatasetSeq
 from BundleFile import BundleFile
@@ -37,6 +38,22 @@ class StereoDataset(CachedDataset2):
       return self._num_seqs
     raise NotImplementedError
 
+  def _get_total_num_seqs(self):
+    """returns the number of all sequences of the dataset, i.e. not only of the partition of the current epoch
+
+    :rtype: int
+    """
+    raise NotImplementedError
+
+  def _get_seq_length_by_orig_idx(self, orig_seq_idx):
+    """returns the number of frames of a sequence, without loading it
+
+    :type orig_seq_idx: int
+    :param orig_seq_idx: index in the original (unordered) sequence list
+    :rtype: int
+    """
+    raise NotImplementedError
+
   def _collect_single_seq(self, seq_idx):
     """returns the sequence specified by the index seq_idx
 
@@ -56,6 +73,7 @@ class StereoDataset(CachedDataset2):
       self.seq_index  # sorted seq idx
     """
     super(StereoDataset, self).init_seq_order(epoch=epoch, seq_list=seq_list)
+    self._num_seqs = self._get_total_num_seqs()  # not the partition of the last epoch
 
     if epoch is None:
         self._seq_index_list = range(self.num_seqs)
@@ -64,12 +82,13 @@ class StereoDataset(CachedDataset2):
     if seq_list:
       raise NotImplementedError('init_seq_order of StereoDataset does not support a predefined seq_list yet.')
     else:
-      seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, lambda s: self.get_seq_length(s).get('data', None))
+      seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, self._get_seq_length_by_orig_idx)
 
     self._seq_index_list = seq_index
+    self._num_seqs = len(seq_index)  # might be only a partition, see set_partition()
     if epoch is not None:
       # Give some hint to the user in case he is wondering why the cache is reloading.
-      print >> log.v4, "Reinitialize dataset seq order for epoch %i." % epoch
+      print("Reinitialize dataset seq order for epoch %i." % epoch, file=log.v4)
 
     return True
 
@@ -179,6 +198,22 @@ class StereoHdfDataset(StereoDataset):
         seqCounter += 1
     return seqCounter
 
+  def _get_total_num_seqs(self):
+    """returns the number of all sequences in the HDF files
+
+    :rtype: int
+    """
+    return len(self._seqMap)
+
+  def _get_seq_length_by_orig_idx(self, orig_seq_idx):
+    """returns the number of frames of a sequence, from the HDF dataset shape
+
+    :type orig_seq_idx: int
+    :rtype: int
+    """
+    fileIdx, datasetName = self._seqMap[orig_seq_idx]
+    return self._fileHandlers[fileIdx]['inputs'][datasetName].shape[0]
+
   def _setNormalization(self, normalizationFile):
     """Set optional normalization (mean and variance).
     Mean and variance are set only if they are provided.
@@ -366,27 +401,14 @@ class DatasetWithTimeContext(StereoHdfDataset):
     )
     inputFeatures = originalSeq.get_data('data')
     frames, bins = inputFeatures.shape
-    leftContext = deque()
-    rightContext = deque()
-    inFeatWithContext = []
-    for i in range(self._tau):
-      leftContext.append(np.zeros(bins))
-      if i + 1 < frames:
-        rightContext.append(inputFeatures[i + 1, ...])
-      else:
-        rightContext.append(np.zeros(bins))
-    for t in range(frames):
-      f = inputFeatures[t, ...]
-      newFeature = np.concatenate([np.concatenate(leftContext, axis=0), f, np.concatenate(rightContext, axis=0)],axis=0)
-      inFeatWithContext.append(newFeature)
-      leftContext.popleft()
-      leftContext.append(f)
-      rightContext.popleft()
-      if t + 1 + self._tau < frames:
-        rightContext.append(inputFeatures[t + 1 + self._tau, ...])
-      else:
-        rightContext.append(np.zeros(bins))
-    inputFeatures = np.array(inFeatWithContext)
+    if self.window_view:
+      zeros = np.zeros((self._tau, bins), dtype=inputFeatures.dtype)
+    else:
+      zeros = np.zeros((self._tau, bins))  # float64, like the features we used to create
+    padded = np.concatenate([zeros, inputFeatures, zeros], axis=0)
+    inputFeatures = self.get_context_window_view(padded, num_frames=frames, window=2 * self._tau + 1)
+    if not self.window_view:
+      inputFeatures = np.array(inputFeatures)
     targets = None
     if 'classes' in originalSeq.get_data_keys():
       targets = originalSeq.get_data('classes')
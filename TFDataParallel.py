@@ -0,0 +1,404 @@
+"""
+TensorFlow data parallel training
+=================================
+
+Synchronous data-parallel training with multiple local processes for the TF backend.
+
+We start ``data_parallel_num_workers`` processes in total on the same host
+(the main process, rank 0, which will launch the others, see :func:`DataParallel.launch_local_workers`).
+Every process has its own :class:`TFEngine.Engine`, TF session and :class:`TFEngine.Runner`,
+and trains on its own part of the train dataset (see :func:`Dataset.Dataset.set_partition`).
+Every worker does its own optimizer update, and
+every ``data_parallel_sync_step`` steps, the model parameters of all workers are averaged
+(via a simple all-reduce over local sockets, with rank 0 as the hub).
+I.e. this is parameter averaging (model averaging), not gradient averaging.
+The optimizer variables (e.g. the Adam moments or the gradient accumulators) are averaged in the same way,
+thus after every sync, all workers have the same state.
+Every float dtype is averaged in its own precision.
+Non-float variables (e.g. int step counters) are not averaged, they are only set from rank 0 at every epoch start.
+Only with a sync step of 1 and plain SGD, this is equivalent to averaging the gradients.
+With e.g. Adam, the update is not linear in the gradient, so this is only an approximation of that.
+A bigger sync step reduces the communication cost.
+
+The communication does not depend on any GPU functionality, so this also works on CPU-only hosts.
+
+Config options:
+
+  * ``data_parallel_num_workers``: int, number of processes in total. If >1, this is enabled.
+  * ``data_parallel_sync_step``: int, sync the params every N steps. 1 by default.
+  * ``data_parallel_rank``, ``data_parallel_port``: set internally for the launched worker processes.
+
+This is only used for ``task = "train"``.
+Only rank 0 evaluates on the dev/eval datasets and saves the model and the learning rate control file.
+Rank 0 will broadcast the learning rate to the other workers for every epoch.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import threading
+import numpy
+import tensorflow as tf
+from multiprocessing.connection import Listener, Client
+
+from Log import log
+
+
+class _FlatParams(object):
+  """
+  Graph ops to get all the given variables as one flat vector, and to assign them from such a vector.
+  This is one single session.run() call in each direction.
+  All variables must have the same dtype, which is also the dtype of the flat vector, i.e. there is no cast.
+  """
+
+  def __init__(self, variables):
+    """
+    :param list[tf.Variable] variables: all with the same dtype
+    """
+    self.variables = variables
+    self.dtype = variables[0].dtype.base_dtype  # type: tf.DType
+    assert all([v.dtype.base_dtype == self.dtype for v in variables])
+    self.sizes = [int(numpy.prod(v.get_shape().as_list())) for v in variables]
+    self.total_size = sum(self.sizes)
+    with tf.name_scope("data_parallel_flat_params"):
+      self.flat = tf.concat([tf.reshape(v, [-1]) for v in variables], axis=0)
+      self.placeholder = tf.placeholder(self.dtype, shape=(self.total_size,), name="flat_params")
+      parts = tf.split(self.placeholder, self.sizes, axis=0)
+      self.assign_op = tf.group(*[
+        tf.assign(v, tf.reshape(p, v.get_shape()))
+        for (v, p) in zip(variables, parts)])
+
+  def get(self, session):
+    """
+    :param tf.Session session:
+    :rtype: numpy.ndarray
+    """
+    return session.run(self.flat)
+
+  def set(self, session, values):
+    """
+    :param tf.Session session:
+    :param numpy.ndarray values:
+    """
+    session.run(self.assign_op, feed_dict={self.placeholder: values})
+
+
+class DataParallel(object):
+  """
+  Holds the connections between the local worker processes and implements the all-reduce.
+  Rank 0 is the hub: every worker is connected only to rank 0.
+  """
+
+  AuthKeyEnvVar = "RETURNN_DATA_PARALLEL_AUTHKEY"
+
+  def __init__(self, num_workers, rank=0, sync_step=1, port=0, authkey=None, connect_timeout=10 * 60):
+    """
+    :param int num_workers: number of processes in total
+    :param int rank: 0 for the main process
+    :param int sync_step: sync the params every N steps
+    :param int port: on localhost. 0 for rank 0 means to pick any free port
+    :param bytes|None authkey: all workers must use the same. if None, rank 0 creates a random one
+    :param int|float connect_timeout: in seconds, for the workers to connect to rank 0
+    """
+    assert num_workers >= 1 and 0 <= rank < num_workers
+    assert sync_step >= 1
+    self.num_workers = num_workers
+    self.rank = rank
+    self.sync_step = sync_step
+    self.connect_timeout = connect_timeout
+    if authkey is None:
+      assert rank == 0, "worker needs to get the authkey from rank 0"
+      authkey = os.urandom(16)
+    self.authkey = authkey
+    self._listener = None  # type: Listener|None
+    if rank == 0:
+      self._listener = Listener(("localhost", port), authkey=authkey)
+      port = self._listener.address[1]
+    self.port = port
+    self._conns = []  # rank 0: connections to rank 1..N-1, in that order. worker: [connection to rank 0]
+    self._worker_procs = []  # type: list[subprocess.Popen]
+    self._flat_params = {}  # type: dict[tuple[tf.Variable],list[_FlatParams]]
+    self._recv_buffer = None  # type: numpy.ndarray|None
+    self.num_syncs = 0
+    self.sync_time = 0.0
+
+  def __repr__(self):
+    return "<%s rank %i of %i, sync step %i>" % (self.__class__.__name__, self.rank, self.num_workers, self.sync_step)
+
+  @classmethod
+  def from_config(cls, config):
+    """
+    :param Config.Config config:
+    :rtype: DataParallel
+    """
+    rank = config.int("data_parallel_rank", 0)
+    authkey = None
+    if rank > 0 or os.environ.get(cls.AuthKeyEnvVar):
+      authkey = bytes(bytearray.fromhex(os.environ[cls.AuthKeyEnvVar]))
+    return cls(
+      num_workers=config.int("data_parallel_num_workers", 1),
+      rank=rank,
+      sync_step=config.int("data_parallel_sync_step", 1),
+      port=config.int("data_parallel_port", 0),
+      authkey=authkey)
+
+  def is_master(self):
+    """
+    :return: whether we are rank 0, which does the evaluation, model saving etc
+    :rtype: bool
+    """
+    return self.rank == 0
+
+  def launch_local_workers(self, cmd_args, num_threads_per_worker=None):
+    """
+    Starts the processes for rank 1..N-1. They will run rnn.py with the same args.
+    Call this in rank 0.
+
+    :param list[str] cmd_args: args for rnn.py, e.g. the config filename and other options
+    :param int|None num_threads_per_worker: if given, and OMP_NUM_THREADS is not set, will set it for all workers
+    """
+    assert self.is_master()
+    from subprocess import Popen
+    env = os.environ.copy()
+    env[self.AuthKeyEnvVar] = "".join(["%02x" % c for c in bytearray(self.authkey)])
+    if num_threads_per_worker and not env.get("OMP_NUM_THREADS"):
+      env["OMP_NUM_THREADS"] = str(num_threads_per_worker)
+    rnn_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rnn.py")
+    for rank in range(1, self.num_workers):
+      args = [sys.executable, rnn_py] + list(cmd_args) + [
+        "++data_parallel_rank", str(rank), "++data_parallel_port", str(self.port)]
+      print("Data parallel: launch worker %i: %s" % (rank, " ".join(args)), file=log.v4)
+      self._worker_procs.append(Popen(args, env=env))
+
+  def _check_worker_procs(self):
+    """
+    Raises an exception if some launched worker process has exited.
+    """
+    for rank, proc in enumerate(self._worker_procs, 1):
+      if proc.poll() is not None:
+        raise Exception("Data parallel: worker %i exited with code %r" % (rank, proc.returncode))
+
+  def _accept_workers(self):
+    """
+    Rank 0 waits for all workers to connect.
+    The accept itself does not have a timeout, thus we do it in a thread,
+    and meanwhile check the timeout and whether some launched worker process has crashed.
+
+    :return: connections to rank 1..N-1
+    :rtype: list[multiprocessing.connection.Connection]
+    """
+    conns = {}
+    errors = []
+
+    def accept_loop():
+      try:
+        while len(conns) < self.num_workers - 1:
+          conn = self._listener.accept()
+          rank = conn.recv()
+          assert 0 < rank < self.num_workers and rank not in conns
+          conns[rank] = conn
+      except Exception as exc:
+        errors.append(exc)
+
+    thread = threading.Thread(target=accept_loop, name="DataParallel accept")
+    thread.daemon = True
+    thread.start()
+    start_time = time.time()
+    while thread.is_alive():
+      thread.join(0.1)
+      self._check_worker_procs()
+      if thread.is_alive() and time.time() - start_time > self.connect_timeout:
+        raise Exception("Data parallel: timeout, only %i of %i workers connected" % (
+          len(conns), self.num_workers - 1))
+    if errors:
+      raise errors[0]
+    return [conns[rank] for rank in range(1, self.num_workers)]
+
+  def connect(self):
+    """
+    Rank 0 waits for all workers to connect, the workers connect to rank 0.
+    """
+    if self._conns:
+      return
+    if self.is_master():
+      self._conns = self._accept_workers()
+    else:
+      start_time = time.time()
+      while True:
+        try:
+          conn = Client(("localhost", self.port), authkey=self.authkey)
+          break
+        except (IOError, OSError):  # maybe rank 0 is not ready yet
+          if time.time() - start_time > self.connect_timeout:
+            raise
+          time.sleep(0.1)
+      conn.send(self.rank)
+      self._conns = [conn]
+    print("Data parallel: %r connected." % self, file=log.v3)
+
+  def finalize(self):
+    """
+    Closes the connections, and waits for the launched worker processes.
+    """
+    for conn in self._conns:
+      conn.close()
+    self._conns = []
+    if self._listener:
+      self._listener.close()
+      self._listener = None
+    for proc in self._worker_procs:
+      proc.wait()
+    self._worker_procs = []
+
+  def all_reduce_mean(self, values, done=False):
+    """
+    Averages the values over all workers. All workers must call this the same number of times.
+
+    :param numpy.ndarray values: 1D float16, float32 or float64 array, same shape and dtype in all workers.
+      will be overwritten with the mean
+    :param bool done: whether this worker has reached the end of the epoch
+    :return: whether all workers are done
+    :rtype: bool
+    """
+    assert isinstance(values, numpy.ndarray) and values.ndim == 1
+    assert values.dtype in (numpy.float16, numpy.float32, numpy.float64)
+    self.connect()
+    if self.num_workers == 1:
+      return done
+    if self.is_master():
+      if self._recv_buffer is None or self._recv_buffer.nbytes < values.nbytes:
+        self._recv_buffer = numpy.empty((values.nbytes,), dtype="uint8")
+      recv_values = self._recv_buffer[:values.nbytes].view(values.dtype)
+      all_done = done
+      for rank, conn in enumerate(self._conns, 1):
+        all_done = conn.recv() and all_done
+        self._recv_bytes_into(conn, recv_values, rank=rank)
+        values += recv_values
+      values *= 1.0 / self.num_workers
+      for conn in self._conns:
+        conn.send(all_done)
+        conn.send_bytes(values)
+    else:
+      conn, = self._conns
+      conn.send(done)
+      conn.send_bytes(values)
+      all_done = conn.recv()
+      self._recv_bytes_into(conn, values, rank=0)
+    return all_done
+
+  @staticmethod
+  def _recv_bytes_into(conn, values, rank):
+    """
+    :param multiprocessing.connection.Connection conn:
+    :param numpy.ndarray values: we expect to receive exactly this size
+    :param int rank: where we receive from. for the error message
+    """
+    from multiprocessing import BufferTooShort
+    try:
+      num_bytes = conn.recv_bytes_into(values)
+    except BufferTooShort as exc:
+      raise Exception("Data parallel: received more data from rank %i than expected (%i bytes): %s" % (
+        rank, values.nbytes, exc))
+    if num_bytes != values.nbytes:
+      raise Exception("Data parallel: received %i bytes from rank %i but expected %i bytes" % (
+        num_bytes, rank, values.nbytes))
+
+  def broadcast(self, obj):
+    """
+    :param T obj: any picklable object. the value of rank 0 is used
+    :return: obj of rank 0
+    :rtype: T
+    """
+    self.connect()
+    if self.is_master():
+      for conn in self._conns:
+        conn.send(obj)
+      return obj
+    conn, = self._conns
+    return conn.recv()
+
+  def all_gather(self, obj):
+    """
+    :param T obj: any picklable object
+    :return: the obj of all workers, by rank
+    :rtype: list[T]
+    """
+    self.connect()
+    if self.is_master():
+      objs = [obj] + [conn.recv() for conn in self._conns]
+      return self.broadcast(objs)
+    conn, = self._conns
+    conn.send(obj)
+    return self.broadcast(None)
+
+  def _get_flat_params(self, variables):
+    """
+    :param list[tf.Variable] variables:
+    :return: one per dtype, sorted by dtype name, thus in the same order in all workers
+    :rtype: list[_FlatParams]
+    """
+    key = tuple(variables)
+    if key not in self._flat_params:
+      # E.g. in pretraining, the network can change, or the optimizer vars are not there yet.
+      by_dtype = {}  # type: dict[str,list[tf.Variable]]
+      for v in variables:
+        by_dtype.setdefault(v.dtype.base_dtype.name, []).append(v)
+      self._flat_params[key] = [_FlatParams(by_dtype[name]) for name in sorted(by_dtype.keys())]
+    return self._flat_params[key]
+
+  def sync_params(self, session, variables, done=False):
+    """
+    Averages the float variables (model params and optimizer vars) over all workers, each in its own dtype.
+    Other variables (e.g. int step counters) are kept as they are.
+
+    :param tf.Session session:
+    :param list[tf.Variable] variables: the same in all workers, e.g. via :func:`TFEngine.Engine.get_data_parallel_sync_vars`
+    :param bool done: whether this worker has reached the end of the epoch
+    :return: whether all workers are done
+    :rtype: bool
+    """
+    start_time = time.time()
+    all_done = done
+    for flat_params in self._get_flat_params(variables):
+      if not flat_params.dtype.is_floating:
+        continue
+      values = flat_params.get(session)
+      all_done = self.all_reduce_mean(values, done=done)
+      flat_params.set(session, values)
+    self.num_syncs += 1
+    self.sync_time += time.time() - start_time
+    return all_done
+
+  def finish_epoch_sync_params(self, session, variables):
+    """
+    To be called at the end of an epoch. Workers can have a different number of steps,
+    thus we continue to sync until all workers are done.
+    Afterwards, all workers have the same params.
+
+    :param tf.Session session:
+    :param list[tf.Variable] variables:
+    """
+    while not self.sync_params(session=session, variables=variables, done=True):
+      pass
+
+  def broadcast_params(self, session, variables):
+    """
+    Sets the variables of all workers to those of rank 0.
+
+    :param tf.Session session:
+    :param list[tf.Variable] variables:
+    """
+    for flat_params in self._get_flat_params(variables):
+      values = self.broadcast(flat_params.get(session) if self.is_master() else None)
+      if not self.is_master():
+        flat_params.set(session, values)
+
+  def partition_dataset(self, dataset):
+    """
+    Every worker will only see its own part of the seqs of every epoch.
+
+    :param Dataset.Dataset dataset: the same in all workers
+    """
+    dataset.set_partition(partition_index=self.rank, num_partitions=self.num_workers)
@@ -112,6 +112,17 @@ Pipeline implementation
 
 It depends on whether the full network is recurrent or not.
 
+
+tf.data input
+-------------
+
+This is what the TF engine uses with the config option ``tf_data_pipeline = True``,
+see :class:`TFDataInput` and :class:`TFDataProvider`.
+The batches are built (chunking, padding) like for the feed_dict method, but in a background thread,
+and tf.data prefetches them (to the GPU, if we use it).
+The network gets its input directly from the tf.data iterator,
+so session.run() does not need to wait for the batch assembly in Python.
+
 """
 
 from __future__ import print_function
@@ -1029,6 +1040,193 @@ class FeedDictDataProvider(DataProviderBase):
     return self.batches.completed_frac()
 
 
+class TFDataInput(object):
+  """
+  Graph-side input for the network via tf.data, as an alternative to feeding the placeholders.
+  The batches are still built by :class:`TFDataProvider` in Python (incl. chunking and padding),
+  but in a background thread, and tf.data prefetches them (optionally to the compute device),
+  thus the session.run() of a step does not wait for the batch assembly.
+  The extern data placeholders are tf.placeholder_with_default of the iterator output,
+  so you can still feed them as usual, e.g. via :class:`FeedDictDataProvider`.
+  Create this in the graph before the network, and a new :class:`TFDataProvider` for every run.
+  """
+
+  def __init__(self, extern_data, capacity=10, prefetch_device=None):
+    """
+    :param ExternData extern_data: data without placeholders, see :func:`ExternData.init_from_config`.
+      we will set the placeholders.
+    :param int capacity: number of batches to prefetch
+    :param str|None prefetch_device: e.g. "/gpu:0". prefetches the batches to this device
+    """
+    if prefetch_device:
+      from TFUtil import assert_min_tf_version
+      assert_min_tf_version((1, 12), "tf.data.experimental.prefetch_to_device")
+    self.extern_data = extern_data
+    self.data_keys = sorted(extern_data.data.keys())
+    self.current_provider = None  # type: TFDataProvider|None
+    output_types = {}
+    output_shapes = {}
+    for key in self.data_keys:
+      data = extern_data.data[key]
+      output_types[key] = tf.as_dtype(data.dtype)
+      output_shapes[key] = tf.TensorShape(data.batch_shape)
+      if data.have_time_axis():
+        output_types["%s_seq_lens" % key] = tf.as_dtype(data.size_dtype)
+        output_shapes["%s_seq_lens" % key] = tf.TensorShape((None,))
+    with tf.device("/cpu:0"):
+      dataset = tf.data.Dataset.from_generator(
+        self._generate, output_types=output_types, output_shapes=output_shapes)
+      dataset = dataset.prefetch(capacity)
+    if prefetch_device:
+      dataset = dataset.apply(tf.data.experimental.prefetch_to_device(prefetch_device, buffer_size=1))
+    self.iterator = dataset.make_initializable_iterator()
+    self.init_op = self.iterator.initializer
+    next_batch = self.iterator.get_next()
+    for key in self.data_keys:
+      data = extern_data.data[key]
+      with tf.name_scope("extern_data/placeholders/%s/" % key):
+        data.placeholder = tf.placeholder_with_default(next_batch[key], shape=data.batch_shape, name=key)
+        data.size_placeholder = {}
+        if data.have_time_axis():
+          data.size_placeholder[0] = tf.placeholder_with_default(
+            next_batch["%s_seq_lens" % key], shape=(None,), name="%s_dim0_size" % key)
+
+  def _generate(self):
+    """
+    This is called by tf.data after :func:`init_dataset`, in its own thread.
+
+    :return: yields the batches of the current provider
+    :rtype: typing.Generator[dict[str,numpy.ndarray]]
+    """
+    provider = self.current_provider
+    assert provider
+    while True:
+      enqueue_args = provider.queue.get()
+      if enqueue_args is None:  # end
+        break
+      yield enqueue_args
+
+  def can_provide(self, data_keys):
+    """
+    :param set(str)|None data_keys: e.g. network.used_data_keys
+    :return: whether we can provide the data for all these keys, e.g. not for "seq_tag"
+    :rtype: bool
+    """
+    if data_keys is None:
+      data_keys = self.extern_data.data.keys()
+    return set(data_keys).issubset(self.data_keys)
+
+  def init_dataset(self, session, provider):
+    """
+    :param tf.Session session:
+    :param TFDataProvider provider:
+    """
+    self.current_provider = provider
+    session.run(self.init_op)
+
+
+class TFDataProvider(FeedDictDataProvider):
+  """
+  Provides the batches for :class:`TFDataInput`.
+  The background thread builds the batches like in :class:`FeedDictDataProvider`,
+  and tf.data gets them from our queue.
+  """
+
+  def __init__(self, tf_data_input, **kwargs):
+    """
+    :param TFDataInput tf_data_input:
+    """
+    super(TFDataProvider, self).__init__(**kwargs)
+    assert self.queue
+    self.tf_data_input = tf_data_input
+    self.num_produced = 0  # batches in our queue or already in the tf.data pipeline
+    self.num_consumed = 0  # steps
+
+  def start_threads(self):
+    self.tf_data_input.init_dataset(session=self.tf_session, provider=self)
+    super(TFDataProvider, self).start_threads()
+
+  def stop_threads(self):
+    if not self.thread:
+      return
+    self.coord.request_stop()
+    # The thread could block in the queue put if tf.data does not read anymore.
+    while self.thread.is_alive():
+      while not self.queue.empty():
+        self.queue.get()
+      self.thread.join(0.1)
+    # The thread might have put another batch before it ended. We don't need it anymore,
+    # and the queue must have space for the end marker.
+    while not self.queue.empty():
+      self.queue.get()
+    # Make sure that the tf.data generator does not block in the queue get.
+    # Do this always, as the generator might just have taken the last item which we saw above.
+    self.queue.put(None)
+
+  def get_next_batch(self):
+    enqueue_args = super(TFDataProvider, self).get_next_batch()
+    # tf.data needs values for all extern data, also for what the network does not use.
+    batch_dim = len(enqueue_args[self.data_keys[0]]) if self.data_keys else 0
+    for key in self.tf_data_input.data_keys:
+      if key in enqueue_args:
+        continue
+      data = self.extern_data.data[key]
+      enqueue_args[key] = numpy.zeros(
+        (batch_dim,) + tuple([d if d is not None else 0 for d in data.shape]), dtype=data.dtype)
+      if data.have_time_axis():
+        enqueue_args["%s_seq_lens" % key] = numpy.zeros((batch_dim,), dtype=data.size_dtype)
+    return enqueue_args
+
+  def thread_main(self):
+    try:
+      import better_exchook
+      better_exchook.install()
+
+      while self.batches.has_more() and not self.coord.should_stop():
+        enqueue_args = self.get_next_batch()
+        self.queue.put(enqueue_args)
+        with self.state_change_cond:
+          self.num_produced += 1
+          self.state_change_cond.notifyAll()
+        self.batches.advance(1)
+
+      self.reached_end = not self.batches.has_more()
+
+    except Exception as exc:
+      print("Exception in DataProvider thread: %r" % exc)
+      sys.excepthook(*sys.exc_info())
+
+    finally:
+      with self.state_change_cond:
+        self.thread_finished = True
+        self.state_change_cond.notifyAll()
+      if not self.coord.should_stop():
+        self.queue.put(None)  # end for the tf.data generator
+
+  def have_more_data(self, session):
+    """
+    :return: whether there is another batch in the tf.data pipeline (or there will be)
+    :rtype: bool
+    """
+    with self.state_change_cond:
+      while True:
+        if self.num_produced > self.num_consumed:
+          return True
+        if self.thread_finished:
+          return False
+        self.state_change_cond.wait()
+
+  def get_feed_dict(self, single_threaded=False):
+    """
+    :param bool single_threaded: not supported
+    :return: nothing to feed, the network gets the data via tf.data
+    :rtype: dict[tf.Tensor,numpy.ndarray]
+    """
+    assert not single_threaded
+    self.num_consumed += 1
+    return {}
+
+
 class QueueDataProvider(DataProviderBase):
   """
   This class is supposed to encapsulate all the logic of this module and to be used by the TF engine.
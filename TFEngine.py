@@ -32,11 +32,181 @@ from LearningRateControl import loadLearningRateControlFromConfig
 from Log import log
 from Network import LayerNetwork
 from Pretrain import pretrainFromConfig
-from TFNetwork import TFNetwork, ExternData
+from TFNetwork import TFNetwork, ExternData, BackgroundParamsSaver
 from TFUpdater import Updater
 from Util import hms, NumbersDict
 
 
+class RunnerStepTimings(object):
+  """
+  Lightweight timing instrumentation of the host-side loop in :func:`Runner.run`.
+  For every step, we measure how much wall-clock time was spent in each phase (see :attr:`phases`),
+  e.g. waiting for the data provider, building the feed dict, inside `session.run`, and the post-processing.
+  This is cheap enough to always be enabled, in contrast to the full TF trace via `store_metadata_mod_step`.
+  At the end of an epoch, this can be aggregated into percentiles, and written as CSV/JSON
+  and optionally as a Chrome trace (open it via chrome://tracing).
+  This allows to see whether some run is input-bound.
+  """
+
+  phases = ("data_wait", "feed", "compute", "summary", "fetch", "callback", "log", "sync")
+  percentiles = (50, 90, 99)
+
+  def __init__(self, with_chrome_trace=False):
+    """
+    :param bool with_chrome_trace: whether to also collect the events for :func:`write_chrome_trace`
+    """
+    import array
+    self.with_chrome_trace = with_chrome_trace
+    self.start_time = time.time()
+    self.num_steps = 0
+    # We use compact arrays here because this is collected for every step.
+    self.step_start_times = array.array("d")  # relative to self.start_time
+    self.durations = {phase: array.array("d") for phase in self.phases}  # type: dict[str,array.array]
+    self.trace_events = []  # type: list[dict[str]]  # only with chrome trace
+    self._cur_step_durations = None  # type: dict[str,float]|None
+    self._cur_step_start = None  # type: float|None
+    self._cur_phase = None  # type: str|None
+    self._cur_phase_start = None  # type: float|None
+
+  def start_phase(self, phase):
+    """
+    Ends the current phase (if there is one) and starts a new phase.
+    If there is no current step, this will also start a new step.
+
+    :param str phase: one of :attr:`phases`
+    """
+    assert phase in self.durations, "%s: unknown phase %r" % (self.__class__.__name__, phase)
+    now = time.time()
+    if self._cur_step_durations is None:
+      self._cur_step_durations = {}
+      self._cur_step_start = now
+    else:
+      self._end_phase(now)
+    self._cur_phase = phase
+    self._cur_phase_start = now
+
+  def _end_phase(self, now):
+    """
+    :param float now: time.time()
+    """
+    duration = now - self._cur_phase_start
+    self._cur_step_durations[self._cur_phase] = self._cur_step_durations.get(self._cur_phase, 0.0) + duration
+    if self.with_chrome_trace:
+      self.trace_events.append({
+        "name": self._cur_phase, "cat": "step", "ph": "X", "pid": 0, "tid": 0,
+        "ts": (self._cur_phase_start - self.start_time) * 1e6, "dur": duration * 1e6,
+        "args": {"step": self.num_steps}})
+
+  def finish_step(self):
+    """
+    Ends the current phase and the current step, and stores its durations.
+    """
+    assert self._cur_step_durations is not None, "%s: no step started" % self.__class__.__name__
+    self._end_phase(time.time())
+    self.step_start_times.append(self._cur_step_start - self.start_time)
+    for phase in self.phases:
+      self.durations[phase].append(self._cur_step_durations.get(phase, 0.0))
+    self.num_steps += 1
+    self._cur_step_durations = None
+    self._cur_phase = None
+
+  def discard_step(self):
+    """
+    Ends the current step without storing it, e.g. the last "data_wait" when the data provider has no more data.
+    """
+    if self._cur_step_durations is None:
+      return
+    self._end_phase(time.time())
+    self._cur_step_durations = None
+    self._cur_phase = None
+
+  def _get_step_totals(self):
+    """
+    :return: total time of each step, shape (num_steps,)
+    :rtype: numpy.ndarray
+    """
+    totals = numpy.zeros((self.num_steps,), dtype="float64")
+    for phase in self.phases:
+      totals += numpy.array(self.durations[phase], dtype="float64")
+    return totals
+
+  def get_summary(self):
+    """
+    :return: for each phase (and "total"): dict with "sum", "mean", "max" and the percentiles "p50" etc, in seconds
+    :rtype: dict[str,dict[str,float]]
+    """
+    summary = {}
+    for phase in self.phases + ("total",):
+      if phase == "total":
+        values = self._get_step_totals()
+      else:
+        values = numpy.array(self.durations[phase], dtype="float64")
+      if len(values) == 0:
+        values = numpy.zeros((1,), dtype="float64")
+      d = {"sum": float(numpy.sum(values)), "mean": float(numpy.mean(values)), "max": float(numpy.max(values))}
+      for p in self.percentiles:
+        d["p%i" % p] = float(numpy.percentile(values, p))
+      summary[phase] = d
+    return summary
+
+  def get_summary_str(self):
+    """
+    :return: one-line human readable summary
+    :rtype: str
+    """
+    summary = self.get_summary()
+    total = summary["total"]["sum"] or 1.0
+    parts = ["%i steps" % self.num_steps]
+    for phase in self.phases:
+      d = summary[phase]
+      parts.append("%s %.1f%% (p50 %.4f, p99 %.4f sec)" % (phase, d["sum"] * 100.0 / total, d["p50"], d["p99"]))
+    parts.append("step p50 %.4f, p99 %.4f sec" % (summary["total"]["p50"], summary["total"]["p99"]))
+    return ", ".join(parts)
+
+  def write_csv(self, filename):
+    """
+    Writes one row per step with the durations in seconds.
+
+    :param str filename:
+    """
+    totals = self._get_step_totals()
+    with open(filename, "w") as f:
+      f.write(",".join(("step", "start") + self.phases + ("total",)) + "\n")
+      for i in range(self.num_steps):
+        row = ["%i" % i, "%.6f" % self.step_start_times[i]]
+        row += ["%.6f" % self.durations[phase][i] for phase in self.phases]
+        row += ["%.6f" % totals[i]]
+        f.write(",".join(row) + "\n")
+
+  def write_json(self, filename, **info):
+    """
+    Writes the aggregated summary, see :func:`get_summary`.
+
+    :param str filename:
+    :param info: additional entries, such as the epoch
+    """
+    import json
+    d = dict(info)
+    d.update({"num_steps": self.num_steps, "phases": self.get_summary()})
+    with open(filename, "w") as f:
+      json.dump(d, f, indent=2, sort_keys=True)
+      f.write("\n")
+
+  def write_chrome_trace(self, filename, name="RETURNN"):
+    """
+    Writes the collected events in the Chrome trace event format.
+
+    :param str filename:
+    :param str name: process name shown in the trace viewer
+    """
+    assert self.with_chrome_trace
+    import json
+    events = [{"name": "process_name", "ph": "M", "pid": 0, "tid": 0, "args": {"name": name}}]
+    events += self.trace_events
+    with open(filename, "w") as f:
+      json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
 class Runner(object):
   def __init__(self, engine, dataset, batches, train, eval=True, extra_fetches=None, extra_fetches_callback=None):
     """
@@ -51,19 +221,31 @@ class Runner(object):
       It might also be useful to add `network.get_extern_data("seq_idx")` and `network.get_extern_data("seq_tag")`.
     :param (**dict[str,numpy.ndarray|str|list[numpy.ndarray|str])->None extra_fetches_callback: called if extra_fetches
     """
-    from TFDataPipeline import FeedDictDataProvider, DataProviderBase
+    from TFDataPipeline import FeedDictDataProvider, TFDataProvider, DataProviderBase
     engine.network.extern_data.check_matched_dataset(
       dataset=dataset, used_data_keys=engine.network.used_data_keys)
     self.engine = engine
-    self.data_provider = FeedDictDataProvider(
-      tf_session=engine.tf_session, extern_data=engine.network.extern_data,
-      data_keys=engine.network.used_data_keys,
-      dataset=dataset, batches=batches)
+    if engine.tf_data_input and engine.tf_data_input.can_provide(engine.network.used_data_keys):
+      self.data_provider = TFDataProvider(
+        tf_data_input=engine.tf_data_input,
+        tf_session=engine.tf_session, extern_data=engine.network.extern_data,
+        data_keys=engine.network.used_data_keys,
+        dataset=dataset, batches=batches)
+    else:
+      self.data_provider = FeedDictDataProvider(
+        tf_session=engine.tf_session, extern_data=engine.network.extern_data,
+        data_keys=engine.network.used_data_keys,
+        dataset=dataset, batches=batches)
     assert isinstance(self.data_provider, DataProviderBase)
     self._should_train = train
     self._should_eval = eval
     self.store_metadata_mod_step = engine.config.int("store_metadata_mod_step", 0)
     self.reset_updater_vars_mod_step = engine.config.int("reset_updater_vars_mod_step", 0)
+    self.log_step_timings = engine.config.bool("tf_log_step_timings", False)
+    self.log_step_timings_chrome_trace = engine.config.bool("tf_log_step_timings_chrome_trace", False)
+    self.step_timings = None  # type: RunnerStepTimings|None
+    # Only in training, we sync the params. See TFDataParallel.
+    self.data_parallel = engine.data_parallel if train else None
     self.finalized = False
     self.num_steps = None
     self.device_crash_batch = None  # type: int|None
@@ -199,6 +381,8 @@ class Runner(object):
     :param int num_steps: number of steps we did for this epoch
     """
     assert not self.data_provider.have_more_data(session=self.engine.tf_session)
+    if self.data_parallel:
+      self._data_parallel_sum_results()
     results = {key: value * self._epoch_norm_factor_for_result(key)
                for (key, value) in self._results_accumulated.items()}
     self.results = results
@@ -207,6 +391,25 @@ class Runner(object):
     self.num_steps = num_steps
     self.finalized = True
 
+  def _data_parallel_sum_results(self):
+    """
+    Every worker only has the accumulated results of its part of the dataset.
+    This sums them up over all workers, such that we get the results over the whole dataset.
+    A worker might not have gotten any batch at all, thus we use the union of the keys of all workers.
+    We use float64 because the number of frames can easily exceed the float32 precision.
+    """
+    all_keys = self.data_parallel.all_gather(sorted(self._results_accumulated.keys()))
+    keys = sorted(set(sum(all_keys, [])))
+    values = numpy.array(
+      [self._results_accumulated.get(key, 0.0) for key in keys] +
+      [self.num_frames_accumulated[key] for key in keys],
+      dtype="float64")
+    self.data_parallel.all_reduce_mean(values, done=True)
+    values *= self.data_parallel.num_workers
+    for i, key in enumerate(keys):
+      self._results_accumulated[key] = float(values[i])
+      self.num_frames_accumulated[key] = int(round(values[len(keys) + i]))
+
   def _step_seq_len(self, fetches_results, data_key):
     """
     :param dict[str,numpy.ndarray|None] fetches_results: results of calculations, see self._get_fetches_dict()
@@ -287,6 +490,30 @@ class Runner(object):
         d[k] = list(r)
     self.extra_fetches_callback(**d)
 
+  def _maybe_write_step_timings(self, logdir, report_prefix):
+    """
+    Called at the end of an epoch. See :class:`RunnerStepTimings`.
+
+    :param str|None logdir: the log dir of this runner, see :func:`run`
+    :param str report_prefix: prefix for logging
+    """
+    if not self.log_step_timings and not self.log_step_timings_chrome_trace:
+      return
+    print("%s step timings: %s" % (report_prefix, self.step_timings.get_summary_str()), file=log.v3)
+    if not logdir:
+      return
+    if not os.path.exists(logdir):
+      os.makedirs(logdir)
+    filename_prefix = "%s/step_timings.epoch%i" % (logdir, self.engine.epoch)
+    if self.log_step_timings:
+      self.step_timings.write_csv(filename_prefix + ".csv")
+      self.step_timings.write_json(
+        filename_prefix + ".json",
+        epoch=self.engine.epoch, dataset=self.data_provider.get_dataset_name(), train=self._should_train)
+    if self.log_step_timings_chrome_trace:
+      self.step_timings.write_chrome_trace(filename_prefix + ".trace.json", name=report_prefix)
+    print("Wrote step timings to %s.*" % filename_prefix, file=log.v4)
+
   def run(self, report_prefix):
     """
     :param str report_prefix: prefix for logging
@@ -298,12 +525,16 @@ class Runner(object):
       logdir = os.path.dirname(self.engine.model_filename) or os.getcwd()
     if logdir:
       from Util import log_runtime_info_to_dir
-      log_runtime_info_to_dir(logdir, config=self.engine.config)
+      data_parallel = self.engine.data_parallel
+      if not data_parallel or data_parallel.is_master():
+        log_runtime_info_to_dir(logdir, config=self.engine.config)
       logdir += "/%s" % self.data_provider.get_dataset_name()
       if not self._should_train:  # like eval
         logdir += "-%i" % self.engine.epoch
       if self.engine.use_search_flag:
         logdir += "-search"
+      if data_parallel and not data_parallel.is_master():
+        logdir += ".rank%i" % data_parallel.rank  # the other workers should not write into the same files
       writer = tf.summary.FileWriter(logdir)
     else:
       writer = None
@@ -321,6 +552,7 @@ class Runner(object):
     threads = tf.train.start_queue_runners(sess=sess, coord=coord)
     self.data_provider.start_threads()
     self.start_time = time.time()
+    self.step_timings = timings = RunnerStepTimings(with_chrome_trace=self.log_step_timings_chrome_trace)
     step = None
     try:
       # step is like mini-batch in our usual terminology
@@ -331,7 +563,9 @@ class Runner(object):
       # Also, add graph to summary here because the updater/optimizer might not have been created before.
       if writer:
         writer.add_graph(sess.graph)
+      timings.start_phase("data_wait")
       while self.data_provider.have_more_data(session=sess):
+        timings.start_phase("feed")
         feed_dict = self.data_provider.get_feed_dict()
         if isinstance(self.engine.network.train_flag, tf.Tensor):
           feed_dict[self.engine.network.train_flag] = self._should_train
@@ -346,6 +580,7 @@ class Runner(object):
           Debug.debug_shell(user_ns=locals(), user_global_ns=globals(), exit_afterwards=False)
 
         # Now do one calculation step. Optionally with metadata.
+        timings.start_phase("compute")
         if self.store_metadata_mod_step and step % self.store_metadata_mod_step == 0:
           # Slow run that stores extra information for debugging.
           print('Storing metadata', file=log.v5)
@@ -357,6 +592,7 @@ class Runner(object):
             feed_dict=feed_dict,
             options=run_options,
             run_metadata=run_metadata)  # type: dict[str,numpy.ndarray|str]
+          timings.start_phase("summary")
           writer.add_summary(fetches_results["summary"], step + step_offset)
           writer.add_run_metadata(run_metadata, 'step_{:04d}'.format(step + step_offset))
           tl = timeline.Timeline(run_metadata.step_stats)
@@ -365,15 +601,28 @@ class Runner(object):
             f.write(tl.generate_chrome_trace_format(show_memory=True))
         else:
           fetches_results = sess.run(fetches_dict, feed_dict=feed_dict)  # type: dict[str,numpy.ndarray|str]
+          timings.start_phase("summary")
           if writer and "summary" in fetches_results:
             writer.add_summary(fetches_results["summary"], step + step_offset)
 
+        timings.start_phase("fetch")
         eval_info = self._collect_eval_info(fetches_results=fetches_results)
+        timings.start_phase("callback")
         self._maybe_handle_extra_fetches(fetches_results)
         duration = time.time() - start_time
+        timings.start_phase("log")
         self._print_process(report_prefix=report_prefix, step=step, step_duration=duration, eval_info=eval_info)
         step += 1
-
+        if self.data_parallel and step % self.data_parallel.sync_step == 0:
+          timings.start_phase("sync")
+          self.data_parallel.sync_params(session=sess, variables=self.engine.get_data_parallel_sync_vars())
+        timings.finish_step()
+        timings.start_phase("data_wait")
+
+      timings.discard_step()
+      if self.data_parallel:
+        self.data_parallel.finish_epoch_sync_params(
+          session=sess, variables=self.engine.get_data_parallel_sync_vars())
       self._print_finish_process()
 
       if not self.data_provider.have_reached_end():
@@ -384,6 +633,7 @@ class Runner(object):
         assert step + step_offset == final_global_train_step
 
       self._finalize(num_steps=step)
+      self._maybe_write_step_timings(logdir=logdir, report_prefix=report_prefix)
 
       if self.engine.config.bool("tf_log_memory_usage", False):
         print("Memory usage:", file=log.v1)
@@ -417,14 +667,16 @@ class Runner(object):
 
 
 class Engine(object):
-  def __init__(self, config=None):
+  def __init__(self, config=None, data_parallel=None):
     """
     :param Config.Config|None config:
+    :param TFDataParallel.DataParallel|None data_parallel: see rnn.initDataParallel()
     """
     if config is None:
       from Config import get_global_config
       config = get_global_config()
     self.config = config
+    self.data_parallel = data_parallel
     self.devices_config = self._get_devices_config()
     self._check_devices()
     self.tf_session = None  # type: tf.Session
@@ -436,11 +688,18 @@ class Engine(object):
     self.train_data = None  # type: Dataset
     self.start_epoch = None
     self.use_dynamic_train_flag = False
+    self.tf_data_input = None  # type: TFDataPipeline.TFDataInput|None  # see _init_network()
     self.use_search_flag = config.value("task", None) == "search"
     self.use_eval_flag = config.value("task", None) != "forward"
     self._const_cache = {}  # type: dict[str,tf.Tensor]
+    self._background_params_saver = None  # type: BackgroundParamsSaver|None  # see save_model()
+    if config.bool("save_model_async", False):
+      self._background_params_saver = BackgroundParamsSaver()
 
   def finalize(self):
+    self.wait_for_model_save()
+    if self.data_parallel:
+      self.data_parallel.finalize()
     self._close_tf_session()
     tf.reset_default_graph()
     self.network = None
@@ -552,10 +811,23 @@ class Engine(object):
     """
     :param str filename: full filename for model
     """
+    if self.data_parallel and not self.data_parallel.is_master():
+      return  # All workers have the same params. Rank 0 will save them.
     if not filename:
       filename = self.get_epoch_model_filename()
     print("Save model under %s" % (filename,), file=log.v4)
-    self.network.save_params_to_file(filename, session=self.tf_session)
+    if self._background_params_saver:
+      self.network.save_params_to_file_in_background(
+        filename, session=self.tf_session, background_saver=self._background_params_saver)
+    else:
+      self.network.save_params_to_file(filename, session=self.tf_session)
+
+  def wait_for_model_save(self):
+    """
+    With save_model_async, waits until the model is completely written.
+    """
+    if self._background_params_saver:
+      self._background_params_saver.wait()
 
   def init_train_from_config(self, config=None, train_data=None, dev_data=None, eval_data=None):
     """
@@ -568,6 +840,8 @@ class Engine(object):
       config = self.config
     self.use_dynamic_train_flag = True
     self.train_data = train_data
+    if self.data_parallel and train_data:
+      self.data_parallel.partition_dataset(train_data)
     self.dev_data = dev_data
     self.eval_data = eval_data
     self.start_epoch, self.start_batch = self.get_train_start_epoch_batch(config)
@@ -577,6 +851,8 @@ class Engine(object):
     self.save_model_epoch_interval = config.int('save_interval', 1)
     self.save_epoch1_initial_model = config.bool('save_epoch1_initial_model', False)
     self.learning_rate_control = loadLearningRateControlFromConfig(config)
+    if self.data_parallel and not self.data_parallel.is_master():
+      self.learning_rate_control.filename = None  # Rank 0 will save it. We get the learning rate from rank 0.
     self.learning_rate = self.learning_rate_control.defaultLearningRate
     self.initial_learning_rate = self.learning_rate
     self.pretrain_learning_rate = config.float('pretrain_learning_rate', self.learning_rate)
@@ -622,7 +898,9 @@ class Engine(object):
     else:
       net_dict = LayerNetwork.json_from_config(config)
 
-    self._init_network(net_desc=net_dict, epoch=self.epoch)
+    # When we load the model, we don't need to initialize the params before, which can take long for big models.
+    # If the checkpoint does not have all params, load_params_from_file() fails.
+    self._init_network(net_desc=net_dict, epoch=self.epoch, initialize_params=not model_epoch_filename)
 
     if model_epoch_filename:
       print("loading weights from", model_epoch_filename, file=log.v2)
@@ -632,7 +910,12 @@ class Engine(object):
         print("Exiting now because model cannot be loaded.", file=log.v1)
         sys.exit(1)
 
-  def _init_network(self, net_desc, epoch=None):
+  def _init_network(self, net_desc, epoch=None, initialize_params=True):
+    """
+    :param dict[str,dict[str]] net_desc:
+    :param int|None epoch:
+    :param bool initialize_params: can be disabled if we load all params afterwards anyway
+    """
     if epoch is None:
       epoch = self.epoch
     self._close_tf_session()
@@ -645,19 +928,28 @@ class Engine(object):
       train_flag = get_global_train_flag_placeholder()
     else:
       train_flag = False
-    if False:  # TODO ...
-      extern_data = ExternData()
+    extern_data = ExternData()
+    if self.config.bool("tf_data_pipeline", False):
+      from TFDataPipeline import TFDataInput
+      extern_data.init_from_config(self.config, auto_create_placeholders=False)
+      self.tf_data_input = TFDataInput(
+        extern_data=extern_data,
+        capacity=self.config.int("tf_data_pipeline_capacity", 10),
+        prefetch_device="/gpu:0" if self.is_requesting_for_gpu() else None)
+    else:
       extern_data.init_from_config(self.config)
-      # TODO...
+      self.tf_data_input = None
     network = TFNetwork(
       name="root",
       config=self.config,
+      extern_data=extern_data,
       rnd_seed=epoch,
       train_flag=train_flag,
       eval_flag=self.use_eval_flag,
       search_flag=self.use_search_flag)
     network.construct_from_dict(net_desc)
-    network.initialize_params(session=self.tf_session)
+    if initialize_params:
+      network.initialize_params(session=self.tf_session)
     network.layers_desc = net_desc
     self.network = network
     if self.train_data:
@@ -667,12 +959,20 @@ class Engine(object):
     network.print_network_info()
 
   def maybe_init_new_network(self, net_desc):
+    """
+    If the network description is the same, we keep the graph, the session and the optimizer state.
+    Otherwise we build a new graph and copy over the params and the optimizer state of the existing layers.
+
+    :param dict[str,dict[str]] net_desc:
+    """
     if self.network.layers_desc == net_desc:
+      print("keeping the network because the network description is unchanged", file=log.v4)
       return
     from Util import dict_diff_str
     print("reinit because network description differs. Diff:",
           dict_diff_str(self.network.layers_desc, net_desc), file=log.v3)
     old_network_params = self.network.get_params_serialized(self.tf_session)
+    old_optimizer_var_values = self.updater.get_optimizer_var_values_dict() if self.updater else {}
     self._init_network(net_desc)
     # In pretraining it can happen, that the dimension of output parameters of the previous epoch is
     # not equal to the dimension in the current epoch, due to difference in layer size.
@@ -693,11 +993,19 @@ class Engine(object):
         if not keep_layer:
           print("suspend copying of output layer: " + l.name, file=log.v2)
           del old_network_params.values_dict[l.name]
+          for param in l.params.values():
+            for name in list(old_optimizer_var_values.keys()):
+              # The slots are named after the param, e.g. "optimize/output/W/Adam" (see Updater.create_optim_op).
+              if name.startswith("optimize/%s/" % param.op.name):
+                del old_optimizer_var_values[name]
     # Otherwise it's initialized randomly which is fine.
     # This copy will copy the old params over and leave the rest randomly initialized.
     # This also works if the old network has just the same topology,
     # e.g. if it is the initial model from self.init_network_from_config().
     self.network.set_params_by_serialized(old_network_params, session=self.tf_session)
+    if self.updater:
+      # E.g. the Adam moments. The optimizer vars are created later, and then we copy these over.
+      self.updater.set_optimizer_var_values_dict(old_optimizer_var_values)
 
   def train(self):
     print("start training at epoch %i and step %i" % (self.start_epoch, self.start_batch), file=log.v3)
@@ -754,6 +1062,7 @@ class Engine(object):
       # Save last model, in case it was not saved yet (depends on save_model_epoch_interval).
       if self.model_filename:
         self.save_model(self.get_epoch_model_filename())
+        self.wait_for_model_save()
 
       if self.epoch != self.final_epoch:
         print("Stopped after epoch %i and not %i as planned." % (self.epoch, self.final_epoch), file=log.v3)
@@ -783,6 +1092,22 @@ class Engine(object):
 
     self._maybe_use_better_last_model()
 
+    if self.data_parallel:
+      # Only rank 0 has the dev scores. All workers must start the epoch with the same learning rate and params.
+      self.learning_rate = self.data_parallel.broadcast(self.learning_rate)
+      self.data_parallel.broadcast_params(session=self.tf_session, variables=self.get_data_parallel_sync_vars())
+
+  def get_data_parallel_sync_vars(self):
+    """
+    :return: the vars which we average over all workers, see :mod:`TFDataParallel`.
+      these are the model params, and also the optimizer vars (e.g. the Adam moments), if there are any yet
+    :rtype: list[tf.Variable]
+    """
+    variables = self.network.get_params_list()
+    if self.updater:
+      variables += [v for v in self.updater.optimizer_vars if v not in variables]
+    return variables
+
   def _maybe_use_better_last_model(self):
     if not self.config.is_true("use_last_best_model"):
       return
@@ -836,11 +1161,13 @@ class Engine(object):
     if not trainer.finalized:
       if trainer.device_crash_batch is not None:  # Otherwise we got an unexpected exception - a bug in our code.
         self.save_model(self.get_epoch_model_filename() + ".crash_%i" % trainer.device_crash_batch)
+      self.wait_for_model_save()
       print("Trainer not finalized, quitting.", file=log.v1)
       sys.exit(1)
 
     if any(numpy.isinf(list(trainer.score.values()))) or any(numpy.isnan(list(trainer.score.values()))):
       self.save_model(self.get_epoch_model_filename() + ".broken")
+      self.wait_for_model_save()
       print("Model seems broken, got inf or nan final score: %s" % trainer.score, file=log.v1)
       sys.exit(1)
 
@@ -861,6 +1188,9 @@ class Engine(object):
                      for key in sorted(score.keys())])
 
   def eval_model(self):
+    if self.data_parallel and not self.data_parallel.is_master():
+      print("(evaluation is done by data parallel rank 0)", file=log.v1)
+      return
     # It's constructed lazily and it will set used_data_keys, so make sure that we have it now.
     self.network.get_all_errors()
     eval_dump_str = []
@@ -0,0 +1,246 @@
+"""
+Frozen, self-contained inference bundle for the TF backend.
+
+:func:`export_network_inference_bundle` writes a bundle directory with:
+
+  * ``graph.pb``: the frozen graph, i.e. all variables converted to constants,
+    with the train flag fixed to False, and then constant-folded (see :func:`_optimize_graph_def`).
+  * ``ops/*.so``: the native op libraries (see :class:`TFUtil.OpCodeCompiler`) which the graph uses,
+    i.e. they are already compiled.
+  * ``bundle.json``: the description of the inputs and outputs (like :class:`TFUtil.Data`).
+  * ``TFInferenceBundle.py``: a copy of this file, which contains the loader :class:`InferenceBundle`.
+
+This file only depends on TF (and numpy) on module level,
+thus for the inference, you don't need the RETURNN source nor the config, only the bundle directory::
+
+  sys.path.insert(0, bundle_dir)
+  from TFInferenceBundle import InferenceBundle
+  bundle = InferenceBundle(bundle_dir)
+  out = bundle.run({"data": features})  # features: (batch,time,feature)
+
+The bundle is bound to the TF version it was created with, because of the native op libraries.
+See also ``tools/export-tf-inference-bundle.py``.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import numpy
+import tensorflow as tf
+
+
+BundleInfoFilename = "bundle.json"
+GraphFilename = "graph.pb"
+OpsDirName = "ops"
+
+
+class InferenceBundle(object):
+  """
+  Loads a bundle which was written by :func:`export_inference_bundle`, and runs it.
+  """
+
+  def __init__(self, bundle_dir, session_config=None):
+    """
+    :param str bundle_dir:
+    :param tf.ConfigProto|None session_config:
+    """
+    self.bundle_dir = bundle_dir
+    with open(os.path.join(bundle_dir, BundleInfoFilename)) as f:
+      self.info = json.load(f)
+    if self.info["op_libraries"] and self.info["tf_version"] != tf.__version__:
+      print("InferenceBundle: warning: created with TF %s, but we have TF %s. The op libraries might not load." % (
+        self.info["tf_version"], tf.__version__), file=sys.stderr)
+    for filename in self.info["op_libraries"]:
+      tf.load_op_library(os.path.join(bundle_dir, filename))
+    graph_def = tf.GraphDef()
+    with open(os.path.join(bundle_dir, GraphFilename), "rb") as f:
+      graph_def.ParseFromString(f.read())
+    self.graph = tf.Graph()
+    with self.graph.as_default():
+      tf.import_graph_def(graph_def, name="")
+    self.session = tf.Session(graph=self.graph, config=session_config)
+    self.inputs = self.info["inputs"]  # type: dict[str,dict[str]]
+    self.outputs = self.info["outputs"]  # type: dict[str,dict[str]]
+
+  def close(self):
+    self.session.close()
+
+  def run(self, data, seq_lens=None):
+    """
+    :param dict[str,numpy.ndarray] data: input key -> value, batch-major, i.e. like the placeholders.
+      all inputs of the bundle must be given.
+    :param dict[str,dict[int,numpy.ndarray]]|None seq_lens: input key -> axis (with batch-dim) -> seq lens.
+      if not given, we assume that all seqs have the full length, i.e. no padding.
+    :return: output name -> value, and "<output name>:shape(<axis>)" -> seq lens, like in tools/dump-forward.py
+    :rtype: dict[str,numpy.ndarray]
+    """
+    assert sorted(data.keys()) == sorted(self.inputs.keys()), "need exactly the inputs %r" % sorted(self.inputs)
+    feed_dict = {}
+    for key, info in self.inputs.items():
+      value = numpy.asarray(data[key], dtype=info["dtype"])
+      if info["placeholder"]:
+        feed_dict[info["placeholder"]] = value
+      for axis, size_name in info["size_placeholder"].items():
+        axis = int(axis)
+        if seq_lens and axis in seq_lens.get(key, {}):
+          feed_dict[size_name] = seq_lens[key][axis]
+        else:
+          feed_dict[size_name] = numpy.full(
+            (value.shape[info["batch_dim_axis"]],), value.shape[axis], dtype="int32")
+    fetches = {}
+    for name, info in self.outputs.items():
+      fetches[name] = info["placeholder"]
+      for axis, size_name in info["size_placeholder"].items():
+        fetches["%s:shape(%s)" % (name, axis)] = size_name
+    return self.session.run(fetches, feed_dict=feed_dict)
+
+
+def _get_data_info(data, node_names=None):
+  """
+  :param TFUtil.Data data:
+  :param set[str]|None node_names: if given, only the placeholders which are in the graph
+  :return: what we store in the bundle info. the size placeholders are by axis counted with batch-dim
+  :rtype: dict[str]
+  """
+  info = data.get_kwargs()
+  info["shape"] = list(info["shape"])
+  info["placeholder"] = None  # not needed, e.g. only the seq lens are used
+  if node_names is None or data.placeholder.op.name in node_names:
+    info["placeholder"] = data.placeholder.name
+  info["size_placeholder"] = {
+    str(data.get_batch_axis(axis)): size.name for (axis, size) in sorted(data.size_placeholder.items())
+    if node_names is None or size.op.name in node_names}
+  return info
+
+
+def _replace_by_const(graph_def, op_name, value):
+  """
+  :param tf.GraphDef graph_def: modified inplace
+  :param str op_name: e.g. a placeholder, or an identity of it
+  :param bool|int|float value:
+  """
+  for node in graph_def.node:
+    if node.name == op_name:
+      dtype = node.attr["dtype" if node.op == "Placeholder" else "T"].type
+      node.op = "Const"
+      del node.input[:]
+      node.attr.clear()
+      node.attr["dtype"].type = dtype
+      node.attr["value"].tensor.CopyFrom(tf.make_tensor_proto(value, dtype=dtype))
+      return
+  # Not found is fine, e.g. the train flag was not used by any of the outputs.
+
+
+def _optimize_graph_def(graph_def, fetch_op_names):
+  """
+  Constant folding, including the removal of dead cond branches (e.g. for the fixed train flag),
+  and some arithmetic simplifications, via Grappler.
+  The op libraries which the graph uses must be loaded.
+
+  :param tf.GraphDef graph_def: frozen graph
+  :param list[str] fetch_op_names: these are kept as-is
+  :return: optimized graph, only with what is needed for the fetches
+  :rtype: tf.GraphDef
+  """
+  from tensorflow.python.framework import graph_util
+  try:
+    from tensorflow.python.grappler import tf_optimizer
+  except ImportError:  # older TF
+    from Log import log
+    print("Grappler not available, no graph optimization.", file=log.v3)
+    return graph_def
+  graph = tf.Graph()
+  with graph.as_default():
+    tf.import_graph_def(graph_def, name="")
+    for name in fetch_op_names:
+      graph.add_to_collection("train_op", graph.get_operation_by_name(name))  # Grappler keeps these
+    meta_graph = tf.train.export_meta_graph(graph=graph)
+  config = tf.ConfigProto()
+  config.graph_options.rewrite_options.min_graph_nodes = -1  # also optimize small graphs
+  config.graph_options.rewrite_options.optimizers.extend(
+    ["constfold", "loop", "dependency", "arithmetic", "constfold"])
+  graph_def = tf_optimizer.OptimizeGraph(config, meta_graph)
+  return graph_util.extract_sub_graph(graph_def, fetch_op_names)
+
+
+def export_inference_bundle(bundle_dir, session, inputs, outputs, const_placeholders=None):
+  """
+  :param str bundle_dir: will be created
+  :param tf.Session session: with the variables initialized, e.g. the params loaded
+  :param dict[str,TFUtil.Data] inputs: with plain placeholders. the ones which the outputs don't need are skipped
+  :param dict[str,TFUtil.Data] outputs:
+  :param dict[tf.Tensor,bool|int|float]|None const_placeholders: placeholders (or identities of them)
+    which we replace by constants, e.g. the train flag
+  """
+  import shutil
+  from tensorflow.python.framework import graph_util
+  from TFUtil import OpCodeCompiler
+  from Log import log
+  output_tensors = []
+  for data in outputs.values():
+    output_tensors += [data.placeholder] + list(data.size_placeholder.values())
+  output_op_names = sorted(set([x.op.name for x in output_tensors]))
+  # This also strips everything which is not needed for the outputs, e.g. the losses.
+  graph_def = graph_util.convert_variables_to_constants(
+    session, session.graph.as_graph_def(), output_op_names)
+  for x, value in (const_placeholders or {}).items():
+    _replace_by_const(graph_def, x.op.name, value)
+  graph_def = _optimize_graph_def(graph_def, fetch_op_names=output_op_names)
+  node_names = set([node.name for node in graph_def.node])
+  inputs = {
+    key: data for (key, data) in inputs.items()
+    if set([data.placeholder.op.name] + [size.op.name for size in data.size_placeholder.values()]) & node_names}
+  for data in inputs.values():
+    assert data.placeholder.op.type == "Placeholder", "input %r must be a plain placeholder" % data
+    for size in data.size_placeholder.values():
+      assert size.op.type == "Placeholder", "input %r seq lens must be plain placeholders" % data
+  if not os.path.exists(bundle_dir):
+    os.makedirs(bundle_dir)
+  with open(os.path.join(bundle_dir, GraphFilename), "wb") as f:
+    f.write(graph_def.SerializeToString())
+  used_op_types = set([node.op for node in graph_def.node])
+  for func in graph_def.library.function:
+    used_op_types.update([node.op for node in func.node_def])
+  op_libraries = []
+  for so_filename, op_names in sorted(OpCodeCompiler.loaded_tf_modules.items()):
+    if not used_op_types.intersection(op_names):
+      continue
+    if not os.path.exists(os.path.join(bundle_dir, OpsDirName)):
+      os.makedirs(os.path.join(bundle_dir, OpsDirName))
+    # The .so files of the OpCodeCompiler are all named the same, but in different dirs by hash.
+    lib_filename = "%s/%s-%s.so" % (
+      OpsDirName, ",".join(sorted(op_names)), os.path.basename(os.path.dirname(so_filename)))
+    shutil.copyfile(so_filename, os.path.join(bundle_dir, lib_filename))
+    op_libraries.append(lib_filename)
+  info = {
+    "inputs": {key: _get_data_info(data, node_names=node_names) for (key, data) in inputs.items()},
+    "outputs": {name: _get_data_info(data) for (name, data) in outputs.items()},
+    "op_libraries": op_libraries,
+    "tf_version": tf.__version__}
+  with open(os.path.join(bundle_dir, BundleInfoFilename), "w") as f:
+    json.dump(info, f, indent=2, sort_keys=True)
+  shutil.copyfile(
+    os.path.splitext(os.path.abspath(__file__))[0] + ".py", os.path.join(bundle_dir, "TFInferenceBundle.py"))
+  print("Exported inference bundle to %r: %i nodes, %i op libraries." % (
+    bundle_dir, len(graph_def.node), len(op_libraries)), file=log.v2)
+
+
+def export_network_inference_bundle(bundle_dir, network, session, output_layer_names=None):
+  """
+  :param str bundle_dir: will be created
+  :param TFNetwork.TFNetwork network:
+  :param tf.Session session: with the params loaded
+  :param list[str]|None output_layer_names: by default the default output layer
+  """
+  if not output_layer_names:
+    output_layer_names = [network.get_default_output_layer_name()]
+    assert output_layer_names[0], "no default output layer, specify the output layers"
+  outputs = {name: network.layers[name].output for name in output_layer_names}
+  inputs = {key: data for (key, data) in network.extern_data.data.items() if data.available_for_inference}
+  const_placeholders = {}
+  if isinstance(network.train_flag, tf.Tensor):
+    const_placeholders[network.train_flag] = False
+  export_inference_bundle(
+    bundle_dir=bundle_dir, session=session, inputs=inputs, outputs=outputs, const_placeholders=const_placeholders)
@@ -6,7 +6,7 @@ import sys
 import numpy
 from Log import log
 from TFNetworkLayer import Data, LayerBase, get_layer_class
-from TFUtil import reuse_name_scope, VariableAssigner
+from TFUtil import reuse_name_scope, VariableAssigner, ParallelRestoreSaverBuilder
 
 
 class ExternData(object):
@@ -28,9 +28,10 @@ class ExternData(object):
   def __repr__(self):
     return "<ExternData data=%r>" % self.data
 
-  def init_from_config(self, config):
+  def init_from_config(self, config, auto_create_placeholders=True):
     """
     :param Config.Config config:
+    :param bool auto_create_placeholders: otherwise, set them afterwards, e.g. via :class:`TFDataPipeline.TFDataInput`
     """
     from NetworkDescription import LayerNetworkDescription
     data_dims = LayerNetworkDescription.tf_extern_data_types_from_config(config)
@@ -39,7 +40,7 @@ class ExternData(object):
       # In TensorFlow, the default is (batch,time,feature).
       # This is also what we use here, i.e.:
       # batch_dim_axis=0, time_dim_axis=1. See TFEngine.DataProvider._get_next_batch().
-      self.data[key] = Data(name=key, auto_create_placeholders=True, **init_args)
+      self.data[key] = Data(name=key, auto_create_placeholders=auto_create_placeholders, **init_args)
     self.default_target = config.value('target', 'classes')
 
   def init_from_dataset(self, dataset):
@@ -642,6 +643,29 @@ class TFNetwork(object):
     self._assigner_cache[var] = assigner
     return assigner
 
+  def set_var_values(self, var_values, session):
+    """
+    Assigns all the values in a single session.run().
+    Like :class:`VariableAssigner`, this uses the variable initializers, thus it does not add new ops to the graph.
+
+    :param list[(tf.Variable,numpy.ndarray|int|float)] var_values:
+    :param tf.Session session:
+    """
+    feed_dict = {}
+    assign_ops = []
+    for var, value in var_values:
+      assert isinstance(var, tf.Variable)
+      shape = var.get_shape()
+      assert isinstance(shape, tf.TensorShape)
+      assert shape.is_fully_defined()
+      assert tuple(shape.as_list()) == numpy.shape(value), "%s: shape mismatch, value shape %r" % (
+        var, numpy.shape(value))
+      assigner = self.get_var_assigner(var)
+      assign_ops.append(assigner.assign_op)
+      feed_dict[assigner.assign_op.inputs[1]] = value
+    if assign_ops:
+      session.run(assign_ops, feed_dict=feed_dict)
+
   def get_param_values_dict(self, session):
     """
     :param tf.Session session:
@@ -649,11 +673,8 @@ class TFNetwork(object):
     :rtype: dict[str,dict[str,numpy.ndarray]]
     Note that this excludes auxiliary params.
     """
-    l = {}  # type: dict[str,dict[str,numpy.ndarray]]
-    for layer_name, layer in self.layers.items():
-      assert isinstance(layer, LayerBase)
-      l[layer_name] = layer.get_param_values_dict(session)
-    return l
+    # All at once, via a single session.run().
+    return session.run(self.get_params_nested_dict())
 
   def set_param_values_by_dict(self, values_dict, session):
     """
@@ -661,8 +682,17 @@ class TFNetwork(object):
     :param tf.Session session:
     Note that this excludes auxiliary params.
     """
-    for layer_name, layer_values_dict in values_dict.items():
-      self.layers[layer_name].set_param_values_by_dict(values_dict=layer_values_dict, session=session)
+    self.set_var_values(self._get_param_var_values(values_dict), session=session)
+
+  def _get_param_var_values(self, values_dict):
+    """
+    :param dict[str,dict[str,numpy.ndarray]] values_dict: layer name -> param name -> value
+    :rtype: list[(tf.Variable,numpy.ndarray)]
+    """
+    return [
+      (self.layers[layer_name].params[param_name], values)
+      for (layer_name, layer_values_dict) in sorted(values_dict.items())
+      for (param_name, values) in sorted(layer_values_dict.items())]
 
   def get_auxiliary_params(self):
     return [self.global_train_step]
@@ -681,8 +711,9 @@ class TFNetwork(object):
     :param TFNetworkParamsSerialized serialized:
     :param tf.Session session:
     """
-    self.set_param_values_by_dict(serialized.values_dict, session=session)
-    self.set_global_train_step(serialized.global_train_step, session=session)
+    self.set_var_values(
+      self._get_param_var_values(serialized.values_dict) + [(self.global_train_step, serialized.global_train_step)],
+      session=session)
 
   def set_global_train_step(self, step, session):
     """
@@ -710,7 +741,8 @@ class TFNetwork(object):
     # Saver for storing checkpoints of the model.
     with tf.name_scope("saver"):
       self.saver = tf.train.Saver(
-        var_list=self.get_saveable_params_list(), max_to_keep=2 ** 31 - 1)
+        var_list=self.get_saveable_params_list(), max_to_keep=2 ** 31 - 1,
+        builder=ParallelRestoreSaverBuilder())
 
   def save_params_to_file(self, filename, session):
     """
@@ -721,21 +753,33 @@ class TFNetwork(object):
     """
     if not self.saver:
       self._create_saver()
-    # We add some extra logic to try again for DiskQuota and other errors.
-    # This could save us multiple hours of computation.
-    try_again_wait_time = 10
-    while True:
-      try:
-        self.saver.save(sess=session, save_path=filename)
-        break
-      except IOError as e:
-        import errno, time
-        if e.errno in [errno.EBUSY, errno.EDQUOT, errno.EIO, errno.ENOSPC]:
-          print("Exception while saving:", e, file=log.v3)
-          print("Trying again in %s secs." % try_again_wait_time, file=log.v3)
-          time.sleep(try_again_wait_time)
-          continue
-        raise
+    _call_with_retry_on_io_error(lambda: self.saver.save(sess=session, save_path=filename))
+
+  def save_params_to_file_in_background(self, filename, session, background_saver):
+    """
+    Like :func:`save_params_to_file`, but we only take a snapshot of the params in host memory here,
+    and the checkpoint is written by the background saver thread.
+    If there is still a save in progress, we wait for it first.
+    This will fall back to :func:`save_params_to_file` if some params are not plain variables
+    (e.g. the CudnnLSTM params), as we cannot snapshot them.
+
+    :param str filename:
+    :param tf.Session session:
+    :param BackgroundParamsSaver background_saver:
+    """
+    if not self.saver:
+      self._create_saver()
+    params = self.get_saveable_params_list()
+    if not all([isinstance(param, tf.Variable) for param in params]):
+      print("Cannot save params in background, some params are not plain variables.", file=log.v3)
+      background_saver.wait()
+      self.save_params_to_file(filename=filename, session=session)
+      return
+    values = session.run(params)
+    background_saver.save(
+      filename=filename,
+      values_dict={param.op.name: value for (param, value) in zip(params, values)},
+      meta_graph_def=self.saver.export_meta_graph())
 
   def load_params_from_file(self, filename, session):
     """
@@ -823,6 +867,7 @@ class TFNetwork(object):
         print("We found these corresponding variables in the checkpoint:", var_name_map, file=log.v2)
         print("Loading now...", file=log.v3)
         # Similar: from tensorflow.contrib.framework.python.ops import assign_from_checkpoint
+        var_values = []
         for v in self.get_saveable_params_list():
           assert isinstance(v, tf.Variable), "not yet implemented otherwise..."
           v_name = v.name[:-2]  # current name
@@ -830,8 +875,8 @@ class TFNetwork(object):
             value = reader.get_tensor(v_name)
           else:
             value = var_name_map[v_name]()
-          assigner = self.get_var_assigner(v)
-          assigner.assign(value=value, session=session)
+          var_values.append((v, value))
+        self.set_var_values(var_values, session=session)
         print("Successfully loaded all variables. Any new save will use the updated variable names.", file=log.v3)
 
       else:
@@ -969,6 +1014,129 @@ class TFNetwork(object):
     raise Exception("We cannot tell the batch dim.")
 
 
+def _call_with_retry_on_io_error(func):
+  """
+  We add some extra logic to try again for DiskQuota and other errors.
+  This could save us multiple hours of computation.
+
+  :param ()->None func: e.g. the save function
+  """
+  try_again_wait_time = 10
+  while True:
+    try:
+      func()
+      break
+    except IOError as e:
+      import errno, time
+      if e.errno in [errno.EBUSY, errno.EDQUOT, errno.EIO, errno.ENOSPC]:
+        print("Exception while saving:", e, file=log.v3)
+        print("Trying again in %s secs." % try_again_wait_time, file=log.v3)
+        time.sleep(try_again_wait_time)
+        continue
+      raise
+
+
+class BackgroundParamsSaver(object):
+  """
+  Writes checkpoints from a snapshot of the param values in a background thread,
+  such that the training does not need to wait for the (maybe slow) file system.
+  See :func:`TFNetwork.save_params_to_file_in_background`.
+  There is at most one save in progress.
+  We write the checkpoint files under a temporary name, and rename them when they are complete,
+  the ".index" file as the last one, such that a partially written checkpoint is never used.
+  Call :func:`wait` before you exit.
+  """
+
+  TmpPostfix = ".tmp-save"
+
+  def __init__(self):
+    self._thread = None  # type: threading.Thread|None
+    self._exception = None  # type: Exception|None
+
+  def is_saving(self):
+    """
+    :return: whether there is a save in progress
+    :rtype: bool
+    """
+    return bool(self._thread and self._thread.is_alive())
+
+  def wait(self):
+    """
+    Waits until the current save is finished (if there is one),
+    and reraises the exception if that save failed.
+    """
+    if self._thread:
+      if self._thread.is_alive():
+        print("Waiting for background save of the model ...", file=log.v4)
+      self._thread.join()
+      self._thread = None
+    if self._exception:
+      exc, self._exception = self._exception, None
+      raise exc
+
+  def save(self, filename, values_dict, meta_graph_def=None):
+    """
+    :param str filename: checkpoint prefix, like for :func:`tf.train.Saver.save`
+    :param dict[str,numpy.ndarray] values_dict: checkpoint key (variable name) -> value
+    :param tensorflow.core.protobuf.meta_graph_pb2.MetaGraphDef|None meta_graph_def: written to filename + ".meta"
+    """
+    import threading
+    self.wait()
+    self._thread = threading.Thread(
+      target=self._thread_main, name="BackgroundParamsSaver %s" % filename,
+      kwargs=dict(filename=filename, values_dict=values_dict, meta_graph_def=meta_graph_def))
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _thread_main(self, filename, values_dict, meta_graph_def):
+    """
+    :param str filename:
+    :param dict[str,numpy.ndarray] values_dict:
+    :param tensorflow.core.protobuf.meta_graph_pb2.MetaGraphDef|None meta_graph_def:
+    """
+    try:
+      self.write_checkpoint(filename=filename, values_dict=values_dict, meta_graph_def=meta_graph_def)
+    except Exception as exc:
+      print("Exception while saving %s in background: %s" % (filename, exc), file=log.v1)
+      self._exception = exc
+
+  @classmethod
+  def write_checkpoint(cls, filename, values_dict, meta_graph_def=None):
+    """
+    Writes the checkpoint in the same format as :func:`tf.train.Saver.save`.
+
+    :param str filename:
+    :param dict[str,numpy.ndarray] values_dict:
+    :param tensorflow.core.protobuf.meta_graph_pb2.MetaGraphDef|None meta_graph_def:
+    """
+    import os
+    from tensorflow.python.ops import io_ops
+    tmp_filename = filename + cls.TmpPostfix
+    names = sorted(values_dict.keys())
+    with tf.Graph().as_default() as graph:
+      placeholders = [
+        tf.placeholder(dtype=tf.as_dtype(values_dict[name].dtype), shape=values_dict[name].shape)
+        for name in names]
+      save_op = io_ops.save_v2(
+        prefix=tmp_filename, tensor_names=names, shape_and_slices=[""] * len(names), tensors=placeholders)
+    with tf.Session(graph=graph, config=tf.ConfigProto(device_count={"GPU": 0})) as session:
+      _call_with_retry_on_io_error(lambda: session.run(
+        save_op, feed_dict={placeholder: values_dict[name] for (name, placeholder) in zip(names, placeholders)}))
+    if meta_graph_def is not None:
+      def write_meta_graph():
+        with open(tmp_filename + ".meta", "wb") as f:
+          f.write(meta_graph_def.SerializeToString())
+      _call_with_retry_on_io_error(write_meta_graph)
+    dirname = os.path.dirname(tmp_filename) or "."
+    basename = os.path.basename(tmp_filename)
+    postfixes = [fn[len(basename):] for fn in os.listdir(dirname) if fn.startswith(basename + ".")]
+    assert ".index" in postfixes, "%s: missing index file, got %r" % (tmp_filename, postfixes)
+    # The index file last, because that marks the checkpoint as existing (see Engine.get_existing_models).
+    replace = getattr(os, "replace", os.rename)  # Python 2 has no os.replace
+    for postfix in sorted(postfixes, key=lambda postfix: postfix == ".index"):
+      replace(tmp_filename + postfix, filename + postfix)
+
+
 class TFNetworkParamsSerialized(object):
   """
   Holds all the params as numpy arrays, including auxiliary params.
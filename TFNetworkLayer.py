@@ -427,14 +427,8 @@ class LayerBase(object):
     :param dict[str,numpy.ndarray] values_dict:
     :param tf.Session session:
     """
-    for param_name, values in values_dict.items():
-      param = self.params[param_name]
-      assert isinstance(param, tf.Variable)
-      shape = param.get_shape()
-      assert isinstance(shape, tf.TensorShape)
-      assert shape.is_fully_defined()
-      assert tuple(shape.as_list()) == values.shape
-      self.network.get_var_assigner(param).assign(values, session=session)
+    self.network.set_var_values(
+      [(self.params[param_name], values) for (param_name, values) in sorted(values_dict.items())], session=session)
 
   def get_param_values_dict(self, session):
     """
@@ -442,10 +436,7 @@ class LayerBase(object):
     :return: dict name -> values
     :rtype: dict[str,numpy.ndarray]
     """
-    d = {}
-    for param_name, param in self.params.items():
-      d[param_name] = param.eval(session)
-    return d
+    return session.run(self.params)
 
   def get_saveable_params_dict(self):
     """
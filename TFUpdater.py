@@ -97,6 +97,7 @@ class Updater(object):
     self.optim_meta_losses = None  # type: dict[str,tf.Tensor]
     self.optimizer_vars = []  # type: list[tf.Variable]
     self.optimizer_init_vars_op = None  # type: tf.Operation
+    self._optimizer_var_values_to_restore = {}  # type: dict[str,numpy.ndarray]  # see set_optimizer_var_values_dict
 
   def reset_optim_op(self):
     """
@@ -197,10 +198,6 @@ class Updater(object):
     # AccumulateN might not be deterministic but should be faster and should require less memory.
     # We might want to make this configurable.
     aggregation_method = tf.AggregationMethod.EXPERIMENTAL_ACCUMULATE_N
-    grad_noise = self.config.float("gradient_noise", 0.0)
-    grad_clip = self.config.float("gradient_clip", 0.0)
-    grad_clip_global_norm = self.config.float("gradient_clip_global_norm", 0.0)
-    # E.g. https://github.com/openai/baselines/blob/master/baselines/deepq/simple.py: grad_norm_clipping=10 -> tf.clip_by_norm
 
     # Extended self.optimizer.minimize() to optionally modify gradients.
     grads_and_vars = self.optimizer.compute_gradients(
@@ -219,6 +216,21 @@ class Updater(object):
     if self.config.bool("gradient_nan_inf_filter", False):
       from TFUtil import nan_to_num
       grads_and_vars = [(nan_to_num(grad, nan_num=0.0, inf_num=0.0), var) for (grad, var) in grads_and_vars]
+    accum_grad_multiple_step = self.config.int("accum_grad_multiple_step", 1)
+    if accum_grad_multiple_step > 1:
+      return self._accum_grads_and_maybe_apply(grads_and_vars, accum_grad_multiple_step)
+    return self._apply_grads(grads_and_vars)
+
+  def _apply_grads(self, grads_and_vars):
+    """
+    :param list[(tf.Tensor|tf.IndexedSlices|None,tf.Variable)] grads_and_vars:
+    :return: op with all variable updates combined, using the optimizer, after gradient noise and clipping
+    :rtype: tf.Operation
+    """
+    grad_noise = self.config.float("gradient_noise", 0.0)
+    grad_clip = self.config.float("gradient_clip", 0.0)
+    grad_clip_global_norm = self.config.float("gradient_clip_global_norm", 0.0)
+    # E.g. https://github.com/openai/baselines/blob/master/baselines/deepq/simple.py: grad_norm_clipping=10 -> tf.clip_by_norm
     if grad_noise:
       assert grad_noise > 0
       from TFUtil import add_scaled_noise_to_gradients
@@ -233,6 +245,56 @@ class Updater(object):
     apply_grads = self.optimizer.apply_gradients(grads_and_vars)
     return apply_grads
 
+  def _accum_grads_and_maybe_apply(self, grads_and_vars, accum_grad_multiple_step):
+    """
+    Gradient accumulation, i.e. we sum up the gradients of `accum_grad_multiple_step` mini-batches
+    in accumulator variables, and only every `accum_grad_multiple_step`-th step, we apply them
+    (incl. gradient noise and clipping) via the optimizer and reset the accumulators.
+    This behaves like a `accum_grad_multiple_step` times bigger mini-batch, without the memory cost.
+    We count the accumulated mini-batches in an own variable (not the global train step),
+    which is initialized and reset together with the accumulators (they are all optimizer vars).
+    Thus every update always uses exactly `accum_grad_multiple_step` mini-batches.
+    The accumulators are not stored in the checkpoint, so a partially accumulated gradient
+    is dropped when training is restarted (or when the updater vars are reset, see ``reset_updater_vars_mod_step``).
+    It is kept across epochs within the same process.
+
+    :param list[(tf.Tensor|tf.IndexedSlices|None,tf.Variable)] grads_and_vars:
+    :param int accum_grad_multiple_step:
+    :return: op which accumulates the gradients, and every N-th step also applies them
+    :rtype: tf.Operation
+    """
+    from TFUtil import get_base_name
+    grads_and_vars = [(grad, var) for (grad, var) in grads_and_vars if grad is not None]
+    with tf.name_scope("accum_grad"):
+      accum_grads_and_vars = []
+      accum_vars = []
+      for grad, var in grads_and_vars:
+        accum_var = tf.Variable(
+          initial_value=tf.zeros(var.get_shape(), dtype=var.dtype.base_dtype), trainable=False,
+          name="accum_grad_%s" % get_base_name(var))
+        if isinstance(grad, tf.IndexedSlices):
+          accum_grad = tf.scatter_add(accum_var, grad.indices, grad.values)
+        else:
+          accum_grad = tf.assign_add(accum_var, grad)
+        accum_grads_and_vars.append((accum_grad, var))
+        accum_vars.append(accum_var)
+      accum_count_var = tf.Variable(initial_value=0, trainable=False, dtype=tf.int32, name="accum_grad_count")
+      with tf.control_dependencies([grad for (grad, _) in accum_grads_and_vars]):
+        accum_count = tf.assign_add(accum_count_var, 1)
+
+      def apply_and_reset():
+        apply_grads = self._apply_grads(accum_grads_and_vars)
+        with tf.control_dependencies([apply_grads]):
+          return tf.group(
+            tf.assign(accum_count_var, 0),
+            *[tf.assign(v, tf.zeros_like(v)) for v in accum_vars], name="reset_accum_grads")
+
+      def accum_only():
+        return tf.no_op(name="accum_grads")
+
+      is_apply_step = tf.greater_equal(accum_count, accum_grad_multiple_step, name="is_apply_step")
+      return tf.cond(is_apply_step, apply_and_reset, accum_only).op
+
   def create_optim_op(self):
     assert self.loss is not None
     assert self.trainable_vars, "no variables to update/optimize"
@@ -242,9 +304,13 @@ class Updater(object):
     # The optimizer could add some, even some which are not so-called "slot-vars",
     # and we want to keep track about them.
     all_vars = tf.global_variables()  # type: list[tf.Variable]
+    # We get here again when the trainable vars changed (e.g. in pretraining). Keep the state of the existing vars.
+    prev_optimizer_vars = self.optimizer_vars
 
     if not self.optimizer:
       self.create_optimizer()
+    if self.config.int("accum_grad_multiple_step", 1) > 1:
+      print("Accumulate gradients over %i steps." % self.config.int("accum_grad_multiple_step", 1), file=log.v2)
 
     trainable_vars_for_gradients = list(self.trainable_vars)
     trainable_vars_custom_update = []  # type: list[tf.Variable]
@@ -301,9 +367,14 @@ class Updater(object):
     if other_new_vars:
       print("These additional variable were created by the optimizer: %s." % other_new_vars, file=log.v3)
       self.optimizer_vars += other_new_vars
+    # E.g. the Adam beta1_power, which the optimizer reuses, or the slots of vars which are not trainable anymore.
+    self.optimizer_vars += [v for v in prev_optimizer_vars if v not in self.optimizer_vars]
     with tf.name_scope("optimizer_init_vars"):
       self.optimizer_init_vars_op = tf.variables_initializer(self.optimizer_vars, name="init_optim_slot_vars")
-    self.init_optimizer_vars()
+      new_optimizer_vars = [v for v in self.optimizer_vars if v not in prev_optimizer_vars]
+      if new_optimizer_vars:
+        self.tf_session.run(tf.variables_initializer(new_optimizer_vars, name="init_new_optim_vars"))
+    self._maybe_restore_optimizer_var_values(new_optimizer_vars)
 
     if self.config.bool("debug_grad_summaries", False):
       from TFUtil import variable_summaries, get_base_name, reuse_name_scope_of_tensor
@@ -340,6 +411,42 @@ class Updater(object):
   def init_optimizer_vars(self):
     self.tf_session.run(self.optimizer_init_vars_op)
 
+  def get_optimizer_var_values_dict(self):
+    """
+    :return: var name -> value, for all optimizer vars, e.g. the Adam moments
+    :rtype: dict[str,numpy.ndarray]
+    """
+    if not self.optimizer_vars:
+      return {}
+    values = self.tf_session.run(self.optimizer_vars)
+    return {v.op.name: value for (v, value) in zip(self.optimizer_vars, values)}
+
+  def set_optimizer_var_values_dict(self, values):
+    """
+    E.g. from the :class:`Updater` of the old graph,
+    when the network was rebuilt (see :func:`TFEngine.Engine.maybe_init_new_network`).
+    The optimizer vars are created lazily, thus we assign the values in :func:`create_optim_op`.
+    Vars which don't exist then (e.g. of a removed layer) or which have a different shape keep their initial value.
+
+    :param dict[str,numpy.ndarray] values: var name -> value, via :func:`get_optimizer_var_values_dict`
+    """
+    self._optimizer_var_values_to_restore = values.copy()
+    if self.optimizer_vars:
+      self._maybe_restore_optimizer_var_values(self.optimizer_vars)
+
+  def _maybe_restore_optimizer_var_values(self, optimizer_vars):
+    """
+    :param list[tf.Variable] optimizer_vars: the ones which we might restore (and which are already initialized)
+    """
+    var_values = []
+    for v in optimizer_vars:
+      value = self._optimizer_var_values_to_restore.pop(v.op.name, None)
+      if value is not None and tuple(v.get_shape().as_list()) == value.shape:
+        var_values.append((v, value))
+    if var_values:
+      print("Restore %i optimizer vars." % len(var_values), file=log.v4)
+      self.network.set_var_values(var_values, session=self.tf_session)
+
 
 def add_check_numerics_ops(
   fetches=None, ignore_ops=None, use_check_numerics=True, debug_print_added_checks=True,
@@ -3,6 +3,7 @@ from __future__ import print_function
 
 import tensorflow as tf
 from tensorflow.python.client import device_lib
+from tensorflow.python.training.saver import BulkSaverBuilder
 import contextlib
 import os
 import sys
@@ -1995,6 +1996,60 @@ class VariableAssigner(object):
     session.run(self.assign_op, feed_dict={self.assign_op.inputs[1]: value})
 
 
+class ParallelRestoreSaverBuilder(BulkSaverBuilder):
+  """
+  Like :class:`BulkSaverBuilder`, i.e. the restore is a single grouped op,
+  but we split the tensors to read over multiple RestoreV2 ops,
+  which can then run in parallel (via the inter-op thread pool), instead of reading all tensors sequentially.
+  Use it like ``tf.train.Saver(..., builder=ParallelRestoreSaverBuilder())``.
+  """
+
+  def __init__(self, num_parallel_reads=8, **kwargs):
+    """
+    :param int num_parallel_reads: max number of RestoreV2 ops
+    """
+    super(ParallelRestoreSaverBuilder, self).__init__(**kwargs)
+    self.num_parallel_reads = num_parallel_reads
+
+  def bulk_restore(self, filename_tensor, saveables, preferred_shard, restore_sequentially):
+    """
+    :param tf.Tensor filename_tensor:
+    :param list[tensorflow.python.training.saver.BaseSaverBuilder.SaveableObject] saveables:
+    :param int preferred_shard:
+    :param bool restore_sequentially:
+    :return: the restored tensors, one for every spec of the saveables
+    :rtype: list[tf.Tensor]
+    """
+    from tensorflow.python.ops import io_ops
+    if restore_sequentially:
+      return super(ParallelRestoreSaverBuilder, self).bulk_restore(
+        filename_tensor=filename_tensor, saveables=saveables, preferred_shard=preferred_shard,
+        restore_sequentially=restore_sequentially)
+    specs = [spec for saveable in saveables for spec in saveable.specs]
+    # Balance the groups by the size of the tensors (greedy, biggest first).
+    groups = [[] for _ in range(min(self.num_parallel_reads, len(specs)))]  # type: list[list[int]]
+    group_sizes = [0] * len(groups)
+    spec_sizes = [
+      (spec.tensor.get_shape().num_elements() if isinstance(spec.tensor, tf.Tensor) else None) or 1
+      for spec in specs]
+    for spec_idx in sorted(range(len(specs)), key=lambda i: -spec_sizes[i]):
+      group_idx = group_sizes.index(min(group_sizes))
+      groups[group_idx].append(spec_idx)
+      group_sizes[group_idx] += spec_sizes[spec_idx]
+    tensors = [None] * len(specs)  # type: list[tf.Tensor|None]
+    # Load all tensors onto CPU 0, like BulkSaverBuilder.
+    with tf.device("cpu:0"):
+      for group in groups:
+        group_tensors = io_ops.restore_v2(
+          filename_tensor,
+          tensor_names=[specs[i].name for i in group],
+          shape_and_slices=[specs[i].slice_spec for i in group],
+          dtypes=[specs[i].dtype for i in group])
+        for spec_idx, tensor in zip(group, group_tensors):
+          tensors[spec_idx] = tensor
+    return tensors
+
+
 class CudaEnv(object):
   _instance = None
   verbose_find_cuda = False
@@ -2112,6 +2167,7 @@ class OpCodeCompiler(NativeCodeCompiler):
   """
 
   CacheDirName = "returnn_tf_cache/ops"
+  loaded_tf_modules = {}; " :type: dict[str,list[str]] "  # .so filename -> op names. see TFInferenceBundle
 
   def __init__(self, use_cuda_if_available=True, include_paths=(), **kwargs):
     self._cuda_env = use_cuda_if_available and CudaEnv.get_instance()
@@ -2149,6 +2205,7 @@ class OpCodeCompiler(NativeCodeCompiler):
       return self._tf_mod
     self._maybe_compile()
     self._tf_mod = tf.load_op_library(self._so_filename)
+    self.loaded_tf_modules[self._so_filename] = [op.name for op in self._tf_mod.OP_LIST.op]
     return self._tf_mod
 
 
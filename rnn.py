@@ -45,6 +45,7 @@ dev_data = None; """ :type: Dataset """
 eval_data = None; """ :type: Dataset """
 quit = False
 server = None; """:type: Server"""
+data_parallel = None; """ :type: TFDataParallel.DataParallel """
 
 
 def initConfig(configFilename=None, commandLineOptions=(), extra_updates=None):
@@ -111,6 +112,10 @@ def initConfig(configFilename=None, commandLineOptions=(), extra_updates=None):
 
 def initLog():
   logs = config.list('log', [])
+  data_parallel_rank = config.int("data_parallel_rank", 0)
+  if data_parallel_rank > 0:
+    # Launched worker process, see initDataParallel(). Do not write into the same log files.
+    logs = ["%s.rank%i" % (t, data_parallel_rank) if t != "stdout" and not t.startswith("|") else t for t in logs]
   log_verbosity = config.int_list('log_verbosity', [])
   log_format = config.list('log_format', [])
   log.initialize(logs=logs, verbosity=log_verbosity, formatter=log_format)
@@ -268,6 +273,35 @@ def printTaskProperties(devices=None):
       print("(update on device)" if device.update_specs['update_rule'] != 'none' else "(update on host)", file=log.v3)
 
 
+def initDataParallel(configFilename=None, commandLineOptions=()):
+  """
+  Sets up the synchronous data parallel training with multiple local processes, see :mod:`TFDataParallel`.
+  If this is the main process (rank 0), this will launch the other worker processes.
+  This must be called before the TF thread pools are setup, because we divide the CPU threads.
+  This is only for training. All other tasks run in this process only.
+
+  :param str|None configFilename:
+  :param tuple[str]|list[str]|None commandLineOptions:
+  """
+  global data_parallel
+  num_workers = config.int("data_parallel_num_workers", 1)
+  if num_workers <= 1:
+    return
+  if config.value("task", "train") != "train":
+    print("Ignoring data_parallel_num_workers for task %r." % config.value("task", "train"), file=log.v3)
+    return
+  assert config.bool("use_tensorflow", False), "data_parallel_num_workers is only supported for TensorFlow"
+  from TFDataParallel import DataParallel
+  import multiprocessing
+  num_threads = max(multiprocessing.cpu_count() // num_workers, 1)
+  if not os.environ.get("OMP_NUM_THREADS"):
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+  data_parallel = DataParallel.from_config(config)
+  if data_parallel.is_master():
+    cmd_args = ([configFilename] if configFilename else []) + list(commandLineOptions or ())
+    data_parallel.launch_local_workers(cmd_args, num_threads_per_worker=num_threads)
+
+
 def initEngine(devices):
   """
   :type devices: list[Device]
@@ -278,7 +312,7 @@ def initEngine(devices):
     engine = Engine(devices)
   elif BackendEngine.is_tensorflow_selected():
     import TFEngine
-    engine = TFEngine.Engine(config=config)
+    engine = TFEngine.Engine(config=config, data_parallel=data_parallel)
   else:
     raise NotImplementedError
 
@@ -326,6 +360,7 @@ def init(configFilename=None, commandLineOptions=(), config_updates=None, extra_
   if extra_greeting:
     print(extra_greeting, file=log.v1)
   crnnGreeting(configFilename=configFilename, commandLineOptions=commandLineOptions)
+  initDataParallel(configFilename=configFilename, commandLineOptions=commandLineOptions)
   initBackendEngine()
   initFaulthandler()
   if BackendEngine.is_theano_selected():
@@ -0,0 +1,99 @@
+
+# start test like this:  nosetests-2.7  tests/test_CachedDataset.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+
+from nose.tools import assert_equal, assert_true, assert_false
+from CachedDataset import CachedDataset
+from Log import log
+import numpy
+
+log.initialize(verbosity=[5])
+
+
+class _DummyCachedDataset(CachedDataset):
+  """
+  Seq i has i + 1 frames, and all its feature values are i.
+  """
+
+  def __init__(self, num_seqs, **kwargs):
+    super(_DummyCachedDataset, self).__init__(**kwargs)
+    self.num_inputs = 2
+    self.num_outputs = {"data": (2, 2), "classes": (3, 1)}
+    self._num_seqs = num_seqs
+    self._seq_lengths = [numpy.array([i + 1, i + 1]) for i in range(num_seqs)]
+    self._seq_start = [numpy.zeros((2,), "int64")]
+    self.target_keys = ["classes"]
+    self.targets = {"classes": numpy.zeros((sum(range(num_seqs + 1)),), dtype="int32")}
+    self.loaded_seqs = []
+
+  def _load_seqs(self, start, end):
+    selection = self.insert_alloc_interval(start, end)
+    for idc in selection:
+      ids = self._seq_index[idc]
+      self.loaded_seqs.append(ids)
+      seq_start = self.get_seq_start(idc)[1]
+      self.targets["classes"][seq_start:seq_start + ids + 1] = ids % 3
+      self._set_alloc_intervals_data(idc, data=numpy.full((ids + 1, 2), ids, dtype="float32"))
+    assert self.is_cached(start, end)
+
+  def get_tag(self, sorted_seq_idx):
+    return "seq-%i" % self._seq_index[self._index_map[sorted_seq_idx]]
+
+
+def test_CachedDataset_alloc_intervals():
+  dataset = _DummyCachedDataset(num_seqs=10)
+  dataset.initialize()
+  dataset.init_seq_order(epoch=1)
+  assert_false(dataset.is_cached(0, 1))
+  assert_equal(dataset.insert_alloc_interval(2, 4), [2, 3])
+  assert_equal(dataset.insert_alloc_interval(6, 7), [6])
+  assert_equal(dataset.alloc_interval_index(3), 0)
+  assert_equal(dataset.alloc_interval_index(4), -1)
+  assert_equal(dataset.alloc_interval_index(6), 1)
+  # Fill the gap in between and merge everything into one interval.
+  assert_equal(dataset.insert_alloc_interval(1, 8), [1, 4, 5, 7])
+  assert_true(dataset.is_cached(1, 8))
+  assert_false(dataset.is_cached(0, 8))
+  assert_equal(dataset.alloc_interval_index(7), 0)
+  # Cut a hole.
+  assert_equal(dataset.remove_alloc_interval(3, 5), [3, 4])
+  assert_true(dataset.is_cached(1, 3))
+  assert_false(dataset.is_cached(1, 4))
+  assert_true(dataset.is_cached(5, 8))
+  assert_equal(dataset.remove_alloc_interval(0, 10), [1, 2, 5, 6, 7])
+  assert_false(dataset.is_cached(1, 2))
+
+
+def test_CachedDataset_load_seqs():
+  dataset = _DummyCachedDataset(num_seqs=5, cache_byte_size=-1)
+  dataset.initialize()
+  dataset.init_seq_order(epoch=1)
+  dataset.load_seqs(1, 3)
+  dataset.load_seqs(0, 4)
+  # Already loaded seqs are not loaded again.
+  assert_equal(dataset.loaded_seqs, [1, 2, 0, 3])
+  for i in range(4):
+    numpy.testing.assert_array_equal(dataset.get_input_data(i), numpy.full((i + 1, 2), i))
+  assert_equal(dataset.delete(None), 1 + 2 + 3 + 4)
+  assert_false(dataset.is_cached(0, 1))
+
+
+def test_CachedDataset_lru_cache():
+  # Seq i has (i + 1) * 12 bytes (2 float32 features + 1 int32 target per frame), all seqs together 180 bytes.
+  dataset = _DummyCachedDataset(num_seqs=5, cache_byte_size=12 * (3 + 4 + 5), cache_policy="lru")
+  dataset.initialize()
+  for epoch in [1, 2]:
+    dataset.init_seq_order(epoch=epoch)
+    # In the second epoch, go backwards, to make use of the cache.
+    for i in (range(5) if epoch == 1 else reversed(range(5))):
+      dataset.load_seqs(i, i + 1)
+      numpy.testing.assert_array_equal(dataset.get_input_data(i), numpy.full((i + 1, 2), i))
+      numpy.testing.assert_array_equal(dataset.get_targets("classes", i), numpy.full((i + 1,), i % 3))
+  # Only the last 3 seqs of the first epoch fit into the cache.
+  assert_equal(dataset.loaded_seqs, [0, 1, 2, 3, 4] + [1, 0])
+  assert_equal((dataset._lru_hits, dataset._lru_misses, dataset._lru_evictions), (3, 2, 1))
+  assert_equal(list(dataset._lru_seqs.keys()), [3, 2, 1, 0])
@@ -0,0 +1,50 @@
+
+# start test like this:  nosetests-2.7  tests/test_CachedDataset2.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+
+from nose.tools import assert_equal, assert_true, assert_false, assert_is
+from CachedDataset2 import DatasetSeqBuffer
+from Dataset import DatasetSeq
+from random import Random
+import numpy
+
+
+def _make_seq(seq_idx):
+  return DatasetSeq(seq_idx=seq_idx, features=numpy.zeros((1, 1)), targets={})
+
+
+def test_DatasetSeqBuffer():
+  buf = DatasetSeqBuffer()
+  assert_false(buf)
+  buf += [_make_seq(i) for i in range(3)]
+  buf.append(_make_seq(3))
+  assert_true(buf)
+  assert_equal(len(buf), 4)
+  assert_equal([seq.seq_idx for seq in buf], [0, 1, 2, 3])
+  assert_equal(buf[-1].seq_idx, 3)
+  buf.remove_seqs_before(2)
+  assert_equal(len(buf), 2)
+  assert_equal(buf[0].seq_idx, 2)
+  assert_equal(buf.get_seq(3).seq_idx, 3)
+  assert_is(buf.get_seq(1), None)
+  assert_is(buf.get_seq(4), None)
+  buf.extend([_make_seq(i) for i in range(4, 100)])
+  buf.remove_seqs_before(90)
+  assert_equal([seq.seq_idx for seq in buf], list(range(90, 100)))
+  assert_equal(buf.get_seq(95).seq_idx, 95)
+  buf.remove_seqs_before(200)
+  assert_false(buf)
+
+
+def test_DatasetSeqBuffer_shuffle_tail():
+  buf = DatasetSeqBuffer([_make_seq(i) for i in range(20)])
+  buf.remove_seqs_before(5)
+  buf.shuffle_tail(3, rng=Random(1))
+  seq_idxs = [seq.seq_idx for seq in buf]
+  assert_equal(seq_idxs[:3], [5, 6, 7])
+  assert_equal(sorted(seq_idxs[3:]), list(range(8, 20)))
+  assert_true(seq_idxs[3:] != list(range(8, 20)))
@@ -305,3 +305,46 @@ def test_task12ax_window():
   assert_equal(list(data2a[1, 1]), list(data1[1]))
   assert_equal(list(data2a[1, 2]), list(data1[2]))
   assert_equal(list(data2a[-1, 2]), [0] * input_dim)  # zero-padded right
+
+
+def test_task12ax_window_view():
+  from GeneratingDataset import Task12AXDataset
+  datas = []
+  for window_view in [False, True]:
+    dataset = Task12AXDataset(num_seqs=10, window=5, window_view=window_view)
+    dataset.initialize()
+    dataset.init_seq_order(epoch=1)
+    dataset.load_seqs(0, 1)
+    datas.append(dataset.get_data(0, "data"))
+  assert_true(datas[0].flags.writeable)
+  assert_false(datas[1].flags.writeable)
+  assert_equal(datas[0].shape, datas[1].shape)
+  np.testing.assert_array_equal(datas[0], datas[1])
+
+
+def test_get_partition_of_seq_order():
+  from Dataset import Dataset
+  seq_lens = [10, 2, 7, 3, 3, 8, 1, 5]
+  seq_index = list(range(len(seq_lens)))
+  parts = []
+  for partition_index in range(3):
+    dataset = Dataset(partition_index=partition_index, num_partitions=3)
+    parts.append(dataset.get_partition_of_seq_order(seq_index, get_seq_len=lambda i: seq_lens[i]))
+  print("parts:", parts)
+  assert_equal(parts, [[0], [1, 3, 4, 6, 7], [2, 5]])
+  assert_equal(sorted(sum(parts, [])), seq_index)
+  assert_equal([sum([seq_lens[i] for i in part]) for part in parts], [10, 14, 15])
+
+
+def test_get_seq_order_for_epoch_partition():
+  from Dataset import Dataset
+  seq_lens = [10, 2, 7, 3, 3, 8, 1, 5]
+  seq_orders = []
+  for partition_index in range(2):
+    dataset = Dataset(seq_ordering="random")
+    dataset.set_partition(partition_index=partition_index, num_partitions=2)
+    seq_orders.append(dataset.get_seq_order_for_epoch(
+      epoch=3, num_seqs=len(seq_lens), get_seq_len=lambda i: seq_lens[i]))
+  print("seq orders:", seq_orders)
+  assert_equal(sorted(seq_orders[0] + seq_orders[1]), list(range(len(seq_lens))))
+  assert_true(abs(sum([seq_lens[i] for i in seq_orders[0]]) - sum([seq_lens[i] for i in seq_orders[1]])) <= 10)
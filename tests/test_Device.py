@@ -29,3 +29,53 @@ def test_Device_blocking_init():
 
   Device("cpu", config=config, blocking=True)
 
+
+def test_Device_param_sync_shared_mem():
+  import time
+  import numpy
+  import numpy.testing
+  from Network import LayerNetwork
+  config = Config()
+  config.update({
+    "multiprocessing": True,
+    "device": "cpu",
+    "num_inputs": 3,
+    "num_outputs": 2,
+  })
+  config.network_topology_json = """
+  {
+  "hidden": {"class": "hidden", "n_out": 4, "activation": "tanh"},
+  "output": {"class": "softmax", "loss": "ce", "from": ["hidden"]}
+  }
+  """
+  network = LayerNetwork.from_config_topology(config)
+  device = Device("cpu0", config=config, blocking=False)
+  try:
+    while not device.initialized:
+      time.sleep(0.1)
+    params = device.get_net_train_params(network)
+    assert [p.shape for p in params] == [(3, 4), (4,), (4, 2), (2,)]
+    rnd = numpy.random.RandomState(42)
+    for p in network.get_all_params_vars():
+      p.set_value(rnd.normal(size=p.get_value().shape).astype("float32"))
+    # Via the shared memory buffer, if shared memory is available, otherwise via the pipe.
+    device.set_net_params(network)
+    device.sync_net_train_params()
+    if device.param_sync_shared_mem:
+      # The device copies the params already now, not only in get_net_train_params().
+      assert device._param_buffer_synced is device._param_buffer
+    params = device.get_net_train_params(network)
+    assert device._param_buffer_synced is None
+    for p, value in zip(network.get_all_params_vars(), params):
+      numpy.testing.assert_array_equal(p.get_value(), value)
+    # A set in between waits for the pending sync.
+    device.sync_net_train_params()
+    for p in network.get_all_params_vars():
+      p.set_value((p.get_value() + 1).astype("float32"))
+    device.set_net_params(network)
+    device.sync_net_train_params()
+    params = device.get_net_train_params(network)
+    for p, value in zip(network.get_all_params_vars(), params):
+      numpy.testing.assert_array_equal(p.get_value(), value)
+  finally:
+    device.terminate()
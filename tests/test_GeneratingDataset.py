@@ -23,3 +23,44 @@ def test_load_seqs():
   dataset.load_seqs(1, 3)
 
 
+def test_partition():
+  num_seqs = 7
+  dataset = DummyDataset(input_dim=2, output_dim=3, num_seqs=num_seqs)
+  dataset.init_seq_order(epoch=1)
+  dataset.load_seqs(0, num_seqs)
+  all_data = [dataset.get_data(i, "data") for i in range(num_seqs)]
+  for partition_index in range(3):
+    dataset = DummyDataset(input_dim=2, output_dim=3, num_seqs=num_seqs)
+    dataset.set_partition(partition_index=partition_index, num_partitions=3)
+    dataset.init_seq_order(epoch=1)
+    part_seq_idxs = list(range(partition_index, num_seqs, 3))
+    assert_equal(dataset.num_seqs, len(part_seq_idxs))
+    dataset.load_seqs(0, dataset.num_seqs)
+    for i, seq_idx in enumerate(part_seq_idxs):
+      np.testing.assert_array_equal(dataset.get_data(i, "data"), all_data[seq_idx])
+
+
+def test_SyntheticDataset():
+  from GeneratingDataset import SyntheticDataset
+  dataset = SyntheticDataset(
+    input_dim=3, output_dim={"classes": (5, 1), "orth": (7, 1), "feat": (2, 2)}, num_seqs=20,
+    seq_len_mean=10, seq_len_stddev=5, seq_len_min=2, seq_len_max=30, target_len_ratio={"orth": 0.5},
+    buffer_num_frames=100)
+  assert_equal(sorted(dataset.get_target_list()), ["classes", "feat", "orth"])
+  seq_lens = []
+  for epoch in [1, 2, 1]:
+    dataset.init_seq_order(epoch=epoch)
+    dataset.load_seqs(0, 20)
+    lens = [dataset.get_seq_length(i) for i in range(20)]
+    seq_lens.append([l["data"] for l in lens])
+    for i, l in enumerate(lens):
+      assert_true(2 <= l["data"] <= 30)
+      assert_equal(l["classes"], l["data"])
+      assert_equal(l["orth"], max(int(round(l["data"] * 0.5)), 1))
+      assert_equal(dataset.get_data(i, "data").shape, (l["data"], 3))
+      assert_equal(dataset.get_data(i, "data").dtype, np.float32)
+      assert_equal(dataset.get_data(i, "feat").shape, (l["data"], 2))
+      assert_equal(dataset.get_data(i, "classes").dtype, np.int32)
+      assert_true(np.all(dataset.get_data(i, "orth") < 7))
+  assert_true(seq_lens[0] != seq_lens[1])
+  assert_equal(seq_lens[0], seq_lens[2])
@@ -0,0 +1,289 @@
+
+# start test like this:  nosetests-2.7  tests/test_LmDataset.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+
+from nose.tools import assert_equal, assert_true
+from LmDataset import LmDataset
+from Log import log
+import numpy
+import tempfile
+import shutil
+import os
+import better_exchook
+
+better_exchook.replace_traceback_format_tb()
+log.initialize(verbosity=[5])
+
+
+def _create_corpus(tmp_dir, lines):
+  """
+  :param str tmp_dir:
+  :param list[str] lines:
+  :return: corpus filename, orth symbols filename
+  :rtype: (str, str)
+  """
+  corpus_filename = "%s/corpus.txt" % tmp_dir
+  with open(corpus_filename, "w") as f:
+    for line in lines:
+      f.write(line + "\n")
+  symbols_filename = "%s/symbols.txt" % tmp_dir
+  with open(symbols_filename, "w") as f:
+    for sym in ["[END]", " "] + [chr(ord("a") + i) for i in range(26)]:
+      f.write(sym + "\n")
+  return corpus_filename, symbols_filename
+
+
+def _get_all_seqs(dataset, epoch=1):
+  """
+  :param LmDataset dataset:
+  :param int epoch:
+  :rtype: list[list[int]]
+  """
+  dataset.init_seq_order(epoch=epoch)
+  seqs = []
+  seq_idx = 0
+  while dataset.is_less_than_num_seqs(seq_idx):
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    seqs.append(list(dataset.get_data(seq_idx, "data")))
+    seq_idx += 1
+  return seqs
+
+
+def test_LmDataset_char_based():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    corpus_filename, symbols_filename = _create_corpus(tmp_dir, ["ab  c", "</s>", "ba"])
+    dataset = LmDataset(corpus_file=corpus_filename, orth_symbols_file=symbols_filename)
+    assert_equal(_get_all_seqs(dataset), [[2, 3, 1, 4, 0], [3, 2, 0]])
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_LmDataset_tokenized_cache():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    lines = ["hello world", "abc", "</s>", "a  b", "xyz"]
+    corpus_filename, symbols_filename = _create_corpus(tmp_dir, lines)
+    kwargs = dict(corpus_file=corpus_filename, orth_symbols_file=symbols_filename, partition_epoch=2)
+    dataset = LmDataset(**kwargs)
+    cache_dir = "%s/cache" % tmp_dir
+    dataset_cached = LmDataset(tokenized_cache_dir=cache_dir, **kwargs)
+    assert_equal(len(os.listdir(cache_dir)), 2)
+    dataset_cached_again = LmDataset(tokenized_cache_dir=cache_dir, **kwargs)  # uses the existing cache
+    assert_equal(len(os.listdir(cache_dir)), 2)
+    for epoch in [1, 2]:
+      seqs = _get_all_seqs(dataset, epoch=epoch)
+      assert_true(seqs)
+      assert_equal(_get_all_seqs(dataset_cached, epoch=epoch), seqs)
+      assert_equal(_get_all_seqs(dataset_cached_again, epoch=epoch), seqs)
+    # A changed symbol file results in a new cache.
+    with open(symbols_filename, "a") as f:
+      f.write("[UNKNOWN]\n")
+    LmDataset(tokenized_cache_dir=cache_dir, **kwargs)
+    assert_equal(len(os.listdir(cache_dir)), 4)
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_LmDataset_stream_corpus():
+  import gzip
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    lines = ["line %s" % chr(ord("a") + i) for i in range(11)]
+    corpus_filename, symbols_filename = _create_corpus(tmp_dir, lines[:5] + [""] + lines[5:])
+    with open(corpus_filename, "rb") as f_in, gzip.open(corpus_filename + ".gz", "wb") as f_out:
+      f_out.write(f_in.read())
+    kwargs = dict(orth_symbols_file=symbols_filename, partition_epoch=2)
+    dataset = LmDataset(corpus_file=corpus_filename, **kwargs)
+    for corpus_file in [corpus_filename, corpus_filename + ".gz"]:
+      dataset_stream = LmDataset(corpus_file=corpus_file, stream_corpus=True, **kwargs)
+      for epoch in [1, 2]:
+        assert_equal(_get_all_seqs(dataset_stream, epoch=epoch), _get_all_seqs(dataset, epoch=epoch))
+
+    seqs = _get_all_seqs(dataset, epoch=1)
+    dataset_random = LmDataset(
+      corpus_file=corpus_filename, stream_corpus=True, stream_shuffle_buffer_size=3, seq_ordering="random", **kwargs)
+    seqs_random = _get_all_seqs(dataset_random, epoch=1)
+    assert_equal(sorted(seqs_random), sorted(seqs))
+    assert_true(seqs_random != seqs)
+
+    seqs_parts = []
+    for partition_index in range(2):
+      dataset_part = LmDataset(corpus_file=corpus_filename, stream_corpus=True, **kwargs)
+      dataset_part.set_partition(partition_index=partition_index, num_partitions=2)
+      seqs_parts.append(_get_all_seqs(dataset_part, epoch=1))
+    assert_equal(seqs_parts, [seqs[0::2], seqs[1::2]])
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def _create_lexicon(tmp_dir):
+  """
+  :param str tmp_dir:
+  :return: lexicon filename
+  :rtype: str
+  """
+  lexicon_filename = "%s/lexicon.xml" % tmp_dir
+  phonemes = [("si", "none"), ("a", "context"), ("b", "context"), ("c", "context")]
+  lemmas = [("[SILENCE]", ["si"]), ("ab", ["a b", "a b c"]), ("ca", ["c a"]), ("b", ["b"])]
+  with open(lexicon_filename, "w") as f:
+    f.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<lexicon>\n<phoneme-inventory>\n")
+    for symbol, variation in phonemes:
+      f.write("<phoneme><symbol>%s</symbol><variation>%s</variation></phoneme>\n" % (symbol, variation))
+    f.write("</phoneme-inventory>\n")
+    for orth, phons in lemmas:
+      f.write("<lemma><orth>%s</orth>%s</lemma>\n" % (orth, "".join(["<phon>%s</phon>" % p for p in phons])))
+    f.write("</lexicon>\n")
+  return lexicon_filename
+
+
+def test_PhoneSeqGenerator_generate_class_idxs_seq():
+  from LmDataset import PhoneSeqGenerator
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    lexicon_filename = _create_lexicon(tmp_dir)
+    orths = ["ab ca b", "b", "ca ab ab b", "ab/b ca-b"]
+    seq_gen = PhoneSeqGenerator(lexicon_file=lexicon_filename, add_silence_between_words=0.5)
+    seq_gen.random_seed(42)
+    allo_strs = set()
+    for _ in range(10):
+      for orth in orths:
+        allo_strs.update([a.format() for a in seq_gen.generate_seq(orth)])
+    state_tying_filename = "%s/state-tying.txt" % tmp_dir
+    with open(state_tying_filename, "w") as f:
+      for i, allo_str in enumerate(sorted(allo_strs)):
+        f.write("%s %i\n" % (allo_str, i))
+
+    for state_tying_file in [None, state_tying_filename]:
+      seq_gen = PhoneSeqGenerator(
+        lexicon_file=lexicon_filename, add_silence_between_words=0.5, state_tying_file=state_tying_file)
+      seq_gen.random_seed(42)
+      expected = [seq_gen.seq_to_class_idxs(seq_gen.generate_seq(orth)) for _ in range(10) for orth in orths]
+      seq_gen.random_seed(42)
+      idxs = [seq_gen.generate_class_idxs_seq(orth) for _ in range(10) for orth in orths]
+      assert_equal(len(expected), len(idxs))
+      for expected_seq, seq in zip(expected, idxs):
+        assert_equal(expected_seq.dtype, seq.dtype)
+        assert_equal(expected_seq.tolist(), seq.tolist())
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def _create_translation_data(tmp_dir, num_seqs=7):
+  """
+  :param str tmp_dir:
+  :param int num_seqs:
+  """
+  import pickle
+  words = ["<S>", "</S>", "a", "b", "c", "d"]
+  vocab = {w: i for (i, w) in enumerate(words)}
+  for prefix in ["source", "target"]:
+    with open("%s/%s.vocab.pkl" % (tmp_dir, prefix), "wb") as f:
+      pickle.dump(vocab, f)
+  with open("%s/source.train" % tmp_dir, "w") as f:
+    for i in range(num_seqs):
+      f.write(" ".join(words[2:2 + i % 4 + 1]) + "\n")
+  with open("%s/target.train" % tmp_dir, "w") as f:
+    for i in range(num_seqs):
+      f.write(" ".join(reversed(words[2:2 + i % 3 + 1])) + "\n")
+
+
+def _get_all_translation_seqs(dataset):
+  """
+  :param TranslationDataset dataset:
+  :rtype: list[(list[int],list[int])]
+  """
+  dataset.init_seq_order(epoch=1)
+  seqs = []
+  seq_idx = 0
+  while dataset.is_less_than_num_seqs(seq_idx):
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    seqs.append((list(dataset.get_data(seq_idx, "data")), list(dataset.get_data(seq_idx, "classes"))))
+    seq_idx += 1
+  return seqs
+
+
+def test_TranslationDataset():
+  from LmDataset import TranslationDataset
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    _create_translation_data(tmp_dir)
+    dataset = TranslationDataset(path=tmp_dir, file_postfix="train", target_postfix=" </S>")
+    seqs = _get_all_translation_seqs(dataset)
+    assert_equal(len(seqs), 7)
+    assert_equal(seqs[2], ([2, 3, 4], [4, 3, 2, 1]))
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_TranslationDataset_cache():
+  from LmDataset import TranslationDataset
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    _create_translation_data(tmp_dir)
+    cache_dir = "%s/cache" % tmp_dir
+    kwargs = dict(path=tmp_dir, file_postfix="train", target_postfix=" </S>", seq_ordering="sorted")
+    dataset = TranslationDataset(**kwargs)
+    seqs = _get_all_translation_seqs(dataset)
+    dataset_cached = TranslationDataset(cache_dir=cache_dir, **kwargs)
+    assert_equal(_get_all_translation_seqs(dataset_cached), seqs)
+    dataset_cached._thread.join()  # it writes the cache at the end
+    assert_equal(len(os.listdir(cache_dir)), 4)
+    dataset_cached_again = TranslationDataset(cache_dir=cache_dir, **kwargs)
+    assert_equal(dataset_cached_again._thread, None)
+    assert_equal(_get_all_translation_seqs(dataset_cached_again), seqs)
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_TranslationDataset_data_len_before_vocab_mapping():
+  from LmDataset import TranslationDataset
+  import threading
+  vocab_mapping_allowed = threading.Event()
+
+  class BlockedTranslationDataset(TranslationDataset):
+    @staticmethod
+    def _data_str_to_numpy(vocab, s):
+      assert vocab_mapping_allowed.wait(60)
+      return TranslationDataset._data_str_to_numpy(vocab, s)
+
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    _create_translation_data(tmp_dir)
+    dataset = BlockedTranslationDataset(path=tmp_dir, file_postfix="train")
+    dataset.init_seq_order(epoch=1)  # does not need the mapped data
+    assert_equal(dataset.num_seqs, 7)
+    assert_equal(len(dataset._data["data"]), 0)
+    vocab_mapping_allowed.set()
+    dataset.load_seqs(0, 7)
+    assert_equal(list(dataset.get_data(2, "data")), [2, 3, 4])
+  finally:
+    vocab_mapping_allowed.set()
+    shutil.rmtree(tmp_dir)
+
+
+def test_TranslationDataset_partition_multiple_epochs():
+  from LmDataset import TranslationDataset
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    _create_translation_data(tmp_dir)
+    datasets = [
+      TranslationDataset(
+        path=tmp_dir, file_postfix="train", seq_ordering="sorted",
+        partition_index=partition_index, num_partitions=2)
+      for partition_index in range(2)]
+    for epoch in [1, 2, 3]:
+      parts = []
+      for dataset in datasets:
+        dataset.init_seq_order(epoch=epoch)
+        dataset.load_seqs(0, dataset.num_seqs)
+        parts.append([dataset.get_tag(seq_idx) for seq_idx in range(dataset.num_seqs)])
+      assert_equal(sorted(parts[0] + parts[1]), ["line-%i" % i for i in range(7)])
+      # Sorted by length (1, 2, 3, 4, 1, 2, 3), and balanced by the number of frames.
+      assert_equal(parts, [["line-0", "line-1", "line-2", "line-3"], ["line-4", "line-5", "line-6"]])
+  finally:
+    shutil.rmtree(tmp_dir)
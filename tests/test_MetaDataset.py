@@ -0,0 +1,149 @@
+
+# start test like this:  nosetests-2.7  tests/test_MetaDataset.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+sys.path += ["tools"]
+
+from nose.tools import assert_equal
+from MetaDataset import MetaDataset, CombinedDataset
+from Log import log
+import better_exchook
+
+better_exchook.replace_traceback_format_tb()
+log.initialize(verbosity=[5])
+
+
+def _get_all_seqs(dataset):
+  """
+  :param Dataset.Dataset dataset:
+  :return: list of (tag, data, classes)
+  :rtype: list[(str,list,list)]
+  """
+  dataset.init_seq_order(epoch=1)
+  seqs = []
+  seq_idx = 0
+  while dataset.is_less_than_num_seqs(seq_idx):
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    seqs.append((
+      dataset.get_tag(seq_idx),
+      dataset.get_data(seq_idx, "data").tolist(),
+      dataset.get_data(seq_idx, "classes").tolist()))
+    seq_idx += 1
+  return seqs
+
+
+def test_CombinedDataset_parallel_load():
+  kwargs = dict(
+    datasets={
+      "a": {"class": "DummyDataset", "input_dim": 2, "output_dim": 3, "num_seqs": 5, "seq_len": 3},
+      "b": {"class": "DummyDataset", "input_dim": 2, "output_dim": 3, "num_seqs": 4, "seq_len": 2}},
+    data_map={("a", "data"): "data", ("a", "classes"): "classes", ("b", "data"): "data", ("b", "classes"): "classes"},
+    data_dims={"data": [2, 2], "classes": [3, 1]},
+    seq_ordering="in-order")
+  seqs = _get_all_seqs(CombinedDataset(**kwargs))
+  assert_equal(len(seqs), 9)
+  dataset = CombinedDataset(parallel_load=True, **kwargs)
+  seqs_parallel = _get_all_seqs(dataset)
+  assert_equal(seqs_parallel, seqs)
+  dataset.init_seq_order(epoch=2)
+  dataset.load_seqs(0, 9)  # from both sub-datasets, thus in the load pool
+  threads = list(dataset._load_pool._pool._pool)
+  del dataset
+  import gc
+  gc.collect()
+  for thread in threads:
+    assert not thread.is_alive()  # the dataset teardown stops the load pool
+
+
+def test_MetaDataset_partition_multiple_epochs():
+  import os
+  import json
+  import tempfile
+  import shutil
+  from hdf_dump import hdf_dataset_init, hdf_dump_from_dataset, hdf_close
+  from GeneratingDataset import DummyDataset
+  from Util import DictAsObj
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    num_seqs = 7
+    hdf_dataset = hdf_dataset_init(tmp_dir + "/data.hdf")
+    hdf_dump_from_dataset(
+      DummyDataset(input_dim=2, output_dim=3, num_seqs=num_seqs, seq_len=3), hdf_dataset,
+      DictAsObj({"epoch": 1, "start_seq": 0, "end_seq": float("inf")}))
+    hdf_close(hdf_dataset)
+    seq_tags = ["seq-%i" % i for i in range(num_seqs)]
+    with open(tmp_dir + "/seq_list.txt", "w") as f:
+      f.write("\n".join(seq_tags))
+    with open(tmp_dir + "/seq_lens.json", "w") as f:
+      json.dump({tag: {"data": 3, "classes": 3} for tag in seq_tags}, f)
+    datasets = [
+      MetaDataset(
+        seq_list_file=tmp_dir + "/seq_list.txt", seq_lens_file=tmp_dir + "/seq_lens.json",
+        datasets={"hdf": {"class": "HDFDataset", "files": [tmp_dir + "/data.hdf"]}},
+        data_map={"data": ("hdf", "data"), "classes": ("hdf", "classes")},
+        data_dims={"data": [2, 2], "classes": [3, 1]},
+        seq_ordering="random", partition_index=partition_index, num_partitions=2)
+      for partition_index in range(2)]
+    epoch_tags = []
+    for epoch in [1, 2, 3]:
+      parts = []
+      for dataset in datasets:
+        dataset.init_seq_order(epoch=epoch)
+        assert_equal(dataset.num_seqs, [4, 3][dataset.partition_index])
+        dataset.load_seqs(0, dataset.num_seqs)
+        parts.append([dataset.get_tag(seq_idx) for seq_idx in range(dataset.num_seqs)])
+      assert_equal(sorted(parts[0] + parts[1]), seq_tags)
+      epoch_tags.append(parts[0] + parts[1])
+    assert epoch_tags[0] != epoch_tags[1]  # the random order and thus the partition changes
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_SubDatasetsLoadPool():
+  from MetaDataset import _SubDatasetsLoadPool
+  import threading
+  pool = _SubDatasetsLoadPool(num_threads=2)
+  barrier_lock = threading.Condition()
+  started = []
+
+  def func(i):
+    # Both must run concurrently, otherwise this would wait for the timeout.
+    with barrier_lock:
+      started.append(i)
+      barrier_lock.notify_all()
+      while len(started) < 2:
+        if not barrier_lock.wait(10):
+          break
+    return len(started)
+
+  results = []
+  pool.run([lambda i=i: results.append(func(i)) for i in range(2)])
+  assert_equal(results, [2, 2])
+  threads = list(pool._pool._pool)
+  assert_equal(len(threads), 2)
+  pool.close()
+  for thread in threads:
+    assert not thread.is_alive()
+
+
+def test_ChunkShuffleDataset():
+  from MetaDataset import ChunkShuffleDataset
+  from GeneratingDataset import DummyDataset
+  sub_dataset_kwargs = {"class": "DummyDataset", "input_dim": 2, "output_dim": 3, "num_seqs": 20, "seq_len": 3}
+  sub_dataset = DummyDataset(**{k: v for (k, v) in sub_dataset_kwargs.items() if k != "class"})
+  sub_dataset.init_seq_order(epoch=1)
+  sub_dataset.load_seqs(0, 20)
+  sub_seqs = sorted([sub_dataset.get_data(i, "data").tolist() for i in range(20)])
+  dataset = ChunkShuffleDataset(dataset=sub_dataset_kwargs, chunk_shuffle_cache=5)
+  dataset.init_seq_order(epoch=1)
+  seqs = []
+  seq_idx = 0
+  while dataset.is_less_than_num_seqs(seq_idx):
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    seqs.append(dataset.get_data(seq_idx, "data").tolist())
+    seq_idx += 1
+  assert_equal(sorted(seqs), sub_seqs)
+  assert seqs != [sub_dataset.get_data(i, "data").tolist() for i in range(20)]
@@ -0,0 +1,85 @@
+
+# start test like this:  nosetests-2.7  tests/test_NormalizationData.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+
+from nose.tools import assert_equal
+import NormalizationData as NormalizationDataModule
+from NormalizationData import NormalizationData
+import numpy
+import h5py
+import os
+import tempfile
+import shutil
+
+
+def _write_dataset_file(filename, seqs):
+  with h5py.File(filename, "w") as f:
+    for i, x in enumerate(seqs):
+      f.create_dataset("inputs/%i" % i, data=x)
+
+
+def _write_bundle_file(filename, files):
+  with open(filename, "w") as f:
+    for fn in files:
+      f.write(fn + "\n")
+
+
+def test_mergeStatistics():
+  rnd = numpy.random.RandomState(42)
+  x = rnd.normal(loc=1e4, size=(20, 3))
+  stats = (0, None, None)
+  for part in [x[:3], x[3:3], x[3:15], x[15:]]:
+    stats = NormalizationData.mergeStatistics(stats, NormalizationData._calculateStatistics(part))
+  count, mean, m2 = stats
+  assert_equal(count, 20)
+  numpy.testing.assert_allclose(mean, numpy.mean(x, axis=0))
+  numpy.testing.assert_allclose(m2 / count, numpy.var(x, axis=0))
+
+
+def test_createNormalizationFile_parallel_incremental():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    rnd = numpy.random.RandomState(42)
+    files_seqs = [[rnd.normal(size=(n, 4)) for n in lens] for lens in [[5, 7], [3], [9, 2, 4]]]
+    files = ["%s/data%i.hdf" % (tmp_dir, i) for i in range(len(files_seqs))]
+    for fn, seqs in zip(files, files_seqs):
+      _write_dataset_file(fn, seqs)
+    bundle_filename = tmp_dir + "/data.bundle"
+    norm_filename = tmp_dir + "/norm.hdf"
+
+    _write_bundle_file(bundle_filename, files[:2])
+    NormalizationData.createNormalizationFile(
+      bundle_filename, norm_filename, flag_includeOutputs=False, numWorkers=2)
+    x = numpy.concatenate(files_seqs[0] + files_seqs[1])
+    norm = NormalizationData(norm_filename)
+    numpy.testing.assert_allclose(norm.inputMean, numpy.mean(x, axis=0))
+    numpy.testing.assert_allclose(norm.inputVariance, numpy.var(x, axis=0))
+
+    # Add a file. Only the new file should be scanned.
+    _write_bundle_file(bundle_filename, files)
+    scanned_files = []
+    orig_calculate_file_statistics = NormalizationDataModule._calculateFileStatistics
+
+    def calculate_file_statistics(args):
+      scanned_files.append(args[0])
+      return orig_calculate_file_statistics(args)
+
+    NormalizationDataModule._calculateFileStatistics = calculate_file_statistics
+    try:
+      NormalizationData.createNormalizationFile(bundle_filename, norm_filename, flag_includeOutputs=False)
+    finally:
+      NormalizationDataModule._calculateFileStatistics = orig_calculate_file_statistics
+    assert_equal(scanned_files, [os.path.abspath(files[2])])
+    x = numpy.concatenate(sum(files_seqs, []))
+    norm = NormalizationData(norm_filename)
+    numpy.testing.assert_allclose(norm.inputMean, numpy.mean(x, axis=0))
+    numpy.testing.assert_allclose(norm.inputVariance, numpy.var(x, axis=0))
+    with h5py.File(norm_filename, "r") as f:
+      assert_equal(f["inputs"][NormalizationData.DATASET_TOTAL_FRAMES][()], x.shape[0])
+      numpy.testing.assert_allclose(f["inputs"][NormalizationData.DATASET_MEAN_OF_SQUARES][...], numpy.mean(x ** 2, axis=0))
+  finally:
+    shutil.rmtree(tmp_dir)
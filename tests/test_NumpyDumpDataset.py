@@ -0,0 +1,41 @@
+
+# start test like this:  nosetests-2.7  tests/test_NumpyDumpDataset.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+
+from nose.tools import assert_equal, assert_true
+from NumpyDumpDataset import NumpyDumpDataset, NumpyDumpBinaryWriter
+from GeneratingDataset import DummyDataset
+import numpy
+import tempfile
+import shutil
+
+
+def test_NumpyDumpDataset_binary():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    prefix = tmp_dir + "/dump."
+    orig = DummyDataset(input_dim=2, output_dim=3, num_seqs=5, seq_len=4)
+    orig.init_seq_order(epoch=1)
+    orig.load_seqs(0, orig.num_seqs)
+    writer = NumpyDumpBinaryWriter(prefix=prefix)
+    for seq_idx in range(orig.num_seqs):
+      writer.add_seq(
+        features=orig.get_data(seq_idx, "data"), targets={"classes": orig.get_targets("classes", seq_idx)})
+    writer.close()
+
+    dataset = NumpyDumpDataset(prefix=prefix, binary=True, start_seq=1, num_inputs=2, num_outputs={"classes": (3, 1)})
+    assert_equal(dataset.num_seqs, 4)
+    dataset.init_seq_order(epoch=1)
+    dataset.load_seqs(0, dataset.num_seqs)
+    for seq_idx in range(dataset.num_seqs):
+      features = dataset.get_data(seq_idx, "data")
+      assert_true(isinstance(features, numpy.memmap))
+      numpy.testing.assert_array_equal(features, orig.get_data(seq_idx + 1, "data"))
+      numpy.testing.assert_array_equal(
+        dataset.get_targets("classes", seq_idx), orig.get_targets("classes", seq_idx + 1))
+  finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,70 @@
+
+# start test like this:  nosetests-2.7  tests/test_RawWavDataset.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+
+from nose.tools import assert_equal, assert_false
+from RawWavDataset import RawWavDataset
+from Log import log
+import numpy
+import scipy.io.wavfile
+import tempfile
+import shutil
+
+log.initialize(verbosity=[5])
+
+
+def test_RawWavDataset():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    signals = [numpy.arange(n, dtype="int16") for n in [10, 7, 12]]
+    with open(tmp_dir + "/list.txt", "w") as f:
+      for i, signal in enumerate(signals):
+        scipy.io.wavfile.write("%s/%i.wav" % (tmp_dir, i), 16000, signal)
+        f.write("%s/%i.wav\n" % (tmp_dir, i))
+    # The buffer only has space for one wav file.
+    dataset = RawWavDataset(
+      listFile=tmp_dir + "/list.txt", frameLength=4, frameShift=3, num_outputs=2, wavBufferByteSize=50)
+    for epoch in [1, 2]:
+      dataset.init_seq_order(epoch=epoch)
+      dataset.load_seqs(0, 3)
+      for seq_idx, signal in enumerate(signals):
+        features = dataset.get_data(seq_idx, "data")
+        num_frames = (len(signal) - 4 + 2) // 3 + 1
+        padded = numpy.concatenate([signal, numpy.zeros((3 * (num_frames - 1) + 4 - len(signal),))])
+        expected = numpy.array([padded[i * 3:i * 3 + 4] for i in range(num_frames)], dtype="float32")
+        numpy.testing.assert_array_equal(features, expected)
+        assert_false(features.flags.writeable)
+    assert_equal(list(dataset._wavBuffer.keys()), [2])
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_RawWavDataset_partition_multiple_epochs():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    num_samples = [10, 7, 12, 4, 20]
+    with open(tmp_dir + "/list.txt", "w") as f:
+      for i, n in enumerate(num_samples):
+        scipy.io.wavfile.write("%s/%i.wav" % (tmp_dir, i), 16000, numpy.full((n,), i, dtype="int16"))
+        f.write("%s/%i.wav\n" % (tmp_dir, i))
+    for seq_ordering, expected_parts in [
+          ("default", [[0, 2, 4], [1, 3]]),  # the lengths are not used, thus round-robin
+          ("sorted", [[3, 0, 4], [1, 2]])]:  # balanced by the number of frames
+      datasets = [
+        RawWavDataset(
+          listFile=tmp_dir + "/list.txt", frameLength=4, frameShift=3, num_outputs=2, seq_ordering=seq_ordering,
+          partition_index=partition_index, num_partitions=2)
+        for partition_index in range(2)]
+      for epoch in [1, 2, 3]:
+        parts = []
+        for dataset in datasets:
+          dataset.init_seq_order(epoch=epoch)
+          dataset.load_seqs(0, dataset.num_seqs)
+          parts.append([int(dataset.get_data(seq_idx, "data")[0, 0]) for seq_idx in range(dataset.num_seqs)])
+        assert_equal(parts, expected_parts)
+  finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,81 @@
+
+# start test like this:  nosetests-2.7  tests/test_StereoDataset.py
+
+from __future__ import print_function
+
+import sys
+sys.path += ["."]  # Python 3 hack
+
+from nose.tools import assert_equal, assert_true, assert_false
+from StereoDataset import DatasetWithTimeContext
+from Log import log
+import numpy
+import h5py
+import tempfile
+import shutil
+
+log.initialize(verbosity=[5])
+
+
+def _stack_context_frames(x, tau):
+  """
+  :param numpy.ndarray x: (time, dim)
+  :param int tau:
+  :return: (time, (2 * tau + 1) * dim), reference implementation
+  :rtype: numpy.ndarray
+  """
+  frames, bins = x.shape
+  padded = numpy.concatenate([numpy.zeros((tau, bins)), x, numpy.zeros((tau, bins))])
+  return numpy.array([padded[t:t + 2 * tau + 1].flatten() for t in range(frames)])
+
+
+def test_DatasetWithTimeContext():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    rnd = numpy.random.RandomState(42)
+    seqs = [rnd.normal(size=(n, 3)).astype("float32") for n in [5, 1, 8]]
+    with h5py.File(tmp_dir + "/data.hdf", "w") as f:
+      for i, x in enumerate(seqs):
+        f.create_dataset("inputs/%i" % i, data=x)
+    for window_view in [False, True]:
+      dataset = DatasetWithTimeContext(hdfFile=tmp_dir + "/data.hdf", tau=2, num_outputs=2, window_view=window_view)
+      dataset.init_seq_order(epoch=1)
+      dataset.load_seqs(0, len(seqs))
+      for seq_idx in range(len(seqs)):
+        x = seqs[int(dataset._seqMap[dataset._seq_index_list[seq_idx]][1])]
+        features = dataset.get_data(seq_idx, "data")
+        assert_equal(features.flags.writeable, not window_view)
+        numpy.testing.assert_array_equal(features, _stack_context_frames(x, tau=2))
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_DatasetWithTimeContext_partition_multiple_epochs():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    rnd = numpy.random.RandomState(42)
+    seqs = [rnd.normal(size=(n, 3)).astype("float32") for n in [5, 1, 8, 3, 4]]
+    with h5py.File(tmp_dir + "/data.hdf", "w") as f:
+      for i, x in enumerate(seqs):
+        f.create_dataset("inputs/%i" % i, data=x)
+    datasets = [
+      DatasetWithTimeContext(
+        hdfFile=tmp_dir + "/data.hdf", tau=1, num_outputs=2, seq_ordering="sorted",
+        partition_index=partition_index, num_partitions=2)
+      for partition_index in range(2)]
+    for epoch in [1, 2, 3]:
+      parts = []
+      for dataset in datasets:
+        dataset.init_seq_order(epoch=epoch)
+        dataset.load_seqs(0, dataset.num_seqs)
+        part = []
+        for seq_idx in range(dataset.num_seqs):
+          orig_seq_idx = int(dataset._seqMap[dataset._seq_index_list[seq_idx]][1])
+          numpy.testing.assert_array_equal(
+            dataset.get_data(seq_idx, "data"), _stack_context_frames(seqs[orig_seq_idx], tau=1))
+          part.append(orig_seq_idx)
+        parts.append(part)
+      # Sorted by length, and balanced by the number of frames.
+      assert_equal(parts, [[1, 4, 2], [3, 0]])
+  finally:
+    shutil.rmtree(tmp_dir)
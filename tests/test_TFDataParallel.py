@@ -0,0 +1,292 @@
+
+# start test like this:  nosetests-2.7  tests/test_TFDataParallel.py
+
+from __future__ import print_function
+
+
+import logging
+logging.getLogger('tensorflow').disabled = True
+import tensorflow as tf
+import sys
+sys.path += ["."]  # Python 3 hack
+from TFDataParallel import *
+from Log import log
+from nose.tools import assert_equal, assert_true, assert_false
+from numpy.testing.utils import assert_almost_equal
+import numpy
+import threading
+import better_exchook
+
+better_exchook.replace_traceback_format_tb()
+log.initialize(verbosity=[5])
+
+
+def _run_workers(num_workers, func):
+  """
+  Runs func(data_parallel) for every rank, each in its own thread.
+
+  :param int num_workers:
+  :param (DataParallel)->T func:
+  :return: results, by rank
+  :rtype: list[T]
+  """
+  master = DataParallel(num_workers=num_workers, rank=0)
+  workers = [master] + [
+    DataParallel(num_workers=num_workers, rank=rank, port=master.port, authkey=master.authkey)
+    for rank in range(1, num_workers)]
+  results = [None] * num_workers
+  errors = []
+
+  def run(rank):
+    try:
+      results[rank] = func(workers[rank])
+    except Exception as exc:
+      errors.append(exc)
+      raise
+
+  threads = [threading.Thread(target=run, args=(rank,)) for rank in range(num_workers)]
+  for t in threads:
+    t.daemon = True
+    t.start()
+  for t in threads:
+    t.join(60)
+    assert not t.is_alive()
+  for dp in workers:
+    dp.finalize()
+  assert not errors, errors
+  return results
+
+
+def test_DataParallel_all_reduce_mean():
+  num_workers = 3
+
+  def func(dp):
+    values = numpy.array([dp.rank, 2 * dp.rank, 1.0], dtype="float32")
+    all_done = dp.all_reduce_mean(values, done=False)
+    assert_false(all_done)
+    all_done2 = dp.all_reduce_mean(numpy.zeros((1,), dtype="float32"), done=dp.rank != 1)
+    assert_false(all_done2)
+    all_done3 = dp.all_reduce_mean(numpy.zeros((1,), dtype="float32"), done=True)
+    assert_true(all_done3)
+    return values
+
+  results = _run_workers(num_workers, func)
+  for values in results:
+    assert_almost_equal(values, [1.0, 2.0, 1.0])
+
+
+def test_DataParallel_all_reduce_mean_float64():
+  def func(dp):
+    # More than the float32 precision.
+    values = numpy.array([2 ** 30 + 1 + dp.rank], dtype="float64")
+    dp.all_reduce_mean(values)
+    return values
+
+  results = _run_workers(2, func)
+  for values in results:
+    assert_equal(values[0] * 2, 2 ** 31 + 3)
+
+
+def test_DataParallel_all_reduce_mean_size_mismatch():
+  def func(dp):
+    values = numpy.zeros((3 if dp.rank == 0 else 2,), dtype="float32")
+    try:
+      dp.all_reduce_mean(values)
+    except Exception as exc:
+      return str(exc)
+    return None
+
+  master = DataParallel(num_workers=2, rank=0)
+  worker = DataParallel(num_workers=2, rank=1, port=master.port, authkey=master.authkey)
+  thread = threading.Thread(target=func, args=(worker,))
+  thread.daemon = True
+  thread.start()
+  error_msg = func(master)
+  master.finalize()
+  worker.finalize()
+  thread.join(60)
+  assert_true(error_msg and "expected 12 bytes" in error_msg, error_msg)
+
+
+def test_DataParallel_all_gather():
+  results = _run_workers(3, lambda dp: dp.all_gather(["key%i" % i for i in range(dp.rank)]))
+  assert_equal(results, [[[], ["key0"], ["key0", "key1"]]] * 3)
+
+
+def test_DataParallel_connect_worker_crashed():
+  from subprocess import Popen
+  master = DataParallel(num_workers=2, rank=0, connect_timeout=60)
+  master._worker_procs.append(Popen([sys.executable, "-c", "import sys; sys.exit(3)"]))
+  try:
+    master.connect()
+  except Exception as exc:
+    assert_true("worker 1 exited with code 3" in str(exc), exc)
+  else:
+    assert False, "expected exception"
+  finally:
+    master.finalize()
+
+
+def test_DataParallel_connect_timeout():
+  master = DataParallel(num_workers=2, rank=0, connect_timeout=0.5)
+  try:
+    master.connect()
+  except Exception as exc:
+    assert_true("timeout" in str(exc), exc)
+  else:
+    assert False, "expected exception"
+  finally:
+    master.finalize()
+
+
+def test_DataParallel_broadcast():
+  results = _run_workers(3, lambda dp: dp.broadcast({"lr": 0.1 * (dp.rank + 1)}))
+  assert_equal(results, [{"lr": 0.1}] * 3)
+
+
+def test_DataParallel_partition_dataset():
+  from GeneratingDataset import DummyDataset
+  seq_tags = []
+  for rank in range(3):
+    dp = DataParallel(num_workers=3, rank=rank, authkey=b"x")
+    dataset = DummyDataset(input_dim=2, output_dim=3, num_seqs=7)
+    dp.partition_dataset(dataset)
+    dataset.init_seq_order(epoch=1)
+    dataset.load_seqs(0, dataset.num_seqs)
+    seq_tags.append([dataset.get_tag(i) for i in range(dataset.num_seqs)])
+    dp.finalize()
+  assert_equal(seq_tags, [["seq-0", "seq-3", "seq-6"], ["seq-1", "seq-4"], ["seq-2", "seq-5"]])
+
+
+def test_DataParallel_sync_params():
+  num_workers = 2
+  graphs = [tf.Graph() for _ in range(num_workers)]
+  sessions = []
+  for rank, graph in enumerate(graphs):
+    with graph.as_default():
+      v1 = tf.Variable(numpy.full((2, 3), float(rank), dtype="float32"), name="v1")
+      v2 = tf.Variable(numpy.array([10.0 * rank], dtype="float32"), name="v2")
+      session = tf.Session(graph=graph)
+      session.run(tf.global_variables_initializer())
+      sessions.append((session, [v1, v2]))
+
+  def func(dp):
+    session, variables = sessions[dp.rank]
+    with graphs[dp.rank].as_default():
+      dp.sync_params(session=session, variables=variables)
+      return session.run(variables)
+
+  results = _run_workers(num_workers, func)
+  for v1, v2 in results:
+    assert_almost_equal(v1, numpy.full((2, 3), 0.5))
+    assert_almost_equal(v2, [5.0])
+  for session, _ in sessions:
+    session.close()
+
+
+def test_DataParallel_sync_params_dtypes():
+  num_workers = 2
+  graphs = [tf.Graph() for _ in range(num_workers)]
+  sessions = []
+  for rank, graph in enumerate(graphs):
+    with graph.as_default():
+      v1 = tf.Variable(numpy.array([2.0 ** 30 + 1 + rank], dtype="float64"), name="v1")  # more than float32 precision
+      v2 = tf.Variable(numpy.array([1.0 + rank], dtype="float32"), name="v2")
+      v3 = tf.Variable(numpy.array([10 + rank], dtype="int64"), name="v3")
+      session = tf.Session(graph=graph)
+      session.run(tf.global_variables_initializer())
+      sessions.append((session, [v1, v2, v3]))
+
+  def func(dp):
+    session, variables = sessions[dp.rank]
+    with graphs[dp.rank].as_default():
+      dp.sync_params(session=session, variables=variables)
+      synced = session.run(variables)
+      dp.broadcast_params(session=session, variables=variables)
+      return synced, session.run(variables)
+
+  results = _run_workers(num_workers, func)
+  for rank, ((v1, v2, v3), (_, _, v3_broadcast)) in enumerate(results):
+    assert_equal(v1.dtype, numpy.float64)
+    assert_equal(v1[0] * 2, 2 ** 31 + 3)
+    assert_almost_equal(v2, [1.5])
+    assert_equal(v3.tolist(), [10 + rank])  # not averaged
+    assert_equal(v3_broadcast.tolist(), [10])  # from rank 0
+  for session, _ in sessions:
+    session.close()
+
+
+_engine_train_worker_code = """
+import sys
+sys.path.insert(0, ".")
+import numpy
+from Config import Config
+from Log import log
+from GeneratingDataset import DummyDataset
+from TFEngine import Engine
+from TFDataParallel import DataParallel
+rank, port, tmp_dir = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+log.initialize(verbosity=[3])
+config = Config()
+config.update({
+  "model": "%s/model" % tmp_dir,
+  "num_outputs": 3,
+  "num_inputs": 2,
+  "network": {"output": {"class": "softmax", "loss": "ce"}},
+  "adam": True,
+  "learning_rate": 0.1,
+  "batch_size": 5,
+  "start_epoch": 1,
+  "num_epochs": 1,
+  "data_parallel_num_workers": 2,
+  "data_parallel_rank": rank,
+  "data_parallel_port": port})
+train_data = DummyDataset(input_dim=2, output_dim=3, num_seqs=11, seq_len=5)
+train_data.init_seq_order(epoch=1)
+data_parallel = DataParallel.from_config(config)
+engine = Engine(config=config, data_parallel=data_parallel)
+engine.init_train_from_config(config=config, train_data=train_data, dev_data=None, eval_data=None)
+engine.train()
+sync_vars = engine.get_data_parallel_sync_vars()
+assert len(sync_vars) > len(engine.network.get_params_list())  # also the Adam vars
+numpy.savez("%s/params.rank%i.npz" % (tmp_dir, rank), *engine.tf_session.run(sync_vars))
+print("train score:", engine.learning_rate_control.getEpochErrorDict(1))
+engine.finalize()
+"""
+
+
+def test_DataParallel_engine_train():
+  import os
+  import socket
+  import tempfile
+  import shutil
+  from subprocess import Popen, PIPE
+  tmp_dir = tempfile.mkdtemp()
+  sock = socket.socket()
+  sock.bind(("localhost", 0))
+  port = sock.getsockname()[1]
+  sock.close()
+  env = os.environ.copy()
+  env[DataParallel.AuthKeyEnvVar] = "0123456789abcdef"
+  env["OMP_NUM_THREADS"] = "1"
+  try:
+    procs = [
+      Popen([sys.executable, "-c", _engine_train_worker_code, str(rank), str(port), tmp_dir],
+            env=env, stdout=PIPE)
+      for rank in range(2)]
+    outputs = [proc.communicate()[0].decode("utf8") for proc in procs]
+    for rank, (proc, output) in enumerate(zip(procs, outputs)):
+      print("rank %i output:\n%s" % (rank, output))
+      assert_equal(proc.returncode, 0)
+    params = [numpy.load("%s/params.rank%i.npz" % (tmp_dir, rank)) for rank in range(2)]
+    assert_equal(sorted(params[0].keys()), sorted(params[1].keys()))
+    for key in params[0].keys():
+      numpy.testing.assert_array_equal(params[0][key], params[1][key])
+    # Only rank 0 saves the model.
+    assert_true(os.path.exists("%s/model.001.index" % tmp_dir))
+    # Both have the train score over the whole dataset.
+    score_lines = [[l for l in output.splitlines() if l.startswith("train score:")] for output in outputs]
+    assert_equal(len(score_lines[0]), 1)
+    assert_equal(score_lines[0], score_lines[1])
+  finally:
+    shutil.rmtree(tmp_dir)
@@ -15,7 +15,7 @@ import Util
 import TFUtil
 TFUtil.debugRegisterBetterRepr()
 from Config import Config
-from nose.tools import assert_equal, assert_is_instance
+from nose.tools import assert_equal, assert_is_instance, assert_true, assert_false
 import numpy
 import numpy.testing
 from pprint import pprint
@@ -112,6 +112,287 @@ def test_engine_train():
   engine.finalize()
 
 
+def test_engine_train_tf_data_pipeline():
+  from GeneratingDataset import DummyDataset
+  from TFDataPipeline import TFDataProvider
+  seq_len = 5
+  n_data_dim = 2
+  n_classes_dim = 3
+  train_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=7, seq_len=seq_len)
+  cv_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=3, seq_len=seq_len)
+
+  scores = {}  # tf_data_pipeline -> epoch -> error_key -> score
+  fwd_results = {}  # tf_data_pipeline -> numpy array
+  for tf_data_pipeline in [False, True]:
+    config = Config()
+    config.update({
+      "model": "/tmp/model",
+      "num_outputs": n_classes_dim,
+      "num_inputs": n_data_dim,
+      "network": {"output": {"class": "softmax", "loss": "ce"}},
+      "adam": True,
+      "learning_rate": 0.01,
+      "batch_size": 10,
+      "start_epoch": 1,
+      "num_epochs": 2,
+      "tf_data_pipeline": tf_data_pipeline
+    })
+    train_data.init_seq_order(epoch=1)
+    cv_data.init_seq_order(epoch=1)
+    engine = Engine(config=config)
+    engine.init_train_from_config(config=config, train_data=train_data, dev_data=cv_data, eval_data=None)
+    engine.train()
+    if tf_data_pipeline:
+      assert_is_instance(engine.tf_data_input.current_provider, TFDataProvider)
+      assert_true(engine.tf_data_input.current_provider.have_reached_end())
+    else:
+      assert_equal(engine.tf_data_input, None)
+    scores[tf_data_pipeline] = {ep: d.error for (ep, d) in engine.learning_rate_control.epochData.items()}
+    # This feeds the placeholders.
+    cv_data.init_seq_order(epoch=1)
+    fwd_results[tf_data_pipeline] = engine.forward_single(cv_data, 0)
+    engine.finalize()
+
+  pprint(scores)
+  assert_equal(sorted(scores[True].keys()), [1, 2])
+  for ep, error_dict in sorted(scores[False].items()):
+    assert_equal(sorted(error_dict.keys()), sorted(scores[True][ep].keys()))
+    for error_key, error_value in sorted(error_dict.items()):
+      numpy.testing.assert_almost_equal(scores[True][ep][error_key], error_value)
+  numpy.testing.assert_almost_equal(fwd_results[True], fwd_results[False])
+
+
+def test_TFDataProvider_stop_threads_early():
+  from GeneratingDataset import DummyDataset
+  from TFDataPipeline import TFDataInput, TFDataProvider
+  from TFNetwork import ExternData
+  import threading
+  config = Config()
+  config.update({"num_outputs": 3, "num_inputs": 2})
+  dataset = DummyDataset(input_dim=2, output_dim=3, num_seqs=20, seq_len=5)
+  dataset.init_seq_order(epoch=1)
+  with tf.Graph().as_default() as graph:
+    extern_data = ExternData()
+    extern_data.init_from_config(config, auto_create_placeholders=False)
+    tf_data_input = TFDataInput(extern_data=extern_data, capacity=2)
+    session = tf.Session(graph=graph)
+    provider = TFDataProvider(
+      tf_data_input=tf_data_input, tf_session=session, extern_data=extern_data, data_keys=None,
+      dataset=dataset, batches=dataset.generate_batches(recurrent_net=True, batch_size=5, max_seqs=1), capacity=1)
+    provider.start_threads()
+    session.run(extern_data.data["data"].placeholder)
+    # Stop while the thread still has batches to produce. tf.data must see the end, and not block.
+    provider.stop_threads()
+    results = []
+
+    def read_until_end():
+      try:
+        while True:
+          session.run(extern_data.data["data"].placeholder)
+      except tf.errors.OutOfRangeError:
+        results.append("end")
+
+    thread = threading.Thread(target=read_until_end)
+    thread.daemon = True
+    thread.start()
+    thread.join(60)
+    assert_equal(results, ["end"])
+    session.close()
+
+
+def test_engine_train_step_timings():
+  from GeneratingDataset import DummyDataset
+  import tempfile
+  import json
+  seq_len = 5
+  n_data_dim = 2
+  n_classes_dim = 3
+  train_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=4, seq_len=seq_len)
+  train_data.init_seq_order(epoch=1)
+  log_dir = tempfile.mkdtemp()
+
+  config = Config()
+  config.update({
+    "model": "/tmp/model",
+    "num_outputs": n_classes_dim,
+    "num_inputs": n_data_dim,
+    "network": {"output": {"class": "softmax", "loss": "ce"}},
+    "start_epoch": 1,
+    "num_epochs": 1,
+    "batch_size": seq_len,
+    "tf_log_dir": log_dir,
+    "tf_log_step_timings": True,
+    "tf_log_step_timings_chrome_trace": True,
+  })
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config, train_data=train_data, dev_data=None, eval_data=None)
+  engine.train()
+  engine.finalize()
+
+  prefix = "%s/%s/step_timings.epoch1" % (log_dir, train_data.name)
+  with open(prefix + ".csv") as f:
+    lines = f.read().splitlines()
+  assert_equal(lines[0].split(","), ["step", "start"] + list(RunnerStepTimings.phases) + ["total"])
+  assert_equal(len(lines), 1 + 4)  # one seq per batch
+  with open(prefix + ".json") as f:
+    summary = json.load(f)
+  assert_equal(summary["num_steps"], 4)
+  assert_equal(set(summary["phases"].keys()), set(RunnerStepTimings.phases + ("total",)))
+  assert summary["phases"]["total"]["sum"] >= summary["phases"]["compute"]["sum"] > 0
+  with open(prefix + ".trace.json") as f:
+    trace = json.load(f)
+  assert any(ev["name"] == "compute" for ev in trace["traceEvents"])
+
+
+def test_engine_train_save_model_async():
+  from GeneratingDataset import DummyDataset
+  import tempfile
+  import shutil
+  import os
+  seq_len = 5
+  n_data_dim = 2
+  n_classes_dim = 3
+  train_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=4, seq_len=seq_len)
+  train_data.init_seq_order(epoch=1)
+  model_dir = tempfile.mkdtemp()
+
+  config = Config()
+  config.update({
+    "model": "%s/model" % model_dir,
+    "num_outputs": n_classes_dim,
+    "num_inputs": n_data_dim,
+    "network": {"output": {"class": "softmax", "loss": "ce"}},
+    "save_model_async": True,
+    "start_epoch": 1,
+    "num_epochs": 2
+  })
+  try:
+    engine = Engine(config=config)
+    engine.init_train_from_config(config=config, train_data=train_data, dev_data=None, eval_data=None)
+    engine.train()
+    params = engine.network.get_param_values_dict(session=engine.tf_session)
+    global_train_step = engine.network.get_global_train_step(session=engine.tf_session)
+    engine.finalize()
+    for postfix in [".index", ".meta", ".data-00000-of-00001"]:
+      assert_true(os.path.exists("%s/model.002%s" % (model_dir, postfix)), postfix)
+    assert_false([fn for fn in os.listdir(model_dir) if BackgroundParamsSaver.TmpPostfix in fn])
+
+    with tf.Graph().as_default(), tf.Session() as session:
+      network = TFNetwork(config=config, train_flag=False)
+      network.construct_from_dict(config.typed_dict["network"])
+      network.load_params_from_file(filename="%s/model.002" % model_dir, session=session)
+      assert_equal(network.get_global_train_step(session=session), global_train_step)
+      params_loaded = network.get_param_values_dict(session=session)
+    for layer_name, layer_params in params.items():
+      for param_name, value in layer_params.items():
+        numpy.testing.assert_array_equal(value, params_loaded[layer_name][param_name])
+  finally:
+    shutil.rmtree(model_dir)
+
+
+def test_engine_load_params_no_new_ops():
+  from GeneratingDataset import DummyDataset
+  import tempfile
+  import shutil
+  n_data_dim = 2
+  n_classes_dim = 3
+  train_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=4, seq_len=5)
+  train_data.init_seq_order(epoch=1)
+  model_dir = tempfile.mkdtemp()
+
+  config = Config()
+  config.update({
+    "model": "%s/model" % model_dir,
+    "num_outputs": n_classes_dim,
+    "num_inputs": n_data_dim,
+    "network": {
+      "hidden": {"class": "linear", "activation": "tanh", "n_out": 5},
+      "output": {"class": "softmax", "loss": "ce", "from": ["hidden"]}},
+    "start_epoch": 1,
+    "num_epochs": 1
+  })
+  try:
+    engine = Engine(config=config)
+    engine.init_train_from_config(config=config, train_data=train_data, dev_data=None, eval_data=None)
+    engine.train()
+    params = engine.network.get_params_serialized(session=engine.tf_session)
+    engine.finalize()
+
+    with tf.Graph().as_default() as graph, tf.Session() as session:
+      network = TFNetwork(config=config, train_flag=False)
+      network.construct_from_dict(config.typed_dict["network"])
+      # No initialize_params(), we load all params.
+      network.load_params_from_file(filename="%s/model.001" % model_dir, session=session)
+      num_ops = len(graph.get_operations())
+      network.load_params_from_file(filename="%s/model.001" % model_dir, session=session)
+      assert_equal(network.get_global_train_step(session=session), params.global_train_step)
+      params_loaded = network.get_params_serialized(session=session)
+      # Like in pretraining, copy the params over.
+      network.set_params_by_serialized(params, session=session)
+      assert_equal(len(graph.get_operations()), num_ops)
+    assert_equal(sorted(params.values_dict.keys()), sorted(params_loaded.values_dict.keys()))
+    for layer_name, layer_params in params.values_dict.items():
+      assert_equal(sorted(layer_params.keys()), sorted(params_loaded.values_dict[layer_name].keys()))
+      for param_name, value in layer_params.items():
+        numpy.testing.assert_array_equal(value, params_loaded.values_dict[layer_name][param_name])
+  finally:
+    shutil.rmtree(model_dir)
+
+
+def test_engine_pretrain_reuse_graph():
+  from GeneratingDataset import DummyDataset
+  import tempfile
+  import shutil
+  n_data_dim = 2
+  n_classes_dim = 3
+  train_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=4, seq_len=5)
+  train_data.init_seq_order(epoch=1)
+  model_dir = tempfile.mkdtemp()
+
+  config = Config()
+  config.update({
+    "model": "%s/model" % model_dir,
+    "num_outputs": n_classes_dim,
+    "num_inputs": n_data_dim,
+    "network": {
+      "l1": {"class": "linear", "activation": "tanh", "n_out": 4},
+      "l2": {"class": "linear", "activation": "tanh", "n_out": 4, "from": ["l1"]},
+      "output": {"class": "softmax", "loss": "ce", "from": ["l2"]}},
+    "pretrain": "default",
+    "pretrain_repetitions": [2],  # i.e. epoch 1 and 2 have the same network, epoch 3 and 4 the final one
+    "adam": True,
+    "start_epoch": 1,
+    "num_epochs": 3
+  })
+  try:
+    engine = Engine(config=config)
+    engine.init_train_from_config(config=config, train_data=train_data, dev_data=None, eval_data=None)
+    graphs = []
+    for epoch in [1, 2, 3]:
+      # Like Engine.train().
+      engine.epoch = epoch
+      train_data.init_seq_order(epoch=epoch)
+      engine.dataset_batches.pop("train", None)
+      engine.init_train_epoch()
+      graphs.append(engine.tf_session.graph)
+      if epoch == 3:
+        break
+      engine.train_epoch()
+      optimizer_var_values = engine.updater.get_optimizer_var_values_dict()
+    assert graphs[0] is graphs[1]
+    assert graphs[1] is not graphs[2]
+    # The optimizer vars of the new graph get the old values (as far as they exist in both).
+    engine.updater.get_optim_op()
+    new_optimizer_var_values = engine.updater.get_optimizer_var_values_dict()
+    assert_true("optimize/l2/W/Adam" in new_optimizer_var_values)
+    assert_false("optimize/l2/W/Adam" in optimizer_var_values)
+    for name in ["optimize/l1/W/Adam", "optimize/l1/W/Adam_1", "optimize/beta1_power"]:
+      numpy.testing.assert_array_equal(new_optimizer_var_values[name], optimizer_var_values[name])
+    engine.finalize()
+  finally:
+    shutil.rmtree(model_dir)
+
+
 def test_engine_train_grad_noise_sparse():
   # Not sure how to test for it in a simple way...
   # You might see "Converting sparse IndexedSlices to a dense Tensor of unknown shape."
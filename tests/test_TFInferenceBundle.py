@@ -0,0 +1,143 @@
+
+# start test like this:  nosetests-2.7  tests/test_TFInferenceBundle.py
+
+from __future__ import print_function
+
+import logging
+logging.getLogger('tensorflow').disabled = True
+import tensorflow as tf
+import sys
+import os
+sys.path += ["."]  # Python 3 hack
+sys.path += [os.path.dirname(os.path.abspath(__file__)) + "/.."]
+import tempfile
+import shutil
+import subprocess
+from nose.tools import assert_equal, assert_in, assert_not_in
+import numpy
+import numpy.testing
+from Config import Config
+from TFNetwork import TFNetwork
+import TFUtil
+from TFUtil import Data, OpCodeCompiler
+from TFInferenceBundle import InferenceBundle, export_inference_bundle, export_network_inference_bundle
+import better_exchook
+better_exchook.replace_traceback_format_tb()
+from Log import log
+log.initialize(verbosity=[5])
+
+
+def _run_bundle_in_subprocess(bundle_dir, data):
+  """
+  Runs the bundle with only the bundle dir in the path, i.e. without RETURNN.
+
+  :param str bundle_dir:
+  :param dict[str,numpy.ndarray] data:
+  :rtype: dict[str,numpy.ndarray]
+  """
+  numpy.savez(os.path.join(bundle_dir, "test-in.npz"), **data)
+  code = "\n".join([
+    "import sys, numpy",
+    "sys.path = [p for p in sys.path if p not in ('', '.')]",
+    "sys.path.insert(0, %r)" % bundle_dir,
+    "from TFInferenceBundle import InferenceBundle",
+    "bundle = InferenceBundle(%r)" % bundle_dir,
+    "data = dict(numpy.load(%r))" % os.path.join(bundle_dir, "test-in.npz"),
+    "out = bundle.run(data)",
+    "assert 'TFUtil' not in sys.modules and 'TFNetwork' not in sys.modules",
+    "numpy.savez(%r, **out)" % os.path.join(bundle_dir, "test-out.npz")])
+  env = {key: value for (key, value) in os.environ.items() if key != "PYTHONPATH"}
+  subprocess.check_call([sys.executable, "-c", code], cwd=bundle_dir, env=env)
+  return dict(numpy.load(os.path.join(bundle_dir, "test-out.npz")))
+
+
+def test_export_network_inference_bundle():
+  n_in, n_out = 3, 4
+  config = Config()
+  config.update({
+    "num_inputs": n_in,
+    "num_outputs": n_out,
+    "network": {
+      "hidden": {"class": "linear", "activation": "tanh", "n_out": 5, "dropout": 0.5},
+      "output": {"class": "softmax", "loss": "ce", "from": ["hidden"]}}})
+  bundle_dir = tempfile.mkdtemp()
+  try:
+    with tf.Graph().as_default() as graph:
+      session = tf.Session(graph=graph)
+      # With a dynamic train flag, which the export fixes to False.
+      network = TFNetwork(config=config, train_flag=TFUtil.get_global_train_flag_placeholder())
+      network.construct_from_dict(config.typed_dict["network"])
+      network.initialize_params(session)
+      network.maybe_construct_objective()
+      assert_in("classes", network.used_data_keys)  # by the loss
+      export_network_inference_bundle(bundle_dir=bundle_dir, network=network, session=session)
+      rnd = numpy.random.RandomState(42)
+      data = rnd.normal(size=(2, 7, n_in)).astype("float32")
+      output = network.get_default_output_layer().output
+      expected = session.run(output.placeholder, feed_dict={
+        network.extern_data.data["data"].placeholder: data,
+        network.extern_data.data["data"].size_placeholder[0]: [7, 7],
+        TFUtil.get_global_train_flag_placeholder(): False})
+      session.close()
+    bundle = InferenceBundle(bundle_dir)
+    assert_equal(sorted(bundle.inputs.keys()), ["data"])  # the targets are not needed for the output
+    assert_equal(sorted(bundle.outputs.keys()), ["output"])
+    assert_equal(bundle.info["op_libraries"], [])
+    op_types = set([op.type for op in bundle.graph.get_operations()])
+    assert_not_in("VariableV2", op_types)
+    assert_not_in("RandomUniform", op_types)  # the dropout is removed because the train flag is fixed
+    out = bundle.run({"data": data})
+    bundle.close()
+    assert_equal(sorted(out.keys()), ["output", "output:shape(1)"])
+    numpy.testing.assert_allclose(out["output"], expected, rtol=1e-5)
+    numpy.testing.assert_array_equal(out["output:shape(1)"], [7, 7])
+    out = _run_bundle_in_subprocess(bundle_dir, {"data": data})
+    numpy.testing.assert_allclose(out["output"], expected, rtol=1e-5)
+  finally:
+    shutil.rmtree(bundle_dir)
+
+
+def test_export_inference_bundle_op_library():
+  code = """
+  #include "tensorflow/core/framework/op.h"
+  #include "tensorflow/core/framework/op_kernel.h"
+  using namespace tensorflow;
+  REGISTER_OP("InferenceBundleTestAddOne").Input("x: float").Output("y: float");
+  class InferenceBundleTestAddOneOp : public OpKernel {
+  public:
+    explicit InferenceBundleTestAddOneOp(OpKernelConstruction* context) : OpKernel(context) {}
+    void Compute(OpKernelContext* context) override {
+      const Tensor& x = context->input(0);
+      Tensor* y = NULL;
+      OP_REQUIRES_OK(context, context->allocate_output(0, x.shape(), &y));
+      auto x_flat = x.flat<float>();
+      auto y_flat = y->flat<float>();
+      for (int i = 0; i < x_flat.size(); ++i) y_flat(i) = x_flat(i) + 1;
+    }
+  };
+  REGISTER_KERNEL_BUILDER(Name("InferenceBundleTestAddOne").Device(DEVICE_CPU), InferenceBundleTestAddOneOp);
+  """
+  compiler = OpCodeCompiler(
+    base_name="InferenceBundleTestAddOne", code_version=1, code=code, use_cuda_if_available=False,
+    ld_flags=tf.sysconfig.get_link_flags())
+  mod = compiler.load_tf_module()
+  assert_equal(OpCodeCompiler.loaded_tf_modules[compiler._so_filename], ["InferenceBundleTestAddOne"])
+  bundle_dir = tempfile.mkdtemp()
+  try:
+    with tf.Graph().as_default() as graph:
+      session = tf.Session(graph=graph)
+      x = Data(name="data", shape=(None, 2), auto_create_placeholders=True)
+      weights = tf.Variable(initial_value=[[1.0, 2.0], [3.0, 4.0]], name="W")
+      y = Data(name="y", shape=(None, 2))
+      y.placeholder = mod.inference_bundle_test_add_one(tf.einsum("btx,xy->bty", x.placeholder, weights))
+      y.size_placeholder = x.size_placeholder.copy()
+      session.run(tf.global_variables_initializer())
+      export_inference_bundle(bundle_dir=bundle_dir, session=session, inputs={"data": x}, outputs={"y": y})
+      session.close()
+    assert_equal(len(os.listdir(os.path.join(bundle_dir, "ops"))), 1)
+    data = numpy.array([[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]], dtype="float32")
+    out = _run_bundle_in_subprocess(bundle_dir, {"data": data})
+    numpy.testing.assert_allclose(out["y"], [[[2.0, 3.0], [4.0, 5.0], [5.0, 7.0]]])
+    numpy.testing.assert_array_equal(out["y:shape(1)"], [3])
+  finally:
+    shutil.rmtree(bundle_dir)
@@ -60,6 +60,62 @@ def test_Updater_GradientDescent():
   assert_almost_equal(session.run(network.get_default_output_layer().output.placeholder), 2.0)
 
 
+def test_Updater_accum_grad_multiple_step():
+  from TFNetwork import TFNetwork, ExternData
+  from Config import Config
+
+  with tf.Graph().as_default():
+    with tf.Session().as_default() as session:
+      config = Config()
+      config.set("accum_grad_multiple_step", 3)
+      network = TFNetwork(extern_data=ExternData(), train_flag=True)
+      network.add_layer(name="output", layer_class=DummyLayer, initial_value=5.0, loss_value_factor=3.0)
+      network.initialize_params(session=session)
+
+      updater = Updater(config=config, tf_session=session, network=network)
+      updater.set_learning_rate(1.0)
+      updater.set_trainable_vars(network.get_trainable_params())
+      optim_op = updater.get_optim_op()
+      x = network.get_default_output_layer().output.placeholder
+      for step in range(6):
+        session.run(optim_op)
+        assert_equal(network.get_global_train_step(session=session), step + 1)
+        # Gradient is 3 in each step, and every 3rd step, we apply the accumulated sum of 9.
+        assert_almost_equal(session.run(x), 5.0 - 9.0 * ((step + 1) // 3))
+      # A partially accumulated gradient is dropped when the updater vars are reset (like after a restart).
+      session.run(optim_op)
+      updater.init_optimizer_vars()
+      for step in range(3):
+        session.run(optim_op)
+        assert_almost_equal(session.run(x), -13.0 - (9.0 if step == 2 else 0.0))
+
+
+def test_Updater_accum_grad_multiple_step_adam():
+  from TFNetwork import TFNetwork, ExternData
+  from Config import Config
+
+  with tf.Graph().as_default():
+    with tf.Session().as_default() as session:
+      config = Config()
+      config.set("accum_grad_multiple_step", 2)
+      config.set("adam", True)
+      network = TFNetwork(extern_data=ExternData(), train_flag=True)
+      network.add_layer(name="output", layer_class=DummyLayer, initial_value=5.0, loss_value_factor=3.0)
+      network.initialize_params(session=session)
+
+      updater = Updater(config=config, tf_session=session, network=network)
+      updater.set_learning_rate(0.1)
+      updater.set_trainable_vars(network.get_trainable_params())
+      optim_op = updater.get_optim_op()
+      assert_equal(len(updater.optimizer.get_slot_names()), 2)  # m, v
+      x = network.get_default_output_layer().output.placeholder
+      session.run(optim_op)
+      assert_almost_equal(session.run(x), 5.0)
+      session.run(optim_op)
+      # The first Adam step is always lr * sign(grad).
+      assert_almost_equal(session.run(x), 4.9, decimal=5)
+
+
 def test_Updater_CustomUpdate():
   from TFNetwork import TFNetwork, ExternData
   from Config import Config
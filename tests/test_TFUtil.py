@@ -894,6 +894,28 @@ def test_VariableAssigner_ResourceVariable():
   assert_equal(session.run(v), 2.)
 
 
+def test_ParallelRestoreSaverBuilder():
+  import tempfile
+  import shutil
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    values = [numpy.arange(n * 3, dtype="float32").reshape((n, 3)) for n in range(1, 6)] + [numpy.array(7)]
+    with tf.Graph().as_default() as graph, tf.Session(graph=graph) as sess:
+      variables = [tf.Variable(value, name="v%i" % i) for (i, value) in enumerate(values)]
+      sess.run(tf.global_variables_initializer())
+      tf.train.Saver(var_list=variables).save(sess=sess, save_path="%s/model" % tmp_dir)
+    with tf.Graph().as_default() as graph, tf.Session(graph=graph) as sess:
+      variables = [tf.Variable(numpy.zeros_like(value), name="v%i" % i) for (i, value) in enumerate(values)]
+      saver = tf.train.Saver(var_list=variables, builder=ParallelRestoreSaverBuilder(num_parallel_reads=3))
+      restore_ops = [op for op in graph.get_operations() if op.type == "RestoreV2"]
+      assert_equal(len(restore_ops), 3)
+      saver.restore(sess=sess, save_path="%s/model" % tmp_dir)
+      for value, value_restored in zip(values, sess.run(variables)):
+        numpy.testing.assert_array_equal(value, value_restored)
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
 def test_map_labels():
   x = tf.constant([0, 1, 2, 3, 2, 1, 0])
   label_map = {0: 1, 1: 2, 2: 3, 3: 0}
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""
+Measures the throughput of a dataset, without any model.
+We go through the dataset like the engine does in training
+(init_seq_order() per epoch, generate_batches(), load_seqs() per batch, get_data() for every seq of the batch),
+and report seqs/frames/bytes per second, the time per batch, and where the time was spent.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.append(returnn_dir)
+
+import rnn
+from Log import log
+import argparse
+import numpy
+from Util import hms_fraction, human_bytes_size
+
+
+class BenchmarkStats:
+  """
+  Accumulates the measurements over all epochs and partitions.
+  """
+
+  def __init__(self):
+    self.num_seqs = 0
+    self.num_frames = 0
+    self.num_bytes = 0
+    self.init_seq_order_time = 0.0
+    self.batch_gen_time = 0.0
+    self.load_seqs_time = 0.0
+    self.get_data_time = 0.0
+    self.batch_times = []; " :type: list[float] "  # batch gen + load_seqs + get_data, per batch
+
+  @property
+  def total_time(self):
+    return self.init_seq_order_time + sum(self.batch_times)
+
+  def report(self):
+    total_time = max(self.total_time, 1e-10)
+    print("Batches: %i, seqs: %i, frames: %i, bytes: %s" % (
+      len(self.batch_times), self.num_seqs, self.num_frames, human_bytes_size(self.num_bytes)), file=log.v1)
+    print("Total time: %s" % hms_fraction(total_time), file=log.v1)
+    print("Throughput: %.1f seqs/s, %.1f frames/s, %s/s" % (
+      self.num_seqs / total_time, self.num_frames / total_time,
+      human_bytes_size(int(self.num_bytes / total_time))), file=log.v1)
+    if self.batch_times:
+      print("Time per batch: mean %.2fms, p50 %.2fms, p99 %.2fms, max %.2fms" % tuple(
+        [numpy.mean(self.batch_times) * 1000.0] +
+        [numpy.percentile(self.batch_times, q) * 1000.0 for q in (50, 99, 100)]), file=log.v1)
+    for name, t in [
+          ("init_seq_order", self.init_seq_order_time), ("batch generation", self.batch_gen_time),
+          ("load_seqs", self.load_seqs_time), ("get_data", self.get_data_time)]:
+      print("Time in %s: %s (%.1f%%)" % (name, hms_fraction(t), 100.0 * t / total_time), file=log.v1)
+
+
+def benchmark_batches(dataset, batches, stats, options):
+  """
+  :type dataset: Dataset.Dataset
+  :type batches: EngineBatch.BatchSetGenerator
+  :type stats: BenchmarkStats
+  :param options: argparse.Namespace
+  """
+  data_keys = dataset.get_data_keys()
+  num_batches = 0
+  while options.max_batches < 0 or num_batches < options.max_batches:
+    start_time = time.time()
+    if not batches.has_more():
+      break
+    batch, = batches.peek_next_n(1)
+    batches.advance(1)
+    load_start_time = time.time()
+    # Like the engine, see TFDataPipeline.FeedDictDataProvider._get_next_batch().
+    dataset.load_seqs(batch.start_seq, batch.end_seq)
+    get_data_start_time = time.time()
+    num_bytes = 0
+    for seq in batch.seqs:
+      for key in data_keys:
+        data = dataset.get_data(seq.seq_idx, key)
+        num_bytes += data[seq.seq_start_frame[key]:seq.seq_end_frame[key]].nbytes
+    end_time = time.time()
+    stats.batch_gen_time += load_start_time - start_time
+    stats.load_seqs_time += get_data_start_time - load_start_time
+    stats.get_data_time += end_time - get_data_start_time
+    stats.batch_times.append(end_time - start_time)
+    stats.num_seqs += batch.get_num_seqs()
+    stats.num_frames += batch.get_total_num_frames()["data"]
+    stats.num_bytes += num_bytes
+    num_batches += 1
+
+
+def benchmark_dataset(dataset, options):
+  """
+  :type dataset: Dataset.Dataset
+  :param options: argparse.Namespace
+  :rtype: BenchmarkStats
+  """
+  batch_size = options.batch_size or config.int('batch_size', 1)
+  max_seqs = options.max_seqs or config.int('max_seqs', -1)
+  max_seq_length = config.float('max_seq_length', 0) or sys.maxsize
+  print("Batch size: %i, max seqs: %i, recurrent: %s" % (batch_size, max_seqs, options.recurrent), file=log.v3)
+  stats = BenchmarkStats()
+  for epoch in range(options.epoch, options.epoch + options.num_epochs):
+    # Emulate data-parallel training (see TFDataParallel), where every worker goes through its own partition.
+    for partition_index in range(options.num_partitions):
+      if options.num_partitions > 1:
+        dataset.set_partition(partition_index=partition_index, num_partitions=options.num_partitions)
+      start_time = time.time()
+      dataset.init_seq_order(epoch=epoch)
+      stats.init_seq_order_time += time.time() - start_time
+      batches = dataset.generate_batches(
+        recurrent_net=options.recurrent,
+        batch_size=batch_size,
+        max_seqs=max_seqs,
+        max_seq_length=int(max_seq_length),
+        seq_drop=config.float('seq_drop', 0.0),
+        shuffle_batches=config.bool('shuffle_batches', True))
+      num_batches_before = len(stats.batch_times)
+      benchmark_batches(dataset=dataset, batches=batches, stats=stats, options=options)
+      print("Epoch %i, partition %i/%i: %i batches" % (
+        epoch, partition_index + 1, options.num_partitions, len(stats.batch_times) - num_batches_before),
+        file=log.v3)
+  stats.report()
+  return stats
+
+
+def init(config_str):
+  """
+  :param str config_str: either filename to config-file, or dict for dataset
+  """
+  rnn.initBetterExchook()
+  rnn.initThreadJoinHack()
+  if config_str.startswith("{"):
+    print("Using dataset %s." % config_str)
+    datasetDict = eval(config_str)
+    configFilename = None
+  else:
+    datasetDict = None
+    configFilename = config_str
+    print("Using config file %r." % configFilename)
+    assert os.path.exists(configFilename)
+  rnn.initConfig(configFilename=configFilename, commandLineOptions=[])
+  global config
+  config = rnn.config
+  config.set("log", None)
+  if datasetDict:
+    config.set("train", datasetDict)
+  rnn.initLog()
+  print("CRNN benchmark-dataset starting up.", file=log.v1)
+  rnn.initFaulthandler()
+  rnn.initConfigJsonNetwork()
+  rnn.initData()
+  rnn.printTaskProperties()
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description='Benchmark the throughput of the train dataset.')
+  argparser.add_argument('crnn_config', help="either filename to config-file, or dict for dataset")
+  argparser.add_argument('--epoch', type=int, default=1, help='first epoch (default: 1)')
+  argparser.add_argument('--num_epochs', type=int, default=1, help='to measure the epoch switching (default: 1)')
+  argparser.add_argument(
+    '--num_partitions', type=int, default=1,
+    help='go through every partition of every epoch, like the data-parallel workers (default: 1)')
+  argparser.add_argument('--batch_size', type=int, default=0, help='max frames per batch (default: from config)')
+  argparser.add_argument('--max_seqs', type=int, default=0, help='max seqs per batch (default: from config)')
+  argparser.add_argument('--not_recurrent', dest='recurrent', action='store_false', help='batches like for FFNNs')
+  argparser.add_argument('--max_batches', type=int, default=-1, help='per epoch and partition, or -1 (default)')
+  args = argparser.parse_args(argv[1:])
+  init(config_str=args.crnn_config)
+  try:
+    benchmark_dataset(rnn.train_data, args)
+  except KeyboardInterrupt:
+    print("KeyboardInterrupt")
+    sys.exit(1)
+  finally:
+    rnn.finalize()
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -50,8 +50,13 @@ def dump_dataset(dataset, options):
     print("Done.")
     return
 
+  binary_writer = None
   if options.type == "numpy":
     print("Dump files: %r*%r" % (options.dump_prefix, options.dump_postfix), file=log.v3)
+  elif options.type == "numpy_binary":
+    from NumpyDumpDataset import NumpyDumpBinaryWriter
+    print("Dump binary files: %r*" % options.dump_prefix, file=log.v3)
+    binary_writer = NumpyDumpBinaryWriter(prefix=options.dump_prefix)
   elif options.type == "stdout":
     print("Dump to stdout", file=log.v3)
   else:
@@ -73,9 +78,15 @@ def dump_dataset(dataset, options):
         numpy.savetxt("%s%i.targets.%s%s" % (options.dump_prefix, seq_idx, target, options.dump_postfix), targets, fmt='%i')
       elif options.type == "stdout":
         print("seq %i target %r:" % (seq_idx, target), pretty_print(targets))
+    if binary_writer:
+      binary_writer.add_seq(
+        features=data, targets={target: dataset.get_targets(target, seq_idx) for target in dataset.get_target_list()})
 
     seq_idx += 1
 
+  if binary_writer:
+    binary_writer.close()
+
   print("Done. More seqs which we did not dumped: %s" % dataset.is_less_than_num_seqs(seq_idx), file=log.v1)
 
 
@@ -115,7 +126,7 @@ def main(argv):
   argparser.add_argument('--startseq', type=int, default=0, help='start seq idx (inclusive) (default: 0)')
   argparser.add_argument('--endseq', type=int, default=10, help='end seq idx (inclusive) or -1 (default: 10)')
   argparser.add_argument('--get_num_seqs', action="store_true")
-  argparser.add_argument('--type', default='stdout', help="'numpy' or 'stdout'")
+  argparser.add_argument('--type', default='stdout', help="'numpy', 'numpy_binary' or 'stdout'")
   argparser.add_argument('--dump_prefix', default='/tmp/crnn.dump-dataset.')
   argparser.add_argument('--dump_postfix', default='.txt.gz')
   args = argparser.parse_args(argv[1:])
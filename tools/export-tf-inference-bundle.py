@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+Exports a frozen, self-contained inference bundle of a TF model.
+See :mod:`TFInferenceBundle` for the bundle format and how to load it.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.append(returnn_dir)
+
+import rnn
+from Log import log
+import argparse
+from Util import BackendEngine
+
+
+def init(config_filename, epoch=None):
+  """
+  :param str config_filename:
+  :param int|None epoch: which model to load. by default the last one
+  """
+  config_updates = {
+    "log": None,
+    "task": "forward",  # no training graph
+    "need_data": False,
+    "tf_data_pipeline": False}  # we need plain placeholders for the inputs
+  if epoch:
+    config_updates["load_epoch"] = epoch
+  rnn.init(
+    configFilename=config_filename, commandLineOptions=[],
+    config_updates=config_updates,
+    extra_greeting="CRNN export-tf-inference-bundle starting up.")
+  assert BackendEngine.is_tensorflow_selected(), "This is only for the TF backend."
+  rnn.engine.init_network_from_config(rnn.config)
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description='Export a frozen inference bundle of a TF model.')
+  argparser.add_argument('crnn_config_file')
+  argparser.add_argument('bundle_dir', help="will be created")
+  argparser.add_argument('--epoch', type=int, help="model epoch to load (default: last)")
+  argparser.add_argument(
+    '--output_layer', action="append", help="can be used multiple times (default: the default output layer)")
+  args = argparser.parse_args(argv[1:])
+  init(config_filename=args.crnn_config_file, epoch=args.epoch)
+  from TFInferenceBundle import export_network_inference_bundle
+  export_network_inference_bundle(
+    bundle_dir=args.bundle_dir, network=rnn.engine.network, session=rnn.engine.tf_session,
+    output_layer_names=args.output_layer)
+  print("Done.", file=log.v1)
+  rnn.finalize()
+
+
+if __name__ == '__main__':
+  main(sys.argv)